@@ -1,15 +1,36 @@
 from time import time
-from fastapi import FastAPI, HTTPException, Request, Response, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from prisma import Prisma
+from database import QueryTraceMiddleware, db
+from metrics import MetricsMiddleware
 from controllers import auth
+from models import serializers
+from models.serializers import FastJSONResponse
 from controllers import duties
+from controllers import reports
+from controllers import analytics
+from controllers import notifications
+from controllers import patrols
+from controllers import assignments
+from services.reports import run_missed_duty_sweeper
+from services.patrols import run_patrol_generator
+from services.positions import flush_pending, run_position_refresh
+from services.sync import run_sync_compactor
+from services.face_client import face_client
+from services.face_verification import run_pending_sweeper
+from services import duty_cache, purge, versions
+from services.analytics import cache as analytics_cache
+import asyncio
 import logging
+import metrics
+import os
 import subprocess
 
-subprocess.run(["prisma", "generate"], check=True)
+# Load tests run the app against an in-memory client and skip code generation
+if os.getenv("SKIP_PRISMA_GENERATE", "false").lower() not in ("1", "true", "yes"):
+    subprocess.run(["prisma", "generate"], check=True)
 
 
 
@@ -24,7 +45,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
-db = Prisma()
+
+MISSED_DUTY_SWEEP_SECONDS = float(os.getenv("MISSED_DUTY_SWEEP_SECONDS", "300"))
+FACE_PENDING_SWEEP_SECONDS = float(os.getenv("FACE_PENDING_SWEEP_SECONDS", "60"))
+PATROL_GENERATE_SECONDS = float(os.getenv("PATROL_GENERATE_SECONDS", "3600"))
+POSITION_REFRESH_SECONDS = float(os.getenv("POSITION_REFRESH_SECONDS", "5"))
+SYNC_COMPACT_SECONDS = float(os.getenv("SYNC_COMPACT_SECONDS", "3600"))
+background_tasks = []
+purge_state = {"status": "idle", "deleted": 0, "total": None, "startedAt": None, "finishedAt": None, "error": None}
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-DB-Queries"],
 )
 
 async def ensure_db_connection():
@@ -50,10 +79,22 @@ async def ensure_db_connection():
 @app.on_event("startup")
 async def startup():
     await ensure_db_connection()
+    background_tasks.append(asyncio.create_task(run_missed_duty_sweeper(db, MISSED_DUTY_SWEEP_SECONDS)))
+    background_tasks.append(asyncio.create_task(run_pending_sweeper(db, FACE_PENDING_SWEEP_SECONDS)))
+    background_tasks.append(asyncio.create_task(run_patrol_generator(db, PATROL_GENERATE_SECONDS)))
+    background_tasks.append(asyncio.create_task(run_position_refresh(db, POSITION_REFRESH_SECONDS)))
+    background_tasks.append(asyncio.create_task(run_sync_compactor(db, SYNC_COMPACT_SECONDS)))
     logger.info("Application started successfully")
 
 @app.on_event("shutdown")
 async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await face_client.close()
+    try:
+        await flush_pending(db)
+    except Exception as e:
+        logger.error(f"Failed to write queued positions: {str(e)}")
     try:
         if db.is_connected():
             await db.disconnect()
@@ -89,9 +130,28 @@ async def middleware(request: Request, call_next):
             content={"detail": "Internal server error occurred"}
         )
 
+# Added last so they wrap everything above; the trace must be set before the
+# http middleware starts its own task for the endpoint
+app.add_middleware(QueryTraceMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+def collect_cache_metrics():
+    etags = metrics.CounterFamily("etag_responses_total", "Conditional GET outcomes by collection", ("collection", "result"))
+    for collection, counters in versions.etag_stats.items():
+        etags.values[(collection, "not_modified")] = counters["notModified"]
+        etags.values[(collection, "full")] = counters["full"]
+    return (etags, *metrics.cache_families({"active_duties": duty_cache.cache, "analytics": analytics_cache}))
+
+metrics.registry.add_collector(collect_cache_metrics)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(duties.router)
+app.include_router(reports.router)
+app.include_router(analytics.router)
+app.include_router(notifications.router)
+app.include_router(patrols.router)
+app.include_router(assignments.router)
 
 @app.get("/")
 async def index():
@@ -102,6 +162,18 @@ async def index():
         "timestamp": time()
     }
 
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "etags": versions.stats(),
+        "activeDuties": duty_cache.cache.stats(),
+        "analytics": analytics_cache.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     try:
@@ -129,22 +201,9 @@ async def get_users():
         
         users = await db.user.find_many()
 
-        Users = []
-        for user in users:
-            Users.append({
-                "id": user.id,
-                "empid": user.empid,
-                "role": user.role,
-                "profileImage": user.profileImage if user.profileImage else [],
-                "createdAt": user.createdAt.isoformat() if user.createdAt else None,
-                "updatedAt": user.updatedAt.isoformat() if user.updatedAt else None
-            })
-
-        print(Users)
-
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
-            content={"users": Users, "count": len(Users)}
+            content={"users": serializers.user_rows(users), "count": len(users)}
         )
         
     except Exception as e:
@@ -154,26 +213,34 @@ async def get_users():
             detail=f"Failed to fetch users: {str(e)}"
         )
 
-@app.delete("/users")
-async def delete_all_users():
+@app.delete("/users", status_code=202)
+async def delete_all_users(background_tasks: BackgroundTasks, chunk_size: int = purge.PURGE_CHUNK_SIZE):
     try:
         await ensure_db_connection()
         
-        # Delete in proper order to maintain referential integrity
-        await db.notification.delete_many()
-        await db.dutyreport.delete_many()
-        await db.dutylog.delete_many()
-        await db.dutyassignment.delete_many()
-        await db.faceembedding.delete_many()
-        deleted_users = await db.user.delete_many()
+        if purge_state["status"] == "running":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A user purge is already running"
+            )
         
-        logger.info("All users and related data deleted")
+        if chunk_size < 1 or chunk_size > 1000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="chunk_size must be between 1 and 1000"
+            )
+        
+        # Deleted in bounded transactions in the background; poll GET /users/purge
+        purge_state["status"] = "running"
+        background_tasks.add_task(purge.run_purge, db, purge_state, chunk_size)
         
         return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content={"detail": "All users deleted successfully"}
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"detail": "User purge started", "purge": purge_state}
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting all users: {str(e)}")
         raise HTTPException(
@@ -181,6 +248,10 @@ async def delete_all_users():
             detail=f"Failed to delete users: {str(e)}"
         )
 
+@app.get("/users/purge")
+async def get_purge_status():
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"purge": purge_state})
+
 @app.delete("/users/{empid}")
 async def delete_user(empid: str):
     try:
@@ -201,13 +272,8 @@ async def delete_user(empid: str):
                 detail="User not found"
             )
         
-        # Delete related data in proper order
-        await db.notification.delete_many(where={"userId": user.id})
-        await db.dutyreport.delete_many(where={"officerId": user.id})
-        await db.dutylog.delete_many(where={"officerId": user.id})
-        await db.dutyassignment.delete_many(where={"officerId": user.id})
-        await db.faceembedding.delete_many(where={"userId": user.id})
-        await db.user.delete(where={"empid": empid})
+        # The user's rows in every table go in one transaction: all or nothing
+        await purge.delete_user(db, user.id)
         
         logger.info(f"User {empid} and related data deleted")
         
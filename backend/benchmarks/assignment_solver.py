@@ -0,0 +1,94 @@
+"""
+Time to build and solve officer-to-beat assignment problems.
+
+Builds random officers (last positions around Goa, a share of them busy or
+never located) and beats, then times services/assignment.py: the NumPy cost
+matrix and the SciPy linear_sum_assignment solve, median of --repeat runs.
+The cost matrix is also built once with a per-pair Python loop over the same
+haversine formula for comparison.
+
+    cd backend && python benchmarks/assignment_solver.py --sizes 100,500,1000
+"""
+from datetime import datetime, timedelta, timezone
+from math import asin, cos, radians, sin, sqrt
+from types import SimpleNamespace
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import assignment  # noqa: E402
+
+GOA = (15.4909, 73.8278)
+
+
+def make_problem(officers, beats, busy_share, unlocated_share):
+    start = datetime(2025, 1, 1, 16, 30, tzinfo=timezone.utc)
+    end = start + timedelta(hours=8)
+    officer_rows = []
+    for i in range(officers):
+        located = random.random() >= unlocated_share
+        officer_rows.append(SimpleNamespace(
+            id=f"officer-{i}",
+            lastLatitude=GOA[0] + random.uniform(-0.3, 0.3) if located else None,
+            lastLongitude=GOA[1] + random.uniform(-0.3, 0.3) if located else None,
+        ))
+    beat_specs = [
+        SimpleNamespace(latitude=GOA[0] + random.uniform(-0.3, 0.3), longitude=GOA[1] + random.uniform(-0.3, 0.3),
+                        startTime=start, endTime=end, officers=1)
+        for _ in range(beats)
+    ]
+    busy = {
+        officer.id: [(start - timedelta(hours=2), start + timedelta(hours=1))]
+        for officer in officer_rows if random.random() < busy_share
+    }
+    return officer_rows, beat_specs, busy
+
+
+def python_distances(officers, beats):
+    rows = []
+    for officer in officers:
+        lat1, lon1 = radians(officer.lastLatitude or 0.0), radians(officer.lastLongitude or 0.0)
+        row = []
+        for beat in beats:
+            lat2, lon2 = radians(beat.latitude), radians(beat.longitude)
+            a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+            row.append(2 * assignment.EARTH_RADIUS_METERS * asin(sqrt(min(a, 1.0))))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="100,250,500,1000", help="comma-separated officers x beats sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--busy", type=float, default=0.1, help="share of officers with an overlapping duty")
+    parser.add_argument("--unlocated", type=float, default=0.05, help="share of officers with no position")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    print(f"{'size':>11} {'cost ms':>9} {'solve ms':>9} {'total ms':>9} {'python cost ms':>15} {'assigned':>9}")
+    for size in (int(value) for value in args.sizes.split(",") if value.strip()):
+        officers, beats, busy = make_problem(size, size, args.busy, args.unlocated)
+        costs, solves, assigned = [], [], 0
+        for _ in range(args.repeat):
+            _, _, rows, _, timings = assignment.plan(officers, beats, busy)
+            costs.append(timings["costMatrixMs"])
+            solves.append(timings["solveMs"])
+            assigned = len(rows)
+
+        started = time.perf_counter()
+        python_distances(officers, beats)
+        python_ms = (time.perf_counter() - started) * 1000
+
+        cost_ms, solve_ms = statistics.median(costs), statistics.median(solves)
+        print(f"{size:>5}x{size:<5} {cost_ms:9.1f} {solve_ms:9.1f} {cost_ms + solve_ms:9.1f} {python_ms:15.1f} {assigned:9d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Round trips and latency per check-in, before and after the single-batch path.
+
+Runs duty_check_in against a counting stand-in for the Prisma client that sleeps
+a simulated network round trip per query, and compares it with a replay of the
+previous sequence (find_unique duty, find_first log, create log, update duty,
+rollup batch).
+
+    cd backend && python benchmarks/checkin_roundtrips.py --checkins 2000 --rtt-ms 2
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.pop("FACE_RECOG_SERVICE_URL", None)
+
+from controllers import duties  # noqa: E402
+from models.model import User  # noqa: E402
+from models.schemas import CheckInSchema  # noqa: E402
+from services import duty_cache, reports  # noqa: E402
+
+
+class CountingClient:
+    """Just enough of the Prisma client for check-in, charging one simulated RTT per query"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.duties = {}
+        self.dutyassignment = SimpleNamespace(find_unique=self._find_duty, update=self._query)
+        self.dutylog = SimpleNamespace(find_first=self._find_log, create=self._create_log)
+
+    def is_connected(self):
+        return True
+
+    async def _trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt * (1 + random.expovariate(4)))
+
+    async def _query(self, **kwargs):
+        await self._trip()
+
+    async def _find_duty(self, where):
+        await self._trip()
+        return self.duties.get(where["id"])
+
+    async def _find_log(self, where):
+        await self._trip()
+        return None
+
+    async def _create_log(self, data):
+        await self._trip()
+        return SimpleNamespace(**data)
+
+    async def execute_raw(self, query, *args):
+        await self._trip()
+
+    def batch_(self):
+        client = self
+
+        class Batch:
+            def __init__(self):
+                self.dutylog = SimpleNamespace(create=self._queue)
+                self.dutyassignment = SimpleNamespace(update=self._queue)
+
+            def _queue(self, **kwargs):
+                pass
+
+            def execute_raw(self, query, *args):
+                pass
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                await client._trip()
+
+        return Batch()
+
+
+async def legacy_check_in(db, duty_id, officer_id):
+    duty = await db.dutyassignment.find_unique(where={"id": duty_id})
+    await db.dutylog.find_first(where={"dutyId": duty_id, "officerId": officer_id})
+    await db.dutylog.create(data={"dutyId": duty_id, "officerId": officer_id})
+    await db.dutyassignment.update(where={"id": duty_id}, data={"status": "COMPLETED"})
+    async with db.batch_() as batcher:
+        for statement in reports.duty_statements(duty, completed=1, checkin_time=datetime.now(timezone.utc), distance=5.0):
+            batcher.execute_raw(*statement)
+
+
+def make_duty(officer_id):
+    now = datetime.now(timezone.utc)
+    return SimpleNamespace(
+        id=os.urandom(8).hex(), officerId=officer_id, assignedBy="admin",
+        location="Beat", latitude=15.4909, longitude=73.8278, radius=100,
+        startTime=now - timedelta(minutes=5), endTime=now + timedelta(hours=4), status="PENDING",
+    )
+
+
+async def run(label, checkins, rtt, check_in, warm_cache=False):
+    db = CountingClient(rtt)
+    duties.db = db
+    officer = User(id="officer-1", empid="EMP001")
+    payload = CheckInSchema(latitude=15.4909, longitude=73.8278, selfieUrl="https://example.invalid/selfie.jpg")
+
+    latencies = []
+    for _ in range(checkins):
+        duty = make_duty(officer.id)
+        db.duties[duty.id] = duty
+        if warm_cache:
+            duty_cache.cache.set(duty.id, duty)
+        started = time.perf_counter()
+        await check_in(db, duty, officer, payload)
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<26} round trips/check-in: {db.round_trips / checkins:4.2f}   "
+          f"p50: {statistics.median(latencies) * 1000:6.2f} ms   p99: {p99 * 1000:6.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--checkins", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="simulated database round trip")
+    args = parser.parse_args()
+    rtt = args.rtt_ms / 1000
+
+    async def before(db, duty, officer, payload):
+        await legacy_check_in(db, duty.id, officer.id)
+
+    async def after(db, duty, officer, payload):
+        await duties.duty_check_in(duty.id, payload, current_user=officer)
+
+    await run("before", args.checkins, rtt, before)
+    await run("after (cold duty cache)", args.checkins, rtt, after)
+    await run("after (warm duty cache)", args.checkins, rtt, after, warm_cache=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
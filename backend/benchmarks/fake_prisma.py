@@ -0,0 +1,677 @@
+"""
+In-memory stand-in for the parts of the prisma-client-py API the backend uses.
+
+It is only meant for load tests on a laptop: `install()` registers it as the
+`prisma` and `prisma.errors` modules before the app is imported, so the
+controllers run unchanged against an in-process store. Every awaited call and
+every committed `batch_()` costs one simulated round trip (`latency` seconds),
+which keeps round-trip reductions visible in the numbers.
+
+Raw SQL is not parsed: register a Python handler per statement text with
+`register_raw(sql, handler)`; the handler receives the store and the query args.
+"""
+from datetime import datetime, timezone
+from types import ModuleType, SimpleNamespace
+import asyncio
+import contextvars
+import copy
+import sys
+import uuid
+
+
+class PrismaError(Exception):
+    pass
+
+
+class UniqueViolationError(PrismaError):
+    pass
+
+
+class RecordNotFoundError(PrismaError):
+    pass
+
+
+class ModelSpec:
+    def __init__(self, name, fields, datetimes=(), updated_at=(), key="id", unique=(), indexed=(), relations=None,
+                 autoincrement=False):
+        self.name = name
+        self.fields = fields
+        self.datetimes = set(datetimes)
+        self.updated_at = tuple(updated_at)
+        self.key = key
+        self.unique = [tuple(columns) for columns in unique]
+        self.indexed = tuple(indexed)
+        self.relations = relations or {}
+        self.autoincrement = autoincrement
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# field -> default (callables are called per row); relations are
+# name -> (model, local field, remote field, to-many)
+SPECS = {spec.name: spec for spec in (
+    ModelSpec(
+        "user",
+        {"id": None, "empid": None, "passwordHash": None, "role": "OFFICER", "profileImage": list,
+         "unreadNotifications": 0, "lastLatitude": None, "lastLongitude": None, "lastSeenAt": None,
+         "createdAt": _now, "updatedAt": None},
+        datetimes=("lastSeenAt", "createdAt", "updatedAt"), updated_at=("updatedAt",), unique=[("empid",)],
+        relations={
+            "dutyAssignments": ("dutyassignment", "id", "officerId", True),
+            "assignedDuties": ("dutyassignment", "id", "assignedBy", True),
+            "dutyLogs": ("dutylog", "id", "officerId", True),
+            "notifications": ("notification", "id", "userId", True),
+            "reports": ("dutyreport", "id", "officerId", True),
+            "faceEmbeddings": ("faceembedding", "id", "userId", True),
+        },
+    ),
+    ModelSpec(
+        "dutyassignment",
+        {"id": None, "officerId": None, "assignedBy": None, "location": None, "latitude": None,
+         "longitude": None, "radius": 100.0, "startTime": None, "endTime": None, "status": "PENDING",
+         "templateId": None},
+        datetimes=("startTime", "endTime"), unique=[("templateId", "officerId", "startTime")], indexed=("officerId",),
+        relations={
+            "officer": ("user", "officerId", "id", False),
+            "admin": ("user", "assignedBy", "id", False),
+            "template": ("patroltemplate", "templateId", "id", False),
+            "logs": ("dutylog", "id", "dutyId", True),
+        },
+    ),
+    ModelSpec(
+        "patroltemplate",
+        {"id": None, "createdBy": None, "location": None, "latitude": None, "longitude": None, "radius": 100.0,
+         "startMinute": None, "durationMinutes": None, "timezone": "Asia/Kolkata", "weekdays": list,
+         "officerIds": list, "officersPerShift": 1, "startDate": None, "endDate": None, "active": True,
+         "generatedUntil": None, "createdAt": _now, "updatedAt": None},
+        datetimes=("startDate", "endDate", "generatedUntil", "createdAt", "updatedAt"), updated_at=("updatedAt",),
+        relations={"duties": ("dutyassignment", "id", "templateId", True)},
+    ),
+    ModelSpec(
+        "dutylog",
+        {"id": None, "dutyId": None, "officerId": None, "checkinTime": _now, "selfiePath": None,
+         "faceVerified": False, "faceStatus": None, "faceConfidence": None, "locationVerified": False,
+         "remarks": None, "distance": None, "createdAt": _now, "updatedAt": _now},
+        datetimes=("checkinTime", "createdAt", "updatedAt"), unique=[("dutyId", "officerId")],
+        indexed=("dutyId", "officerId"),
+        relations={
+            "duty": ("dutyassignment", "dutyId", "id", False),
+            "officer": ("user", "officerId", "id", False),
+        },
+    ),
+    ModelSpec(
+        "notification",
+        {"id": None, "userId": None, "message": None, "type": None, "createdAt": _now, "read": False},
+        datetimes=("createdAt",), indexed=("userId",), relations={"user": ("user", "userId", "id", False)},
+    ),
+    ModelSpec(
+        "faceembedding",
+        {"id": None, "userId": None, "embedding": list, "quality": None, "modelVersion": "vggface2-160",
+         "createdAt": _now},
+        datetimes=("createdAt",), indexed=("userId",), relations={"user": ("user", "userId", "id", False)},
+    ),
+    ModelSpec(
+        "enrollmentjob",
+        {"id": None, "userId": None, "idempotencyKey": None, "status": "QUEUED", "statusCode": None,
+         "result": None, "createdAt": _now, "startedAt": None, "finishedAt": None},
+        datetimes=("createdAt", "startedAt", "finishedAt"), unique=[("idempotencyKey",)], indexed=("userId",),
+    ),
+    ModelSpec(
+        "facemodelversion",
+        {"id": None, "status": "PENDING", "active": False, "cursor": None, "processed": 0, "skipped": 0,
+         "error": None, "heartbeatAt": None, "createdAt": _now, "completedAt": None, "activatedAt": None},
+        datetimes=("heartbeatAt", "createdAt", "completedAt", "activatedAt"),
+    ),
+    ModelSpec(
+        "dutyreport",
+        {"id": None, "officerId": None, "date": None, "totalAssigned": 0, "completed": 0, "missed": 0,
+         "complianceRate": 0.0},
+        datetimes=("date",), unique=[("officerId", "date")], indexed=("officerId",), relations={"officer": ("user", "officerId", "id", False)},
+    ),
+    ModelSpec(
+        "analyticsrollup",
+        {"id": None, "officerId": None, "stationId": None, "date": None, "totalAssigned": 0, "completed": 0,
+         "missed": 0, "checkins": 0, "latencySum": 0.0, "latencyBuckets": list, "distanceSum": 0.0,
+         "distanceBuckets": list},
+        datetimes=("date",), unique=[("officerId", "stationId", "date")],
+    ),
+    ModelSpec(
+        "collectionversion",
+        {"key": None, "version": 0, "updatedAt": _now},
+        datetimes=("updatedAt",), updated_at=("updatedAt",), key="key",
+    ),
+    ModelSpec(
+        "syncchange",
+        {"seq": None, "officerId": None, "entity": None, "entityId": None, "deleted": False, "createdAt": _now},
+        datetimes=("createdAt",), key="seq", indexed=("officerId",), autoincrement=True,
+    ),
+    ModelSpec(
+        "synchorizon",
+        {"id": None, "seq": 0, "updatedAt": _now},
+        datetimes=("updatedAt",), updated_at=("updatedAt",),
+    ),
+)}
+
+
+def _coerce(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _comparable(value, operand):
+    if isinstance(value, datetime):
+        return value, _coerce(operand)
+    return value, operand
+
+
+def _match_field(value, condition) -> bool:
+    if not isinstance(condition, dict):
+        value, condition = _comparable(value, condition)
+        return value == condition
+
+    for op, operand in condition.items():
+        if op == "mode":
+            continue
+        if op == "not":
+            if _match_field(value, operand):
+                return False
+            continue
+        if op == "equals":
+            if not _match_field(value, operand):
+                return False
+            continue
+        if op in ("in", "not_in", "notIn"):
+            members = {_coerce(item) for item in operand} if isinstance(value, datetime) else set(operand)
+            if (value in members) != (op == "in"):
+                return False
+            continue
+        if op == "has":
+            if operand not in (value or []):
+                return False
+            continue
+        if op == "contains":
+            if value is None or operand not in value:
+                return False
+            continue
+        if op == "startsWith":
+            if value is None or not value.startswith(operand):
+                return False
+            continue
+        if value is None:
+            return False
+        left, right = _comparable(value, operand)
+        if op == "lt" and not left < right:
+            return False
+        if op == "lte" and not left <= right:
+            return False
+        if op == "gt" and not left > right:
+            return False
+        if op == "gte" and not left >= right:
+            return False
+    return True
+
+
+class Store:
+    """Rows per model keyed by primary key, with an undo journal for batches and transactions"""
+
+    def __init__(self):
+        self.tables = {name: {} for name in SPECS}
+        self.sequences = {name: 0 for name in SPECS}
+        self.indexes = {name: {columns: {} for columns in spec.unique} for name, spec in SPECS.items()}
+        self.lookups = {name: {field: {} for field in spec.indexed} for name, spec in SPECS.items()}
+        self.raw_handlers = {}
+        self._journal = contextvars.ContextVar(f"journal-{id(self)}", default=None)
+
+    # -- primitives -------------------------------------------------------
+
+    def _write(self, model, key, row):
+        table = self.tables[model]
+        indexes = self.indexes[model]
+        lookups = self.lookups[model]
+        previous = table.pop(key, None)
+        if previous is not None:
+            for columns, index in indexes.items():
+                index.pop(tuple(getattr(previous, column) for column in columns), None)
+            for field, lookup in lookups.items():
+                lookup.get(getattr(previous, field), {}).pop(key, None)
+        if row is not None:
+            table[key] = row
+            for columns, index in indexes.items():
+                index[tuple(getattr(row, column) for column in columns)] = key
+            for field, lookup in lookups.items():
+                # dicts keep insertion order, so narrowed scans still see rows oldest first
+                lookup.setdefault(getattr(row, field), {})[key] = None
+        return previous
+
+    def _put(self, model, key, row):
+        previous = self._write(model, key, row)
+        if self.journal is not None:
+            self.journal.append((model, key, previous))
+
+    @property
+    def journal(self):
+        # Per task, so transactions on concurrent requests keep separate undo logs
+        return self._journal.get()
+
+    @journal.setter
+    def journal(self, value):
+        self._journal.set(value)
+
+    def rollback(self, journal):
+        for model, key, previous in reversed(journal):
+            self._write(model, key, previous)
+
+    def matches(self, spec, row, where) -> bool:
+        if not where:
+            return True
+        for field, condition in where.items():
+            if field == "AND":
+                conditions = condition if isinstance(condition, list) else [condition]
+                if not all(self.matches(spec, row, c) for c in conditions):
+                    return False
+            elif field == "OR":
+                if not any(self.matches(spec, row, c) for c in condition):
+                    return False
+            elif field == "NOT":
+                conditions = condition if isinstance(condition, list) else [condition]
+                if any(self.matches(spec, row, c) for c in conditions):
+                    return False
+            elif field in spec.relations:
+                if not self._match_relation(spec, row, field, condition):
+                    return False
+            elif not _match_field(getattr(row, field), condition):
+                return False
+        return True
+
+    def _related(self, spec, row, relation):
+        model, local, remote, _ = spec.relations[relation]
+        value = getattr(row, local)
+        target = SPECS[model]
+        if remote == target.key:
+            found = self.tables[model].get(value)
+            return [found] if found is not None else []
+        return [other for other in self.tables[model].values() if getattr(other, remote) == value]
+
+    def _match_relation(self, spec, row, relation, condition) -> bool:
+        target = SPECS[spec.relations[relation][0]]
+        related = self._related(spec, row, relation)
+        for op, where in condition.items():
+            if op == "some" and not any(self.matches(target, other, where) for other in related):
+                return False
+            if op == "none" and any(self.matches(target, other, where) for other in related):
+                return False
+            if op == "every" and not all(self.matches(target, other, where) for other in related):
+                return False
+            if op == "is" and not (related and self.matches(target, related[0], where)):
+                return False
+        return True
+
+    def _output(self, spec, row, include):
+        # Stored rows are replaced rather than mutated, so they can be handed out as is
+        if not include:
+            return row
+        row = copy.copy(row)
+        for relation, option in (include or {}).items():
+            if not option:
+                continue
+            target = SPECS[spec.relations[relation][0]]
+            related = [copy.copy(other) for other in self._related(spec, row, relation)]
+            if isinstance(option, dict) and option.get("where"):
+                related = [other for other in related if self.matches(target, other, option["where"])]
+            setattr(row, relation, related if spec.relations[relation][3] else (related[0] if related else None))
+        return row
+
+    def _check_unique(self, spec, row, ignore_key=None):
+        key = getattr(row, spec.key)
+        if key in self.tables[spec.name] and key != ignore_key:
+            raise UniqueViolationError(f"Unique constraint failed on {spec.name}.{spec.key}")
+        for columns, index in self.indexes[spec.name].items():
+            values = tuple(getattr(row, column) for column in columns)
+            if None in values:
+                # NULLs never collide in a unique index
+                continue
+            other_key = index.get(values)
+            if other_key is not None and other_key != ignore_key:
+                raise UniqueViolationError(f"Unique constraint failed on {spec.name}{columns}")
+
+    def _candidates(self, spec, where):
+        """Rows that can match `where`, narrowed by the primary key or a unique index when possible"""
+        table = self.tables[spec.name]
+        if where:
+            key = where.get(spec.key)
+            if key is not None and not isinstance(key, dict):
+                row = table.get(_coerce(key) if spec.key in spec.datetimes else key)
+                return [row] if row is not None else []
+            for columns, index in self.indexes[spec.name].items():
+                values = [where.get(column) for column in columns]
+                if all(value is not None and not isinstance(value, dict) for value in values):
+                    values = [_coerce(value) if column in spec.datetimes else value
+                              for column, value in zip(columns, values)]
+                    found = index.get(tuple(values))
+                    return [table[found]] if found is not None else []
+            for field, lookup in self.lookups[spec.name].items():
+                value = where.get(field)
+                if value is not None and not isinstance(value, dict):
+                    return [table[key] for key in lookup.get(value, ())]
+        return list(table.values())
+
+    def _build(self, spec, data):
+        values = {}
+        for field, default in spec.fields.items():
+            if field in data:
+                value = data[field]
+            else:
+                value = default() if callable(default) else default
+            if field in spec.datetimes:
+                value = _coerce(value)
+            values[field] = value
+        if values[spec.key] is None:
+            if spec.autoincrement:
+                self.sequences[spec.name] += 1
+                values[spec.key] = self.sequences[spec.name]
+            else:
+                values[spec.key] = str(uuid.uuid4())
+        for field in spec.updated_at:
+            if data.get(field) is None:
+                values[field] = _now()
+        return SimpleNamespace(**values)
+
+    def _apply(self, spec, row, data):
+        values = vars(row).copy()
+        for field, value in data.items():
+            if isinstance(value, dict):
+                current = values.get(field)
+                if "increment" in value:
+                    value = current + value["increment"]
+                elif "decrement" in value:
+                    value = current - value["decrement"]
+                elif "multiply" in value:
+                    value = current * value["multiply"]
+                elif "set" in value:
+                    value = value["set"]
+                elif "push" in value:
+                    pushed = value["push"]
+                    value = list(current or []) + (pushed if isinstance(pushed, list) else [pushed])
+            if field in spec.datetimes:
+                value = _coerce(value)
+            values[field] = value
+        for field in spec.updated_at:
+            if field not in data:
+                values[field] = _now()
+        return SimpleNamespace(**values)
+
+    def _select(self, spec, where=None, order=None, take=None, skip=None, cursor=None):
+        rows = [row for row in self._candidates(spec, where) if self.matches(spec, row, where)]
+        orders = order if isinstance(order, list) else ([order] if order else [])
+        for clause in reversed(orders):
+            for field, direction in reversed(list(clause.items())):
+                present = [row for row in rows if getattr(row, field) is not None]
+                missing = [row for row in rows if getattr(row, field) is None]
+                present.sort(key=lambda row: getattr(row, field), reverse=direction == "desc")
+                rows = present + missing
+        if cursor:
+            field, value = next(iter(cursor.items()))
+            for index, row in enumerate(rows):
+                if getattr(row, field) == value:
+                    rows = rows[index:]
+                    break
+            else:
+                rows = []
+        if skip:
+            rows = rows[skip:]
+        if take is not None:
+            rows = rows[:take] if take >= 0 else rows[take:]
+        return rows
+
+    # -- actions ----------------------------------------------------------
+
+    def find_many(self, model, where=None, order=None, take=None, skip=None, cursor=None, include=None, **_):
+        spec = SPECS[model]
+        return [self._output(spec, row, include) for row in self._select(spec, where, order, take, skip, cursor)]
+
+    def find_first(self, model, where=None, order=None, skip=None, cursor=None, include=None, **_):
+        rows = self.find_many(model, where, order, 1, skip, cursor, include)
+        return rows[0] if rows else None
+
+    def find_unique(self, model, where, include=None, **_):
+        return self.find_first(model, where, include=include)
+
+    def count(self, model, where=None, **_):
+        return len(self._select(SPECS[model], where))
+
+    def create(self, model, data, include=None, **_):
+        spec = SPECS[model]
+        row = self._build(spec, data)
+        self._check_unique(spec, row)
+        self._put(model, getattr(row, spec.key), row)
+        return self._output(spec, row, include)
+
+    def create_many(self, model, data, skip_duplicates=False, **_):
+        created = 0
+        for item in data:
+            try:
+                self.create(model, item)
+                created += 1
+            except UniqueViolationError:
+                if not skip_duplicates:
+                    raise
+        return created
+
+    def update(self, model, where, data, include=None, **_):
+        spec = SPECS[model]
+        rows = self._select(spec, where, take=1)
+        if not rows:
+            return None
+        key = getattr(rows[0], spec.key)
+        row = self._apply(spec, rows[0], data)
+        self._check_unique(spec, row, ignore_key=key)
+        self._put(model, key, row)
+        return self._output(spec, row, include)
+
+    def update_many(self, model, data, where=None, **_):
+        spec = SPECS[model]
+        rows = self._select(spec, where)
+        for row in rows:
+            self._put(model, getattr(row, spec.key), self._apply(spec, row, data))
+        return len(rows)
+
+    def upsert(self, model, where, data, include=None, **_):
+        spec = SPECS[model]
+        if self._select(spec, where, take=1):
+            return self.update(model, where, data["update"], include)
+        return self.create(model, data["create"], include)
+
+    def delete(self, model, where, include=None, **_):
+        spec = SPECS[model]
+        rows = self._select(spec, where, take=1)
+        if not rows:
+            return None
+        output = self._output(spec, rows[0], include)
+        self._put(model, getattr(rows[0], spec.key), None)
+        return output
+
+    def delete_many(self, model, where=None, **_):
+        spec = SPECS[model]
+        rows = self._select(spec, where)
+        for row in rows:
+            self._put(model, getattr(row, spec.key), None)
+        return len(rows)
+
+    def execute_raw(self, query, *args):
+        handler = self.raw_handlers.get(query)
+        if handler is None:
+            raise NotImplementedError(f"No fake handler registered for raw query: {query.strip()[:80]}")
+        return handler(self, *args)
+
+    def atomically(self, operations):
+        """Run [(callable, args, kwargs)] all-or-nothing"""
+        outer, self.journal = self.journal, []
+        try:
+            results = [operation(*args, **kwargs) for operation, args, kwargs in operations]
+        except Exception:
+            self.rollback(self.journal)
+            raise
+        finally:
+            journal, self.journal = self.journal, outer
+            if outer is not None:
+                outer.extend(journal)
+        return results
+
+
+_ACTIONS = ("find_many", "find_first", "find_unique", "count", "create", "create_many", "update",
+            "update_many", "upsert", "delete", "delete_many")
+
+
+def _make_actions_class(model):
+    def make(action):
+        async def call(self, *args, **kwargs):
+            await self._client._round_trip()
+            return getattr(self._client._store, action)(model, *args, **kwargs)
+        call.__name__ = action
+        return call
+
+    attrs = {action: make(action) for action in _ACTIONS}
+    attrs["__init__"] = lambda self, client: setattr(self, "_client", client)
+    # The instrumented client recognises model accessors by this suffix
+    return type(f"{model.capitalize()}Actions", (), attrs)
+
+
+_ACTIONS_CLASSES = {model: _make_actions_class(model) for model in SPECS}
+
+
+class _BatchActions:
+    def __init__(self, batch, model):
+        self._batch = batch
+        self._model = model
+
+    def __getattr__(self, action):
+        if action not in _ACTIONS:
+            raise AttributeError(action)
+        store_method = getattr(self._batch._store, action)
+        model = self._model
+
+        def queue(*args, **kwargs):
+            self._batch._operations.append((store_method, (model, *args), kwargs))
+
+        return queue
+
+
+class Batch:
+    def __init__(self, client):
+        self._client = client
+        self._store = client._store
+        self._operations = []
+        for model in SPECS:
+            setattr(self, model, _BatchActions(self, model))
+
+    def execute_raw(self, query, *args):
+        self._operations.append((self._store.execute_raw, (query, *args), {}))
+
+    async def commit(self):
+        operations, self._operations = self._operations, []
+        if not operations:
+            return
+        await self._client._round_trip()
+        self._store.atomically(operations)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None:
+            await self.commit()
+
+
+class _Transaction:
+    def __init__(self, client):
+        self._client = client
+
+    async def __aenter__(self):
+        store = self._client._store
+        self._outer, store.journal = store.journal, []
+        return self._client
+
+    async def __aexit__(self, exc_type, exc, tb):
+        store = self._client._store
+        journal, store.journal = store.journal, self._outer
+        if exc is not None:
+            store.rollback(journal)
+        elif self._outer is not None:
+            self._outer.extend(journal)
+
+
+class Prisma:
+    """Drop-in for prisma.Prisma backed by a Store shared by every instance"""
+
+    store = None
+    latency = 0.0
+
+    def __init__(self, **kwargs):
+        if Prisma.store is None:
+            Prisma.store = Store()
+        self._store = Prisma.store
+        self._connected = False
+        for model, actions_class in _ACTIONS_CLASSES.items():
+            setattr(self, model, actions_class(self))
+
+    async def _round_trip(self):
+        if Prisma.latency:
+            await asyncio.sleep(Prisma.latency)
+        else:
+            await asyncio.sleep(0)
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def connect(self, **kwargs):
+        self._connected = True
+
+    async def disconnect(self, **kwargs):
+        self._connected = False
+
+    def batch_(self):
+        return Batch(self)
+
+    def tx(self, **kwargs):
+        # Interleaving coroutines are not isolated from the transaction; fine for load tests
+        return _Transaction(self)
+
+    async def execute_raw(self, query, *args):
+        await self._round_trip()
+        return self._store.execute_raw(query, *args)
+
+    async def query_raw(self, query, *args, **kwargs):
+        await self._round_trip()
+        return self._store.execute_raw(query, *args)
+
+
+def register_raw(query: str, handler):
+    if Prisma.store is None:
+        Prisma.store = Store()
+    Prisma.store.raw_handlers[query] = handler
+
+
+def install(latency: float = 0.0):
+    """Register this module as `prisma` / `prisma.errors`; call before importing the app"""
+    Prisma.latency = latency
+    if Prisma.store is None:
+        Prisma.store = Store()
+    module = sys.modules[__name__]
+    errors = ModuleType("prisma.errors")
+    for name in ("PrismaError", "UniqueViolationError", "RecordNotFoundError"):
+        setattr(errors, name, getattr(module, name))
+    package = ModuleType("prisma")
+    package.Prisma = Prisma
+    package.errors = errors
+    package.__path__ = []
+    sys.modules["prisma"] = package
+    sys.modules["prisma.errors"] = errors
+    return Prisma.store
@@ -0,0 +1,371 @@
+"""
+Load test for the backend without Postgres or the face service.
+
+Boots app.py in-process against benchmarks/fake_prisma.py (every query and
+every committed batch costs --db-latency-ms) and a stub face service (httpx
+MockTransport answering /verify after --face-latency-ms), then drives it with
+httpx's ASGI transport through these phases:
+
+    login        every officer logs in at once
+    shift-start  every officer checks in to the duty that just started and
+                 sends a first location ping
+    steady       location pings, officers polling their duties / sync and
+                 notification badge, and admins polling the dashboard lists, analytics and reports
+
+Reports throughput and p50/p95/p99 latency per endpoint for each phase, plus
+the mean database round trips per request from the query tracer.
+
+    cd backend && python benchmarks/loadtest.py --officers 500 --phases login,shift-start,steady
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_prisma  # noqa: E402
+
+PASSWORD = "loadtest-password"
+GOA = (15.4909, 73.8278)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client, label: str, method: str, url: str, ok=(200, 201, 202, 304), **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - started)
+        if response.status_code not in ok:
+            self.errors[label] += 1
+            self.statuses[label][response.status_code] += 1
+        return response
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def queries_per_request(metrics, label):
+    route = label.split(" ", 1)[1]
+    child = metrics.db_queries_per_request.children.get((route,))
+    return child.sum / child.count if child and child.count else 0.0
+
+
+def report(phase, wall, recorder, metrics):
+    total = sum(len(values) for values in recorder.latencies.values())
+    print(f"\n== {phase}: {total} requests in {wall:.2f}s ({total / wall:.0f} req/s)")
+    print(f"{'endpoint':45} {'n':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}")
+    rows = {}
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        rows[label] = {
+            "count": len(values),
+            "errors": recorder.errors[label],
+            "throughput": len(values) / wall,
+            "p50": percentile(values, 0.50) * 1000,
+            "p95": percentile(values, 0.95) * 1000,
+            "p99": percentile(values, 0.99) * 1000,
+            "queries": queries_per_request(metrics, label),
+        }
+        row = rows[label]
+        print(f"{label:45} {row['count']:>6} {row['errors']:>5} {row['throughput']:>8.0f} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} {row['queries']:>6.1f}")
+    for label, statuses in sorted(recorder.statuses.items()):
+        print(f"  {label} failures by status: " + ", ".join(f"{code}={n}" for code, n in sorted(statuses.items())))
+    return {"wall": wall, "requests": total, "endpoints": rows}
+
+
+async def run_jobs(jobs, concurrency):
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def worker():
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await job()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def install_raw_handlers(reports, analytics):
+    """Python equivalents of the rollup upserts and missed-duty flip the services issue as raw SQL"""
+
+    def rollup_upsert(store, row_id, officer_id, date, assigned, completed, missed):
+        where = {"officerId": officer_id, "date": date}
+        row = store.find_unique("dutyreport", where)
+        if row is None:
+            store.create("dutyreport", {"id": row_id, **where, "totalAssigned": assigned, "completed": completed,
+                                        "missed": missed, "complianceRate": completed / assigned if assigned else 0})
+            return 1
+        total, done = row.totalAssigned + assigned, row.completed + completed
+        store.update("dutyreport", where, {
+            "totalAssigned": total, "completed": done, "missed": row.missed + missed,
+            "complianceRate": done / total if total else 0,
+        })
+        return 1
+
+    def analytics_upsert(store, row_id, officer_id, station_id, date, assigned, completed, missed, checkins,
+                         latency_sum, latency_buckets, distance_sum, distance_buckets):
+        where = {"officerId": officer_id, "stationId": station_id, "date": date}
+        row = store.find_unique("analyticsrollup", where)
+        if row is None:
+            store.create("analyticsrollup", {
+                "id": row_id, **where, "totalAssigned": assigned, "completed": completed, "missed": missed,
+                "checkins": checkins, "latencySum": latency_sum, "latencyBuckets": list(latency_buckets),
+                "distanceSum": distance_sum, "distanceBuckets": list(distance_buckets),
+            })
+            return 1
+        store.update("analyticsrollup", where, {
+            "totalAssigned": row.totalAssigned + assigned, "completed": row.completed + completed,
+            "missed": row.missed + missed, "checkins": row.checkins + checkins,
+            "latencySum": row.latencySum + latency_sum,
+            "latencyBuckets": [a + b for a, b in zip(row.latencyBuckets, latency_buckets)],
+            "distanceSum": row.distanceSum + distance_sum,
+            "distanceBuckets": [a + b for a, b in zip(row.distanceBuckets, distance_buckets)],
+        })
+        return 1
+
+    def mark_missed(store, ids):
+        flipped = []
+        for duty_id in ids:
+            if store.update_many("dutyassignment", where={"id": duty_id, "status": "PENDING"}, data={"status": "MISSED"}):
+                flipped.append({"id": duty_id})
+        return flipped
+
+    fake_prisma.register_raw(reports.ROLLUP_UPSERT_SQL, rollup_upsert)
+    fake_prisma.register_raw(reports.MARK_MISSED_SQL, mark_missed)
+    fake_prisma.register_raw(analytics.ANALYTICS_UPSERT_SQL, analytics_upsert)
+
+
+def stub_face_service(httpx, latency_seconds, reject_rate):
+    async def handler(request):
+        await asyncio.sleep(random.expovariate(1 / latency_seconds) if latency_seconds else 0)
+        if request.url.path != "/verify":
+            return httpx.Response(404, json={"detail": "Not found"})
+        verified = random.random() >= reject_rate
+        return httpx.Response(200, json={"verified": verified, "confidence": 0.92 if verified else 0.31})
+
+    return httpx.MockTransport(handler)
+
+
+async def seed(store, args, passlib_bcrypt, reports, db):
+    now = datetime.now(timezone.utc)
+    password_hash = passlib_bcrypt.using(rounds=args.bcrypt_rounds).hash(PASSWORD)
+    admins = [
+        store.create("user", {"id": f"admin-{i}", "empid": f"SHO{i:03d}", "role": "ADMIN",
+                              "passwordHash": password_hash})
+        for i in range(max(1, args.officers // 50))
+    ]
+    officers, duties = [], {}
+    for i in range(args.officers):
+        officer = store.create("user", {"id": f"officer-{i}", "empid": f"EMP{i:05d}", "role": "OFFICER",
+                                        "passwordHash": password_hash,
+                                        "profileImage": [f"https://images.invalid/{i}.jpg"]})
+        officers.append(officer)
+        admin = admins[i % len(admins)]
+        latitude, longitude = GOA[0] + random.uniform(-0.2, 0.2), GOA[1] + random.uniform(-0.2, 0.2)
+        for day in range(args.history_days, 0, -1):
+            start = now - timedelta(days=day)
+            store.create("dutyassignment", {
+                "id": f"duty-{i}-{day}", "officerId": officer.id, "assignedBy": admin.id,
+                "location": f"Beat {i % 40}", "latitude": latitude, "longitude": longitude,
+                "startTime": start, "endTime": start + timedelta(hours=8),
+                "status": "COMPLETED" if random.random() < 0.85 else "MISSED",
+            })
+        duties[officer.id] = store.create("dutyassignment", {
+            "id": f"duty-{i}-now", "officerId": officer.id, "assignedBy": admin.id,
+            "location": f"Beat {i % 40}", "latitude": latitude, "longitude": longitude,
+            "startTime": now - timedelta(minutes=5), "endTime": now + timedelta(hours=8),
+        })
+    await reports.rebuild_reports(db)
+    return admins, officers, duties
+
+
+async def main_async(args):
+    import httpx
+    from passlib.hash import bcrypt as passlib_bcrypt
+
+    app_module = importlib.import_module("app")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import metrics
+    from database import db
+    from models.model import User
+    from security import SECRET_KEY
+    from services import analytics, reports
+    from services.face_client import face_client
+
+    install_raw_handlers(reports, analytics)
+    face_client._client = httpx.AsyncClient(
+        base_url=face_client.base_url, transport=stub_face_service(httpx, args.face_latency_ms / 1000, args.reject_rate)
+    )
+
+    store = fake_prisma.Prisma.store
+    seed_started = time.perf_counter()
+    admins, officers, duties = await seed(store, args, passlib_bcrypt, reports, db)
+    print(f"Seeded {len(officers)} officers, {len(admins)} admins, "
+          f"{sum(len(t) for t in store.tables.values())} rows in {time.perf_counter() - seed_started:.1f}s "
+          f"(db latency {args.db_latency_ms}ms, face latency {args.face_latency_ms}ms, bcrypt rounds {args.bcrypt_rounds})")
+
+    def bearer(user):
+        return {"Authorization": f"Bearer {User.from_row(user).generate_token(SECRET_KEY)}"}
+
+    officer_headers = {officer.id: bearer(officer) for officer in officers}
+    admin_headers = [bearer(admin) for admin in admins]
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+
+        async def phase(name, jobs):
+            metrics.db_queries_per_request.children.clear()
+            recorder.latencies.clear()
+            recorder.errors.clear()
+            recorder.statuses.clear()
+            started = time.perf_counter()
+            await run_jobs(jobs, args.concurrency)
+            results[name] = report(name, time.perf_counter() - started, recorder, metrics)
+
+        recorder = Recorder()
+
+        def login(officer):
+            return lambda: recorder.call(client, "POST /users/login", "POST", "/users/login",
+                                         json={"empid": officer.empid, "password": PASSWORD})
+
+        def check_in(officer):
+            duty = duties[officer.id]
+            return lambda: recorder.call(
+                client, "POST /duties/{duty_id}/checkin", "POST", f"/duties/{duty.id}/checkin",
+                headers=officer_headers[officer.id], ok=(200, 403),
+                json={"latitude": duty.latitude + 0.0001, "longitude": duty.longitude,
+                      "selfieUrl": f"https://images.invalid/selfies/{officer.id}.jpg"},
+            )
+
+        def ping(officer):
+            duty = duties[officer.id]
+            return lambda: recorder.call(
+                client, "POST /duties/location-update", "POST", "/duties/location-update",
+                headers=officer_headers[officer.id],
+                json={"latitude": duty.latitude + random.uniform(-0.001, 0.001), "longitude": duty.longitude,
+                      "dutyId": duty.id, "location_verified": True},
+            )
+
+        def shift_start(officer):
+            async def job():
+                await check_in(officer)()
+                await ping(officer)()
+            return job
+
+        etags = {}
+
+        def poll(headers, label, url, key):
+            async def job():
+                extra = {"If-None-Match": etags[key]} if key in etags else {}
+                # An officer who has not pinged yet has no location to show
+                response = await recorder.call(client, label, "GET", url, headers={**headers, **extra},
+                                               ok=(200, 304, 404))
+                if "etag" in response.headers:
+                    etags[key] = response.headers["etag"]
+            return job
+
+        sync_tokens = {}
+
+        def sync(officer):
+            async def job():
+                token = sync_tokens.get(officer.id)
+                response = await recorder.call(client, "GET /duties/sync", "GET", "/duties/sync",
+                                               headers=officer_headers[officer.id],
+                                               params={"token": token} if token else {})
+                if response.status_code == 200:
+                    sync_tokens[officer.id] = response.json()["token"]
+            return job
+
+        def steady_job():
+            roll = random.random()
+            officer = random.choice(officers)
+            if roll < 0.65:
+                return ping(officer)
+            if roll < 0.75:
+                return poll(officer_headers[officer.id], "GET /duties/my-duties", "/duties/my-duties",
+                            f"my:{officer.id}")
+            if roll < 0.85:
+                return sync(officer)
+            if roll < 0.9:
+                return poll(officer_headers[officer.id], "GET /notifications/unread-count",
+                            "/notifications/unread-count", None)
+            admin = random.randrange(len(admins))
+            headers = admin_headers[admin]
+            choice = random.choice((
+                ("GET /duties/", "/duties/", f"duties:{admin}"),
+                ("GET /duties/users/all", "/duties/users/all", f"users:{admin}"),
+                ("GET /analytics/overview", "/analytics/overview", None),
+                ("GET /reports/daily", "/reports/daily", None),
+                ("GET /duties/location-update/{officer_id}", f"/duties/location-update/{officer.id}", None),
+                ("GET /duties/nearest-officers", "/duties/nearest-officers?latitude={:.4f}&longitude={:.4f}".format(
+                    GOA[0] + random.uniform(-0.2, 0.2), GOA[1] + random.uniform(-0.2, 0.2)), None),
+            ))
+            return poll(headers, *choice)
+
+        phases = [name.strip() for name in args.phases.split(",") if name.strip()]
+        for name in phases:
+            if name == "login":
+                await phase(name, [login(officer) for officer in officers])
+            elif name == "shift-start":
+                # Each officer checks in, then the app starts its location pings
+                jobs = [shift_start(officer) for officer in officers]
+                random.shuffle(jobs)
+                await phase(name, jobs)
+            elif name == "steady":
+                await phase(name, [steady_job() for _ in range(args.requests)])
+            else:
+                raise SystemExit(f"Unknown phase: {name}")
+
+    await face_client.close()
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--officers", type=int, default=300)
+    parser.add_argument("--history-days", type=int, default=7, help="past duties per officer")
+    parser.add_argument("--phases", default="login,shift-start,steady")
+    parser.add_argument("--requests", type=int, default=5000, help="requests in the steady phase")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="simulated cost of one round trip")
+    parser.add_argument("--face-latency-ms", type=float, default=150.0, help="mean stub face service latency")
+    parser.add_argument("--reject-rate", type=float, default=0.02, help="share of selfies the stub rejects")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="cost of the seeded password hashes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("SECRET_KEY", "loadtest-secret")
+    os.environ.setdefault("FACE_RECOG_SERVICE_URL", "http://face-stub")
+    os.environ["SKIP_PRISMA_GENERATE"] = "true"
+    fake_prisma.install(latency=args.db_latency_ms / 1000)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Per-request cost of MetricsMiddleware.
+
+Drives a trivial ASGI app directly (no server, no sockets) with and without the
+middleware in front of it and reports the difference per request. The scope
+carries a matched route the way FastAPI's router leaves it, so the templated
+label path is exercised.
+
+    cd backend && python benchmarks/middleware_overhead.py --requests 200000
+"""
+from types import SimpleNamespace
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+ROUTES = [SimpleNamespace(path=path) for path in (
+    "/duties/me", "/duties/{duty_id}/checkin", "/duties/{duty_id}/location-updates", "/users/login",
+)]
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTES[scope["i"] & 3]
+    await send(START)
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        await app({"type": "http", "method": "GET", "i": i}, receive, send)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wrapped = metrics.MetricsMiddleware(endpoint)
+    loop = asyncio.new_event_loop()
+    bare = min(loop.run_until_complete(drive(endpoint, args.requests)) for _ in range(args.repeat))
+    timed = min(loop.run_until_complete(drive(wrapped, args.requests)) for _ in range(args.repeat))
+    loop.close()
+
+    per_request = (timed - bare) / args.requests * 1e6
+    print(f"bare endpoint:     {bare / args.requests * 1e6:7.3f} us/request")
+    print(f"with middleware:   {timed / args.requests * 1e6:7.3f} us/request")
+    print(f"middleware cost:   {per_request:7.3f} us/request")
+    print(f"histogram series:  {len(metrics.http_latency.children)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Memory and construction time for 100k domain model instances.
+
+Compares the slotted models in models/model.py, built with the constructor and
+with from_row, against a copy of the previous plain-class User that allocated a
+__dict__, six relation lists, a UUID and a timestamp per instance.
+
+    cd backend && python benchmarks/model_memory.py --count 100000
+"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.model import Role, User  # noqa: E402
+
+
+class LegacyUser:
+    def __init__(self, id=None, empid=None, passwordHash=None, role=Role.OFFICER, profileImage=None,
+                 createdAt=None, updatedAt=None, dutyAssignments=None, assignedDuties=None,
+                 dutyLogs=None, notifications=None, reports=None, faceEmbeddings=None):
+        self.id = id or str(uuid.uuid4())
+        self.empid = empid
+        self.passwordHash = passwordHash
+        self.role = Role(role) if isinstance(role, str) else role
+        self.profileImage = profileImage if profileImage is not None else []
+        self.createdAt = createdAt or datetime.now(timezone.utc)
+        self.updatedAt = updatedAt
+        self.dutyAssignments = dutyAssignments or []
+        self.assignedDuties = assignedDuties or []
+        self.dutyLogs = dutyLogs or []
+        self.notifications = notifications or []
+        self.reports = reports or []
+        self.faceEmbeddings = faceEmbeddings or []
+
+
+def make_rows(count):
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(id=f"user-{i}", empid=f"EMP{i:06d}", passwordHash=None, role="OFFICER",
+                        profileImage=None, unreadNotifications=0, lastLatitude=None, lastLongitude=None,
+                        lastSeenAt=None, createdAt=created, updatedAt=None)
+        for i in range(count)
+    ]
+
+
+def legacy(rows):
+    return [LegacyUser(id=r.id, empid=r.empid, role=r.role, profileImage=r.profileImage or [],
+                       passwordHash=r.passwordHash, createdAt=r.createdAt, updatedAt=r.updatedAt) for r in rows]
+
+
+def constructor(rows):
+    return [User(id=r.id, empid=r.empid, role=r.role, profileImage=r.profileImage or [],
+                 passwordHash=r.passwordHash, createdAt=r.createdAt, updatedAt=r.updatedAt) for r in rows]
+
+
+def from_row(rows):
+    return [User.from_row(r) for r in rows]
+
+
+def measure(label, build, rows):
+    gc.collect()
+    started = time.perf_counter()
+    instances = build(rows)
+    elapsed = time.perf_counter() - started
+    del instances
+
+    gc.collect()
+    tracemalloc.start()
+    instances = build(rows)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+
+    print(f"{label:<22} {elapsed * 1000:9.1f} ms   {allocated / len(rows):7.0f} bytes/instance")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.count)
+    measure("legacy plain class", legacy, rows)
+    measure("slotted constructor", constructor, rows)
+    measure("slotted from_row", from_row, rows)
+
+
+if __name__ == "__main__":
+    main()
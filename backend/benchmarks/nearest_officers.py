@@ -0,0 +1,80 @@
+"""
+Latency of k-nearest on-duty officer queries.
+
+Places random officers around Goa (a share of them on duty), loads them into
+services/positions.py's grid index, and times OfficerIndex.nearest against a
+NumPy scan of every on-duty officer's distance, median of --queries random
+incident points. Index answers are checked against the scan.
+
+    cd backend && python benchmarks/nearest_officers.py --sizes 1000,5000,20000
+"""
+from datetime import datetime, timezone
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import positions  # noqa: E402
+from services.assignment import distance_matrix  # noqa: E402
+
+GOA = (15.4909, 73.8278)
+
+
+def scan(index, on_duty, latitude, longitude, k):
+    ids = [user_id for user_id in index.positions if user_id in on_duty]
+    points = [index.positions[user_id] for user_id in ids]
+    distances = distance_matrix([latitude], [longitude], [p[0] for p in points], [p[1] for p in points])[0]
+    nearest = np.argsort(distances)[:k]
+    return [(float(distances[i]), ids[i]) for i in nearest]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,5000,20000", help="comma-separated officer counts")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--on-duty", type=float, default=0.6, help="share of officers on duty")
+    parser.add_argument("--spread", type=float, default=0.3, help="degrees officers are spread around Goa")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    seen_at = datetime.now(timezone.utc)
+    print(f"{'officers':>9} {'cells':>7} {'index ms':>9} {'scan ms':>9} {'mismatches':>11}")
+    for size in (int(value) for value in args.sizes.split(",") if value.strip()):
+        index = positions.OfficerIndex()
+        on_duty = set()
+        for i in range(size):
+            index.update(f"officer-{i}", GOA[0] + random.uniform(-args.spread, args.spread),
+                         GOA[1] + random.uniform(-args.spread, args.spread), seen_at)
+            if random.random() < args.on_duty:
+                on_duty.add(f"officer-{i}")
+
+        indexed, scanned, mismatches = [], [], 0
+        for _ in range(args.queries):
+            latitude = GOA[0] + random.uniform(-args.spread, args.spread)
+            longitude = GOA[1] + random.uniform(-args.spread, args.spread)
+
+            started = time.perf_counter()
+            found = index.nearest(latitude, longitude, args.k, on_duty.__contains__)
+            indexed.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            expected = scan(index, on_duty, latitude, longitude, args.k)
+            scanned.append((time.perf_counter() - started) * 1000)
+
+            if [user_id for _, user_id in found] != [user_id for _, user_id in expected]:
+                mismatches += 1
+
+        print(f"{size:9d} {len(index.cells):7d} {statistics.median(indexed):9.3f} "
+              f"{statistics.median(scanned):9.3f} {mismatches:11d}")
+
+
+if __name__ == "__main__":
+    main()
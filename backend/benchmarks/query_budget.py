@@ -0,0 +1,142 @@
+"""
+Database round trips per request on the check-in and list endpoints.
+
+Calls the route handlers directly against benchmarks/fake_prisma.py, each inside
+database.trace_queries with a strict budget, so a change that adds a query to
+one of these paths fails here (exit status 1) instead of showing up as latency
+in production. The face service is the load test's stub, always verifying.
+
+    cd backend && python benchmarks/query_budget.py
+"""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import importlib
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_prisma  # noqa: E402
+
+# Round trips each scenario may issue; lower these when a path gets cheaper
+BUDGETS = {
+    "check-in (cold duty cache)": 2,
+    "check-in (warm duty cache)": 1,
+    "GET /duties/": 2,
+    "GET /duties/ (not modified)": 1,
+    "GET /duties/my-duties": 2,
+    "GET /duties/my-duties (not modified)": 1,
+    "GET /notifications/": 1,
+}
+
+
+def make_request(path, headers=None):
+    from starlette.requests import Request
+
+    return Request({
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+async def main_async():
+    import httpx
+
+    importlib.import_module("app")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import loadtest
+    from controllers import duties, notifications
+    from database import db, trace_queries
+    from models.model import User
+    from models.schemas import CheckInSchema
+    from services import analytics, duty_cache, reports
+    from services.face_client import face_client
+
+    loadtest.install_raw_handlers(reports, analytics)
+    face_client._client = httpx.AsyncClient(
+        base_url=face_client.base_url, transport=loadtest.stub_face_service(httpx, 0, 0)
+    )
+
+    store = fake_prisma.Prisma.store
+    now = datetime.now(timezone.utc)
+    admin = User.from_row(store.create("user", {"id": "admin-1", "empid": "SHO001", "role": "ADMIN"}))
+    officer = User.from_row(store.create("user", {"id": "officer-1", "empid": "EMP00001", "role": "OFFICER"}))
+    for i in range(3):
+        store.create("dutyassignment", {
+            "id": f"duty-{i}", "officerId": officer.id, "assignedBy": admin.id, "location": f"Beat {i}",
+            "latitude": 15.4909, "longitude": 73.8278, "radius": 100,
+            "startTime": now - timedelta(minutes=5), "endTime": now + timedelta(hours=8),
+        })
+    payload = CheckInSchema(latitude=15.4909, longitude=73.8278, selfieUrl="https://images.invalid/selfie.jpg")
+
+    async def check_in(duty_id):
+        response = await duties.duty_check_in(duty_id, payload, current_user=officer)
+        assert response.status_code == 200 and b'"duty_status":"COMPLETED"' in response.body, response.body
+        return response
+
+    async def listing(handler, user, path, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await handler(make_request(path, headers), user)
+        assert response.status_code == (304 if etag else 200), response.status_code
+        return response
+
+    async def notifications_page():
+        return await notifications.list_notifications(current_user=officer)
+
+    async def check_in_warm():
+        with trace_queries():  # The warm-up lookup is not part of the check-in
+            await duty_cache.get_duty(db, "duty-2")
+        return await check_in("duty-2")
+
+    async def not_modified(handler, user, path):
+        with trace_queries():  # The first fetch only hands out the ETag
+            etag = (await listing(handler, user, path)).headers["etag"]
+        return await listing(handler, user, path, etag)
+
+    duty_cache.cache.clear()
+    scenarios = [
+        ("check-in (cold duty cache)", lambda: check_in("duty-1")),
+        ("check-in (warm duty cache)", check_in_warm),
+        ("GET /duties/", lambda: listing(duties.get_all_duties, admin, "/duties/")),
+        ("GET /duties/ (not modified)", lambda: not_modified(duties.get_all_duties, admin, "/duties/")),
+        ("GET /duties/my-duties", lambda: listing(duties.get_my_duties, officer, "/duties/my-duties")),
+        ("GET /duties/my-duties (not modified)",
+         lambda: not_modified(duties.get_my_duties, officer, "/duties/my-duties")),
+        ("GET /notifications/", notifications_page),
+    ]
+
+    failures = 0
+    print(f"{'scenario':<40} {'queries':>7} {'budget':>6}")
+    for name, scenario in scenarios:
+        budget = BUDGETS[name]
+        try:
+            with trace_queries(budget=budget) as trace:
+                await scenario()
+        except Exception as e:
+            # Handlers turn unexpected errors into a 500, so look at the trace, not the type
+            if not trace.over_budget:
+                raise
+            failures += 1
+            print(f"{name:<40} {trace.count:7d} {budget:6d}  FAIL: {e}")
+            continue
+        print(f"{name:<40} {trace.count:7d} {budget:6d}  "
+              + ", ".join(f"{model}.{action}" for model, action, _ in trace.queries))
+
+    await face_client.close()
+    return failures
+
+
+def main():
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("FACE_RECOG_SERVICE_URL", "http://face-stub")
+    os.environ["SKIP_PRISMA_GENERATE"] = "true"
+    fake_prisma.install()
+    failures = asyncio.run(main_async())
+    if failures:
+        raise SystemExit(f"{failures} scenario(s) over their query budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Rows/second for the list endpoints' serialization, old path versus new.
+
+The old path rebuilt a domain model per row (generating a throwaway UUID and
+timestamp), called to_dict() and encoded with the stdlib json via JSONResponse.
+The new path maps Prisma rows straight to dicts and encodes with orjson.
+
+    cd backend && python benchmarks/serialization.py --rows 10000
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from models import serializers  # noqa: E402
+from models.model import DutyAssignment, DutyStatus, User  # noqa: E402
+
+
+def duty_rows(count):
+    start = datetime(2025, 1, 1, 22, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=f"duty-{i}", officerId=f"officer-{i % 300}", assignedBy="admin-1",
+            location=f"Beat {i % 50}", latitude=15.49 + i * 1e-6, longitude=73.82 + i * 1e-6,
+            radius=100.0, startTime=start + timedelta(days=i // 300),
+            endTime=start + timedelta(days=i // 300, hours=6), status="PENDING", templateId=None,
+        )
+        for i in range(count)
+    ]
+
+
+def user_rows(count):
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=f"officer-{i}", empid=f"EMP{i:05d}", role="OFFICER", passwordHash="x" * 60,
+            profileImage=[f"https://example.invalid/{i}/{n}.jpg" for n in range(3)],
+            createdAt=created, updatedAt=None,
+        )
+        for i in range(count)
+    ]
+
+
+def old_duties(rows):
+    duties = [
+        DutyAssignment(
+            officerId=row.officerId, assignedBy=row.assignedBy, location=row.location,
+            latitude=row.latitude, longitude=row.longitude, radius=row.radius,
+            startTime=row.startTime, endTime=row.endTime, status=DutyStatus(row.status),
+        )
+        for row in rows
+    ]
+    return JSONResponse(content={"duties": [duty.to_dict() for duty in duties], "count": len(duties)}).body
+
+
+def new_duties(rows):
+    return serializers.FastJSONResponse(content={"duties": serializers.duty_rows(rows), "count": len(rows)}).body
+
+
+def old_users(rows):
+    users = [
+        User(id=row.id, empid=row.empid, role=row.role, profileImage=row.profileImage or [], createdAt=row.createdAt)
+        for row in rows
+    ]
+    return JSONResponse(content={"users": [user.to_dict() for user in users], "count": len(users)}).body
+
+
+def new_users(rows):
+    return serializers.FastJSONResponse(content={"users": serializers.user_rows(rows), "count": len(rows)}).body
+
+
+def measure(label, render, rows, repeat):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(render(rows))
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<14} {len(rows) / best:>12,.0f} rows/s   {best * 1000:8.2f} ms   {size / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    duties = duty_rows(args.rows)
+    users = user_rows(args.rows)
+    measure("duties (old)", old_duties, duties, args.repeat)
+    measure("duties (new)", new_duties, duties, args.repeat)
+    measure("users (old)", old_users, users, args.repeat)
+    measure("users (new)", new_users, users, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import Optional
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from database import db
+from models.model import User
+from security import get_current_admin_user
+from services import analytics
+from services.reports import default_range
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+async def ensure_db_connection():
+    """Ensure database connection with error handling"""
+    try:
+        if not db.is_connected():
+            await db.connect()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database connection failed: {str(e)}"
+        )
+
+async def cached_analytics(level: str, key: Optional[str], period: str,
+                           start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Serve an analytics view from the TTL cache, computing it from the rollups on a miss"""
+    if period not in analytics.PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"period must be one of: {', '.join(analytics.PERIODS)}"
+        )
+
+    start, end = default_range(start, end, days=90 if period != "day" else 30)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+
+    cache_key = (level, key, period, start, end)
+    result = analytics.cache.get(cache_key)
+    if result is not None:
+        return result
+
+    where = {"date": {"gte": start, "lte": end}}
+    if level == "officer":
+        where["officerId"] = key
+    elif level == "station":
+        where["stationId"] = key
+
+    rows = await db.analyticsrollup.find_many(where=where)
+
+    result = {
+        "level": level,
+        "id": key,
+        "start": start.date().isoformat(),
+        "end": end.date().isoformat(),
+        **analytics.summarize(rows, period),
+    }
+    analytics.cache.set(cache_key, result, tags=[f"{level}:{key}" if key else "all"])
+    return result
+
+@router.get("/overview")
+async def get_overview(
+    period: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        result = await cached_analytics("all", None, period, start, end)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch analytics: {str(e)}"
+        )
+
+@router.get("/stations/{station_id}")
+async def get_station_analytics(
+    station_id: str,
+    period: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if not station_id or station_id.strip() == "":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="station_id is required"
+            )
+
+        result = await cached_analytics("station", station_id.strip(), period, start, end)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch station analytics: {str(e)}"
+        )
+
+@router.get("/officers/{officer_id}")
+async def get_officer_analytics(
+    officer_id: str,
+    period: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if not officer_id or officer_id.strip() == "":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="officer_id is required"
+            )
+
+        result = await cached_analytics("officer", officer_id.strip(), period, start, end)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch officer analytics: {str(e)}"
+        )
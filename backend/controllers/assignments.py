@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from database import db
+from models.model import DutyAssignment, User
+from models.schemas import AssignmentCommitSchema, AssignmentProposeSchema
+from models.serializers import FastJSONResponse
+from security import get_current_admin_user
+from services import assignment
+from services import duties as duty_writes
+
+router = APIRouter(prefix="/assignments", tags=["Assignments"])
+
+async def ensure_db_connection():
+    """Ensure database connection with error handling"""
+    try:
+        if not db.is_connected():
+            await db.connect()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database connection failed: {str(e)}"
+        )
+
+@router.post("/propose")
+async def propose_assignment(body: AssignmentProposeSchema, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        try:
+            proposal = await assignment.propose(db, body.beats, body.officerIds, body.maxDistanceMeters)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=proposal)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to propose assignment: {str(e)}"
+        )
+
+@router.post("/commit", status_code=201)
+async def commit_assignment(body: AssignmentCommitSchema, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        officer_ids = {duty.officerId for duty in body.duties}
+        officers = await db.user.find_many(where={"id": {"in": list(officer_ids)}, "role": "OFFICER"})
+        missing = officer_ids - {officer.id for officer in officers}
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Officer not found: {', '.join(sorted(missing))}"
+            )
+
+        # Overlaps are checked against one query for the whole night and against each other
+        busy = await duty_writes.busy_intervals(
+            db, officer_ids, min(duty.startTime for duty in body.duties), max(duty.endTime for duty in body.duties)
+        )
+        conflicts = [
+            {"index": index, "officerId": duty.officerId, "startTime": duty.startTime}
+            for index, duty in enumerate(body.duties)
+            if not duty_writes.claim(busy, duty.officerId, duty.startTime, duty.endTime)
+        ]
+        if conflicts:
+            # A proposal that no longer fits is re-proposed rather than committed in part
+            return FastJSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"detail": duty_writes.OVERLAP_DETAIL, "conflicts": conflicts}
+            )
+
+        duties = [
+            DutyAssignment(
+                officerId=duty.officerId,
+                assignedBy=admin.id,
+                location=duty.location,
+                latitude=duty.latitude,
+                longitude=duty.longitude,
+                radius=duty.radius,
+                startTime=duty.startTime,
+                endTime=duty.endTime
+            )
+            for duty in body.duties
+        ]
+        async with db.batch_() as batcher:
+            duty_writes.queue_duties(batcher, duties)
+        duty_writes.invalidate(duties)
+
+        return FastJSONResponse(
+            status_code=status.HTTP_201_CREATED,
+            content={"detail": "Duties created successfully", "created": len(duties), "duty_ids": [d.id for d in duties]}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to commit assignment: {str(e)}"
+        )
@@ -3,13 +3,14 @@ import requests
 from typing import Optional, List
 from fastapi import APIRouter, Depends, Request, HTTPException, status
 from fastapi.responses import JSONResponse
-from prisma import Prisma
+from database import db
 from models.model import Role, User
 from dotenv import load_dotenv
 import os
 from enum import Enum
 from models.schemas import UserOut
 from security import get_current_user
+from services import versions
 
 load_dotenv()
 
@@ -17,7 +18,6 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is required")
 
-db = Prisma()
 FACE_RECOG_SERVICE_URL = os.getenv("FACE_RECOG_SERVICE_URL")
 
 router = APIRouter(
@@ -128,6 +128,7 @@ async def register(request: Request):
                     "updatedAt": user.updatedAt,
                 }
             )
+            await versions.bump_now(db, versions.USERS)
             
             return JSONResponse(
                 status_code=status.HTTP_201_CREATED,
@@ -168,15 +169,7 @@ async def login(request: Request):
             )
         
         # Create user model with null safety
-        user_model = User(
-            id=user_record.id,
-            empid=user_record.empid,
-            role=user_record.role,
-            profileImage=user_record.profileImage if user_record.profileImage else [],
-            passwordHash=user_record.passwordHash,
-            createdAt=user_record.createdAt,
-            updatedAt=user_record.updatedAt
-        )
+        user_model = User.from_row(user_record)
         
         # Verify password
         if not user_model.verify_password(password):
@@ -229,15 +222,7 @@ async def admin_login(request: Request):
             )
         
         # Create user model
-        user_model = User(
-            id=user_record.id,
-            empid=user_record.empid,
-            role=user_record.role,
-            profileImage=user_record.profileImage if user_record.profileImage else [],
-            passwordHash=user_record.passwordHash,
-            createdAt=user_record.createdAt,
-            updatedAt=user_record.updatedAt
-        )
+        user_model = User.from_row(user_record)
         print("Admin user found:", user_model.role)
         
         # Verify password
@@ -314,6 +299,7 @@ async def admin_register(request: Request):
             "createdAt": new_admin.createdAt,
             "updatedAt": new_admin.updatedAt,
         })
+        await versions.bump_now(db, versions.USERS)
         
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
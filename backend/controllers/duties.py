@@ -2,23 +2,23 @@ from fastapi import APIRouter, HTTPException, Depends, Request, status
 from typing import List, Optional
 from datetime import datetime, timezone
 from fastapi.responses import JSONResponse
-from prisma import Prisma
+from database import db
+from prisma.errors import UniqueViolationError
 import os
-from models.model import User, DutyAssignment, DutyLog, DutyStatus
+from models.model import User, DutyAssignment, DutyLog, DutyStatus, FaceStatus
+from models import serializers
+from models.serializers import FastJSONResponse
 from models.schemas import CheckInSchema, DutyCreateSchema, LocationUpdateRequest, LocationUpdateSchema, UserOut
 from security import get_current_admin_user, get_current_user
+from services import duty_cache, face_verification, positions, reports, sync, versions
 from dotenv import load_dotenv
 from enum import Enum
-import requests
 from fastapi.concurrency import run_in_threadpool
 from math import radians, sin, cos, sqrt, atan2
 
 load_dotenv()
 
-FACE_RECOG_SERVICE_URL = os.getenv("FACE_RECOG_SERVICE_URL")
-
 router = APIRouter(prefix="/duties", tags=["Duties"])
-db = Prisma()
 
 async def ensure_db_connection():
     """Ensure database connection with error handling"""
@@ -111,11 +111,18 @@ async def create_duty(duty_data: DutyCreateSchema, admin: User = Depends(get_cur
             endTime=duty_data.endTime
         )
         
-        created_record = await db.dutyassignment.create(data=new_duty.to_dict())
+        # The duty, its rollup deltas and the collection version bumps commit together
+        async with db.batch_() as batcher:
+            batcher.dutyassignment.create(data=new_duty.to_dict())
+            for statement in reports.duty_statements(new_duty, assigned=1):
+                batcher.execute_raw(*statement)
+            versions.bump(batcher, versions.DUTIES, versions.officer_duties(new_duty.officerId))
+            sync.record(batcher, new_duty.officerId, sync.DUTY, new_duty.id)
+        reports.invalidate(new_duty)
         
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
-            content={"detail": "Duty created successfully", "duty_id": created_record.id}
+            content={"detail": "Duty created successfully", "duty_id": new_duty.id}
         )
         
     except HTTPException:
@@ -127,7 +134,7 @@ async def create_duty(duty_data: DutyCreateSchema, admin: User = Depends(get_cur
         )
 
 @router.get("/")
-async def get_all_duties(admin: User = Depends(get_current_admin_user)):
+async def get_all_duties(request: Request, admin: User = Depends(get_current_admin_user)):
     try:
         await ensure_db_connection()
         
@@ -137,11 +144,16 @@ async def get_all_duties(admin: User = Depends(get_current_admin_user)):
                 detail="Admin authentication required"
             )
         
+        etag, not_modified = await versions.conditional(db, request, versions.DUTIES, "duties")
+        if not_modified:
+            return not_modified
+        
         duties = await db.dutyassignment.find_many()
         
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
-            content={"duties": duties, "count": len(duties)}
+            content={"duties": serializers.duty_rows(duties), "count": len(duties)},
+            headers={"ETag": etag}
         )
         
     except HTTPException:
@@ -153,7 +165,7 @@ async def get_all_duties(admin: User = Depends(get_current_admin_user)):
         )
 
 @router.get("/my-duties")
-async def get_my_duties(current_user: User = Depends(get_current_user)):
+async def get_my_duties(request: Request, current_user: User = Depends(get_current_user)):
     try:
         await ensure_db_connection()
         
@@ -163,36 +175,21 @@ async def get_my_duties(current_user: User = Depends(get_current_user)):
                 detail="User authentication required"
             )
         
+        etag, not_modified = await versions.conditional(
+            db, request, versions.officer_duties(current_user.id), "my-duties"
+        )
+        if not_modified:
+            return not_modified
+        
         duties = await db.dutyassignment.find_many(
             where={"officerId": current_user.id},
             order={"startTime": "desc"}
         )
-
-        Duties = []
-        for duty_data in duties:
-            try:
-                duty = DutyAssignment(
-                    officerId=duty_data.officerId,
-                    assignedBy=duty_data.assignedBy,
-                    location=duty_data.location,
-                    latitude=duty_data.latitude,
-                    longitude=duty_data.longitude,
-                    radius=duty_data.radius,
-                    startTime=duty_data.startTime,
-                    endTime=duty_data.endTime,
-                    status=DutyStatus(duty_data.status) if isinstance(duty_data.status, str) else duty_data.status,
-                    officer=current_user
-                )
-                Duties.append(duty)
-            except Exception as duty_error:
-                print(f"Error processing duty {duty_data.id}: {duty_error}")
-                continue
-
         
-        
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
-            content={"duties": [duty.to_dict() for duty in Duties], "count": len(Duties)}
+            content={"duties": serializers.duty_rows(duties), "count": len(duties)},
+            headers={"ETag": etag}
         )
         
     except HTTPException:
@@ -203,12 +200,55 @@ async def get_my_duties(current_user: User = Depends(get_current_user)):
             detail=f"Failed to fetch user duties: {str(e)}"
         )
 
+@router.get("/sync")
+async def sync_my_duties(
+    token: Optional[str] = None,
+    limit: int = 500,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        await ensure_db_connection()
+        
+        if not current_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User authentication required"
+            )
+        
+        if limit < 1 or limit > 2000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="limit must be between 1 and 2000"
+            )
+        
+        try:
+            if token:
+                payload = await sync.changes_since(db, current_user.id, token.strip(), limit)
+            else:
+                payload = await sync.snapshot(db, current_user.id)
+        except sync.InvalidSyncToken as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=payload)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Sync failed: {str(e)}"
+        )
+
 @router.post("/{duty_id}/checkin")
 async def duty_check_in(
     duty_id: str,
     check_in_data: CheckInSchema,  
     current_user: User = Depends(get_current_user)
 ):
+    face_task = None
     try:
         await ensure_db_connection()
         
@@ -224,8 +264,11 @@ async def duty_check_in(
                 detail="duty_id is required"
             )
         
-        # Find duty
-        duty = await db.dutyassignment.find_unique(where={"id": duty_id})
+        # Face verification runs concurrently with the duty, window and geofence checks
+        face_task = face_verification.start(current_user.id, check_in_data.selfieUrl)
+        
+        # Find duty; active duties are served from the in-process cache
+        duty = await duty_cache.get_duty(db, duty_id)
         if not duty:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -262,17 +305,6 @@ async def duty_check_in(
                 detail="Duty has already ended"
             )
         
-        # Check if already checked in
-        existing_log = await db.dutylog.find_first(
-            where={"dutyId": duty_id, "officerId": current_user.id}
-        )
-        
-        if existing_log:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Already checked in for this duty"
-            )
-        
         # Calculate distance with error handling
         try:
             distance = calculate_distance(
@@ -294,7 +326,13 @@ async def duty_check_in(
                 detail=f"You are {distance:.2f}m away from duty location. Required: within {duty.radius}m"
             )
         
-        face_verified = True  # Default to true for now
+        face = await face_verification.resolve(face_task)
+        if face["status"] == FaceStatus.FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Face verification failed: {face['reason'] or 'selfie does not match'}"
+            )
+        face_verified = face["status"] == FaceStatus.VERIFIED
         
         # Create duty log
         duty_log_data = {
@@ -305,26 +343,58 @@ async def duty_check_in(
             "selfiePath": check_in_data.selfieUrl,
             "locationVerified": location_verified,
             "faceVerified": face_verified,
-            "remarks": check_in_data.remarks or "Check-in completed",
+            "faceStatus": face["status"].value,
+            "faceConfidence": face["confidence"],
+            "remarks": check_in_data.remarks or ("Check-in completed" if face_verified else "Check-in pending face verification"),
+            "distance": distance,
             "createdAt": current_time,
             "updatedAt": current_time
         }
         
-        await db.dutylog.create(data=duty_log_data)
-        
-        # Update duty status
-        if location_verified and face_verified:
-            await db.dutyassignment.update(
-                where={"id": duty_id},
-                data={"status": DutyStatus.COMPLETED.value}
+        # A second check-in for the same duty hits the (dutyId, officerId) unique
+        # constraint, so double taps cannot both succeed
+        try:
+            if location_verified and face_verified:
+                # Log insert, status flip and rollups commit together in one round trip
+                async with db.batch_() as batcher:
+                    batcher.dutylog.create(data=duty_log_data)
+                    batcher.dutyassignment.update(
+                        where={"id": duty_id},
+                        data={"status": DutyStatus.COMPLETED.value}
+                    )
+                    for statement in reports.duty_statements(duty, completed=1, checkin_time=current_time, distance=distance):
+                        batcher.execute_raw(*statement)
+                    versions.bump(batcher, versions.DUTIES, versions.officer_duties(current_user.id))
+                    sync.record(batcher, current_user.id, sync.LOG, duty_log_data["id"])
+                    sync.record(batcher, current_user.id, sync.DUTY, duty_id)
+                    positions.record(batcher, current_user.id, check_in_data.latitude, check_in_data.longitude, current_time)
+                duty_cache.invalidate(duty_id)
+                reports.invalidate(duty)
+            else:
+                # Degraded mode: keep the check-in and settle the face verdict in the background.
+                # No position is recorded, since a FAILED verdict deletes this log again; the
+                # location pings that follow report where the officer is.
+                async with db.batch_() as batcher:
+                    batcher.dutylog.create(data=duty_log_data)
+                    sync.record(batcher, current_user.id, sync.LOG, duty_log_data["id"])
+                # The unfinished verification is handed over, not cancelled
+                await face_verification.complete_later(db, DutyLog(**duty_log_data), duty, face_task)
+                face_task = None
+        except UniqueViolationError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Already checked in for this duty"
             )
         
+        # 200 either way: the app treats any other status as a failed check-in, and
+        # "status"/"face_status" say whether the face verdict is still pending
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
-                "status": "success", 
+                "status": "success" if face_verified else "pending_face_verification", 
                 "location_verified": location_verified, 
                 "face_verified": face_verified,
+                "face_status": face["status"].value,
                 "distance": round(distance, 2),
                 "duty_status": DutyStatus.COMPLETED.value if (location_verified and face_verified) else DutyStatus.PENDING.value
             }
@@ -338,6 +408,8 @@ async def duty_check_in(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Check-in failed: {str(e)}"
         )
+    finally:
+        face_verification.cancel(face_task)
 
 @router.post("/{duty_id}/location-update")
 async def duty_location_update(
@@ -360,7 +432,7 @@ async def duty_location_update(
                 detail="duty_id is required"
             )
         
-        duty = await db.dutyassignment.find_unique(where={"id": duty_id})
+        duty = await duty_cache.get_duty(db, duty_id)
         if not duty:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -387,6 +459,9 @@ async def duty_location_update(
                 detail=f"Invalid coordinates: {str(e)}"
             )
         
+        positions.record_later(current_user.id, location_data.latitude, location_data.longitude,
+                               datetime.now(timezone.utc))
+        
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
@@ -406,7 +481,7 @@ async def duty_location_update(
         )
 
 @router.get("/users/all", response_model=List[UserOut])
-async def get_all_users(admin: User = Depends(get_current_admin_user)):
+async def get_all_users(request: Request, admin: User = Depends(get_current_admin_user)):
     try:
         await ensure_db_connection()
         
@@ -416,32 +491,22 @@ async def get_all_users(admin: User = Depends(get_current_admin_user)):
                 detail="Admin authentication required"
             )
         
+        etag, not_modified = await versions.conditional(db, request, versions.USERS, "users")
+        if not_modified:
+            return not_modified
+        
         users = await db.user.find_many(
             where={"role": "OFFICER"},
             order={"createdAt": "desc"}
             )
         
-        user_list = []
-        for user_data in users:
-            try:
-                user = User(
-                    id=user_data.id,
-                    empid=user_data.empid,
-                    role=user_data.role,
-                    profileImage=user_data.profileImage if user_data.profileImage else [],
-                    createdAt=user_data.createdAt
-                )
-                user_list.append(user)
-            except Exception as user_error:
-                print(f"Error processing user {user_data.id}: {user_error}")
-                continue
-        
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
-                "users": [user.to_dict() for user in user_list],
-                "count": len(user_list)
-            }
+                "users": serializers.user_rows(users),
+                "count": len(users)
+            },
+            headers={"ETag": etag}
         )
         
     except HTTPException:
@@ -467,7 +532,7 @@ async def location_update(
             )
         
         # Validate duty exists
-        duty = await db.dutyassignment.find_unique(where={"id": request.dutyId})
+        duty = await duty_cache.get_duty(db, request.dutyId)
         if not duty:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -501,12 +566,23 @@ async def location_update(
                 "updatedAt": current_time
             }
             
-            await db.dutylog.create(data=log_data)
-            
-            return JSONResponse(
-                status_code=status.HTTP_201_CREATED,
-                content={"status": "initial_location_log_created"}
-            )
+            try:
+                async with db.batch_() as batcher:
+                    batcher.dutylog.create(data=log_data)
+                    sync.record(batcher, current_user.id, sync.LOG, log_data["id"])
+                    positions.record(batcher, current_user.id, request.latitude, request.longitude, current_time)
+
+                return JSONResponse(
+                    status_code=status.HTTP_201_CREATED,
+                    content={"status": "initial_location_log_created"}
+                )
+            except UniqueViolationError:
+                # A concurrent first ping (e.g. a retry) created the log; update that one instead
+                latest_log = await db.dutylog.find_first(
+                    where={"dutyId": request.dutyId, "officerId": current_user.id}
+                )
+                if not latest_log:
+                    raise
         
         # Update existing log
         update_data = {
@@ -515,10 +591,13 @@ async def location_update(
             "updatedAt": current_time
         }
         
-        await db.dutylog.update(
-            where={"id": latest_log.id},
-            data=update_data
-        )
+        async with db.batch_() as batcher:
+            batcher.dutylog.update(
+                where={"id": latest_log.id},
+                data=update_data
+            )
+            sync.record(batcher, current_user.id, sync.LOG, latest_log.id)
+            positions.record(batcher, current_user.id, request.latitude, request.longitude, current_time)
         
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -575,18 +654,7 @@ async def get_location_updates(
             )
         
         # Create response with null safety
-        location_log = DutyLog(
-            id=location_update.id,
-            dutyId=location_update.dutyId,
-            officerId=location_update.officerId,
-            checkinTime=location_update.checkinTime,
-            selfiePath=location_update.selfiePath,
-            faceVerified=location_update.faceVerified,
-            locationVerified=location_update.locationVerified,
-            remarks=location_update.remarks,
-            createdAt=location_update.createdAt,
-            updatedAt=location_update.updatedAt
-        )
+        location_log = DutyLog.from_row(location_update)
         
         response_data = location_log.to_dict()
         if hasattr(location_update, 'duty') and location_update.duty:
@@ -608,3 +676,32 @@ async def get_location_updates(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch location updates: {str(e)}"
         )
+
+@router.get("/nearest-officers")
+async def get_nearest_officers(
+    latitude: float,
+    longitude: float,
+    k: int = 5,
+    maxDistance: Optional[float] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        try:
+            result = await positions.nearest_on_duty(db, latitude, longitude, k, maxDistance)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to find nearest officers: {str(e)}"
+        )
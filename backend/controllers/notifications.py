@@ -0,0 +1,130 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import Optional
+from database import db
+from models.model import User
+from models.schemas import MarkReadSchema, NotificationCreateSchema
+from models.serializers import FastJSONResponse
+from security import get_current_admin_user, get_current_user
+from services import notifications
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+async def ensure_db_connection():
+    """Ensure database connection with error handling"""
+    try:
+        if not db.is_connected():
+            await db.connect()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database connection failed: {str(e)}"
+        )
+
+@router.get("/")
+async def list_notifications(
+    limit: int = notifications.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    unread: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if limit < 1 or limit > notifications.MAX_PAGE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"limit must be between 1 and {notifications.MAX_PAGE_SIZE}"
+            )
+
+        try:
+            page = await notifications.list_page(db, current_user.id, limit, cursor, unread)
+        except notifications.InvalidCursor as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={**page, "unread": current_user.unreadNotifications}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch notifications: {str(e)}"
+        )
+
+@router.get("/unread-count")
+async def get_unread_count(current_user: User = Depends(get_current_user)):
+    # Read off the User row authentication already loaded: no query of its own
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"unread": current_user.unreadNotifications}
+    )
+
+@router.post("/read")
+async def mark_notifications_read(
+    body: Optional[MarkReadSchema] = None,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        await ensure_db_connection()
+
+        ids = body.ids if body else None
+        changed = await notifications.mark_read(db, current_user.id, ids)
+
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"updated": changed, "unread": max(0, current_user.unreadNotifications - changed)}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mark notifications as read: {str(e)}"
+        )
+
+@router.post("/", status_code=201)
+async def send_notification(
+    body: NotificationCreateSchema,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if body.userIds is not None:
+            if not body.userIds:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="userIds cannot be empty"
+                )
+            # Unknown ids would fail the whole batch on the foreign key
+            where = {"id": {"in": list(dict.fromkeys(body.userIds))}}
+        elif body.role:
+            where = {"role": body.role}
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Either userIds or role is required"
+            )
+
+        recipients = [user.id for user in await db.user.find_many(where=where)]
+        created = await notifications.fan_out(db, recipients, body.message, body.type)
+
+        return FastJSONResponse(
+            status_code=status.HTTP_201_CREATED,
+            content={"created": created}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to send notification: {str(e)}"
+        )
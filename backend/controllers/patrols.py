@@ -0,0 +1,178 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import Optional
+from datetime import timedelta
+from database import db
+from models.model import User
+from models import serializers
+from models.schemas import PatrolTemplateCreateSchema
+from models.serializers import FastJSONResponse
+from security import get_current_admin_user
+from services import patrols
+
+router = APIRouter(prefix="/patrols", tags=["Patrols"])
+
+async def ensure_db_connection():
+    """Ensure database connection with error handling"""
+    try:
+        if not db.is_connected():
+            await db.connect()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database connection failed: {str(e)}"
+        )
+
+async def get_template(template_id: str):
+    template = await db.patroltemplate.find_unique(where={"id": template_id})
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Patrol template not found"
+        )
+    return template
+
+def expansion(template, result: dict) -> dict:
+    return {
+        "template": serializers.patrol_template_row(template),
+        "created": result["created"],
+        "conflicts": result["conflicts"],
+        "generatedUntil": result["generatedUntil"],
+    }
+
+@router.post("/", status_code=201)
+async def create_patrol_template(body: PatrolTemplateCreateSchema, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        officers = await db.user.find_many(where={"id": {"in": body.officerIds}, "role": "OFFICER"})
+        missing = set(body.officerIds) - {officer.id for officer in officers}
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Officer not found: {', '.join(sorted(missing))}"
+            )
+
+        template = await db.patroltemplate.create(data={
+            "createdBy": admin.id,
+            "location": body.location,
+            "latitude": body.latitude,
+            "longitude": body.longitude,
+            "radius": body.radius,
+            "startMinute": body.startTime.hour * 60 + body.startTime.minute,
+            "durationMinutes": body.durationMinutes,
+            "timezone": body.timezone,
+            "weekdays": body.weekdays,
+            "officerIds": body.officerIds,
+            "officersPerShift": body.officersPerShift,
+            "startDate": patrols.from_day(body.startDate),
+            "endDate": patrols.from_day(body.endDate) if body.endDate else None,
+        })
+
+        # The first horizon is expanded right away, so the duties exist when the response arrives
+        until = patrols.today(template) + timedelta(days=patrols.PATROL_HORIZON_DAYS)
+        result = await patrols.expand(db, template, until)
+        template = await db.patroltemplate.find_unique(where={"id": template.id})
+
+        return FastJSONResponse(status_code=status.HTTP_201_CREATED, content=expansion(template, result))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create patrol template: {str(e)}"
+        )
+
+@router.get("/")
+async def list_patrol_templates(active: Optional[bool] = None, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        where = {} if active is None else {"active": active}
+        templates = await db.patroltemplate.find_many(where=where, order={"createdAt": "desc"})
+
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"templates": serializers.patrol_template_rows(templates), "count": len(templates)}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch patrol templates: {str(e)}"
+        )
+
+@router.get("/{template_id}")
+async def get_patrol_template(template_id: str, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        template = await get_template(template_id)
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=serializers.patrol_template_row(template))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch patrol template: {str(e)}"
+        )
+
+@router.post("/{template_id}/generate")
+async def generate_patrol_duties(
+    template_id: str,
+    days: int = patrols.PATROL_HORIZON_DAYS,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if days < 1 or days > patrols.MAX_HORIZON_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"days must be between 1 and {patrols.MAX_HORIZON_DAYS}"
+            )
+
+        template = await get_template(template_id)
+        if not template.active:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Patrol template is not active"
+            )
+
+        result = await patrols.expand(db, template, patrols.today(template) + timedelta(days=days))
+        template = await db.patroltemplate.find_unique(where={"id": template_id})
+
+        return FastJSONResponse(status_code=status.HTTP_200_OK, content=expansion(template, result))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate patrol duties: {str(e)}"
+        )
+
+@router.delete("/{template_id}")
+async def deactivate_patrol_template(template_id: str, admin: User = Depends(get_current_admin_user)):
+    try:
+        await ensure_db_connection()
+
+        await get_template(template_id)
+        # Stops further expansion; duties already scheduled are kept
+        await db.patroltemplate.update(where={"id": template_id}, data={"active": False})
+
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"detail": "Patrol template deactivated", "template_id": template_id}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to deactivate patrol template: {str(e)}"
+        )
@@ -0,0 +1,204 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, status
+from typing import Optional
+from datetime import datetime, timezone
+from fastapi.responses import JSONResponse
+from database import db
+from models.model import User
+from security import get_current_admin_user, get_current_user
+from services import reports
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+rebuild_state = {"status": "idle", "processed": 0, "startedAt": None, "finishedAt": None, "error": None}
+
+async def ensure_db_connection():
+    """Ensure database connection with error handling"""
+    try:
+        if not db.is_connected():
+            await db.connect()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database connection failed: {str(e)}"
+        )
+
+async def fetch_reports(officer_id: Optional[str], start: Optional[datetime], end: Optional[datetime]):
+    start, end = reports.default_range(start, end)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+
+    where = {"date": {"gte": start, "lte": end}}
+    if officer_id:
+        where["officerId"] = officer_id
+
+    rows = await db.dutyreport.find_many(where=where, order={"date": "asc"})
+    return start, end, rows
+
+def summarize(rows) -> dict:
+    total = sum(row.totalAssigned for row in rows)
+    completed = sum(row.completed for row in rows)
+    missed = sum(row.missed for row in rows)
+    return {
+        "totalAssigned": total,
+        "completed": completed,
+        "missed": missed,
+        "complianceRate": round(completed / total, 4) if total else 0.0,
+    }
+
+@router.get("/me")
+async def get_my_reports(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        await ensure_db_connection()
+
+        start, end, rows = await fetch_reports(current_user.id, start, end)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "start": start.date().isoformat(),
+                "end": end.date().isoformat(),
+                "summary": summarize(rows),
+                "days": [reports.serialize_report(row) for row in rows]
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch reports: {str(e)}"
+        )
+
+@router.get("/officers/{officer_id}")
+async def get_officer_reports(
+    officer_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if not officer_id or officer_id.strip() == "":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="officer_id is required"
+            )
+
+        start, end, rows = await fetch_reports(officer_id.strip(), start, end)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "officerId": officer_id.strip(),
+                "start": start.date().isoformat(),
+                "end": end.date().isoformat(),
+                "summary": summarize(rows),
+                "days": [reports.serialize_report(row) for row in rows]
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch officer reports: {str(e)}"
+        )
+
+@router.get("/daily")
+async def get_daily_reports(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        start, end, rows = await fetch_reports(None, start, end)
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row.date.date().isoformat(), []).append(row)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "start": start.date().isoformat(),
+                "end": end.date().isoformat(),
+                "summary": summarize(rows),
+                "days": [{"date": day, **summarize(day_rows)} for day, day_rows in by_day.items()]
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch daily reports: {str(e)}"
+        )
+
+async def run_rebuild(chunk_size: int):
+    rebuild_state.update(status="running", processed=0, error=None,
+                         startedAt=datetime.now(timezone.utc).isoformat(), finishedAt=None)
+    try:
+        await reports.rebuild_reports(db, chunk_size=chunk_size, progress=rebuild_state)
+        rebuild_state["status"] = "completed"
+    except Exception as e:
+        logger.error(f"Duty report rebuild failed: {str(e)}")
+        rebuild_state.update(status="failed", error=str(e))
+    finally:
+        rebuild_state["finishedAt"] = datetime.now(timezone.utc).isoformat()
+
+@router.post("/rebuild", status_code=202)
+async def rebuild_reports(
+    background_tasks: BackgroundTasks,
+    chunk_size: int = reports.DEFAULT_CHUNK_SIZE,
+    admin: User = Depends(get_current_admin_user)
+):
+    try:
+        await ensure_db_connection()
+
+        if rebuild_state["status"] == "running":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A report rebuild is already running"
+            )
+
+        if chunk_size < 1 or chunk_size > 10000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="chunk_size must be between 1 and 10000"
+            )
+
+        rebuild_state["status"] = "running"
+        background_tasks.add_task(run_rebuild, chunk_size)
+
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"detail": "Report rebuild started", "rebuild": rebuild_state}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to start report rebuild: {str(e)}"
+        )
+
+@router.get("/rebuild")
+async def get_rebuild_status(admin: User = Depends(get_current_admin_user)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"rebuild": rebuild_state})
@@ -0,0 +1,223 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+import logging
+import os
+
+from prisma import Prisma
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# One Prisma client for the whole process. Every module used to create its own,
+# which meant one query-engine connection pool per module; importing `db` from
+# here also gives every query the same latency instrumentation and per-request
+# query tracing.
+
+# Round trips a request may make before it is flagged; 0 disables the check
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "8"))
+# Raise QueryBudgetExceeded instead of logging, so tests fail on a regression
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() in ("1", "true", "yes")
+# Attach an X-DB-Queries summary header to every response (debug only)
+QUERY_TRACE_HEADER = os.getenv("QUERY_TRACE_HEADER", "false").lower() in ("1", "true", "yes")
+
+
+class QueryBudgetExceeded(Exception):
+    """A traced block issued more database round trips than its budget allows"""
+
+
+class QueryTrace:
+    """Database round trips issued while handling one request (or one traced block)"""
+
+    __slots__ = ("budget", "strict", "count", "seconds", "queries", "closed")
+
+    def __init__(self, budget: int = 0, strict: bool = False):
+        self.budget = budget
+        self.strict = strict
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+        self.closed = False
+
+    @property
+    def over_budget(self) -> bool:
+        return bool(self.budget) and self.count > self.budget
+
+    def add(self, model: str, action: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.queries.append((model, action, seconds))
+        if self.strict and self.over_budget:
+            raise QueryBudgetExceeded(
+                f"{self.count} queries exceed the budget of {self.budget}: "
+                + ", ".join(f"{model}.{action}" for model, action, _ in self.queries)
+            )
+
+    def summary(self) -> str:
+        return f"count={self.count};time={self.seconds * 1000:.2f}ms"
+
+
+_trace = ContextVar("query_trace", default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+@contextmanager
+def trace_queries(budget: int = 0, strict: bool = True):
+    """
+    Trace the queries issued inside the block, e.g. in a test:
+
+        with trace_queries(budget=2) as trace:
+            await duty_check_in(...)
+    """
+    trace = QueryTrace(budget, strict)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.closed = True
+        _trace.reset(token)
+
+
+def _record(model: str, action: str, seconds: float):
+    metrics.observe_db(model, action, seconds)
+    trace = _trace.get()
+    # Background tasks inherit the request's context; ignore them once it has ended
+    if trace is not None and not trace.closed:
+        trace.add(model, action, seconds)
+
+
+class _TimedActions:
+    """Wraps a model's `*Actions` object so each awaited query is timed"""
+
+    __slots__ = ("_model", "_actions", "_wrapped")
+
+    def __init__(self, model: str, actions):
+        self._model = model
+        self._actions = actions
+        self._wrapped = {}
+
+    def __getattr__(self, action):
+        wrapped = self._wrapped.get(action)
+        if wrapped is not None:
+            return wrapped
+
+        method = getattr(self._actions, action)
+        if action.startswith("_") or not callable(method):
+            return method
+
+        model = self._model
+
+        async def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _record(model, action, perf_counter() - started)
+
+        self._wrapped[action] = timed
+        return timed
+
+
+class _TimedBatch:
+    """Times the single round trip a `batch_()` block commits in"""
+
+    __slots__ = ("_batch",)
+
+    def __init__(self, batch):
+        self._batch = batch
+
+    def __getattr__(self, name):
+        return getattr(self._batch, name)
+
+    async def commit(self):
+        started = perf_counter()
+        try:
+            await self._batch.commit()
+        finally:
+            _record("batch", "commit", perf_counter() - started)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None:
+            await self.commit()
+
+
+class InstrumentedPrisma(Prisma):
+    """Prisma client reporting per model/action query latency to the metrics registry"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        for name in dir(self):
+            if name.startswith("_"):
+                continue
+            attr = getattr(self, name, None)
+            if type(attr).__name__.endswith("Actions"):
+                setattr(self, name, _TimedActions(name, attr))
+
+    def batch_(self):
+        return _TimedBatch(super().batch_())
+
+    async def execute_raw(self, query, *args):
+        started = perf_counter()
+        try:
+            return await super().execute_raw(query, *args)
+        finally:
+            _record("raw", "execute_raw", perf_counter() - started)
+
+    async def query_raw(self, query, *args, **kwargs):
+        started = perf_counter()
+        try:
+            return await super().query_raw(query, *args, **kwargs)
+        finally:
+            _record("raw", "query_raw", perf_counter() - started)
+
+
+class QueryTraceMiddleware:
+    """
+    Pure ASGI middleware that traces each request's queries, reports the count
+    per route template and flags requests over QUERY_BUDGET.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = QueryTrace(QUERY_BUDGET, QUERY_BUDGET_STRICT)
+        token = _trace.set(trace)
+
+        async def send_with_summary(message):
+            if QUERY_TRACE_HEADER and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", trace.summary().encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # Background tasks run after the body is sent and are not part of the request
+                trace.closed = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_summary)
+        finally:
+            trace.closed = True
+            _trace.reset(token)
+            route = metrics.route_template(scope)
+            metrics.observe_request_queries(route, trace.count)
+            if trace.over_budget:
+                metrics.query_budget_exceeded.inc(route)
+                logger.warning(
+                    f"{scope['method']} {route} issued {trace.count} queries (budget {trace.budget}): "
+                    + ", ".join(f"{model}.{action}" for model, action, _ in trace.queries)
+                )
+
+
+db = InstrumentedPrisma()
@@ -0,0 +1,230 @@
+from bisect import bisect_left
+from time import perf_counter
+
+# In-process metrics with Prometheus text exposition.
+#
+# Everything here is updated from the event loop thread only, so plain integer
+# and float updates need no locks. Each worker process keeps its own registry
+# and is scraped separately; aggregate across workers in the scraper.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class HistogramFamily:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.children = {}
+
+    def labels(self, *values) -> _Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = _Histogram(self.buckets)
+        return child
+
+    def observe(self, value: float, *labelvalues):
+        child = self.children.get(labelvalues)
+        if child is None:
+            child = self.children[labelvalues] = _Histogram(self.buckets)
+        child.counts[bisect_left(child.bounds, value)] += 1
+        child.sum += value
+        child.count += 1
+
+    def samples(self):
+        for values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", self.labelnames, values, ("le", _format_value(float(bound))), cumulative
+            yield f"{self.name}_sum", self.labelnames, values, None, child.sum
+            yield f"{self.name}_count", self.labelnames, values, None, child.count
+
+
+class CounterFamily:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        for values, value in self.values.items():
+            yield self.name, self.labelnames, values, None, value
+
+
+class GaugeFamily(CounterFamily):
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        self.values[labelvalues] = value
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) - amount
+
+
+class Registry:
+    def __init__(self):
+        self.families = []
+        self.collectors = []
+
+    def register(self, family):
+        self.families.append(family)
+        return family
+
+    def add_collector(self, collect):
+        """Register a callable returning gauge families computed at scrape time"""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        families = list(self.families)
+        for collect in self.collectors:
+            families.extend(collect())
+
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labelnames, values, extra, value in family.samples():
+                lines.append(f"{name}{_format_labels(labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(CounterFamily(
+    "http_requests_total", "HTTP requests by route template, method and status class", ("route", "method", "status")))
+http_errors = registry.register(CounterFamily(
+    "http_request_errors_total", "HTTP requests that failed with a 5xx or an unhandled exception", ("route", "method")))
+http_latency = registry.register(HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("route", "method")))
+http_in_flight = registry.register(GaugeFamily(
+    "http_requests_in_flight", "HTTP requests currently being served"))
+db_latency = registry.register(HistogramFamily(
+    "db_query_duration_seconds", "Prisma query latency by model and action", ("model", "action")))
+db_queries_per_request = registry.register(HistogramFamily(
+    "db_queries_per_request", "Database round trips per request by route template", ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)))
+query_budget_exceeded = registry.register(CounterFamily(
+    "db_query_budget_exceeded_total", "Requests that issued more queries than QUERY_BUDGET", ("route",)))
+face_latency = registry.register(HistogramFamily(
+    "face_service_request_duration_seconds", "Face-recognition service call latency", ("endpoint", "outcome")))
+
+_STATUS_CLASSES = {1: "1xx", 2: "2xx", 3: "3xx", 4: "4xx", 5: "5xx"}
+_UNMATCHED = "unmatched"
+
+
+def observe_db(model: str, action: str, seconds: float):
+    db_latency.observe(seconds, model, action)
+
+
+def observe_request_queries(route: str, count: int):
+    db_queries_per_request.observe(count, route)
+
+
+def observe_face(endpoint: str, outcome: str, seconds: float):
+    face_latency.observe(seconds, endpoint, outcome)
+
+
+def route_template(scope) -> str:
+    """Templated path of the matched route (e.g. /duties/{duty_id}/checkin), never the raw path"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path is not None else _UNMATCHED
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, request/error counts and
+    in-flight requests. It avoids BaseHTTPMiddleware so the per-request cost is
+    a couple of dict lookups and one histogram update.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        in_flight = http_in_flight.values
+        in_flight[()] = in_flight.get((), 0) + 1
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException:
+            status_holder[0] = 500
+            raise
+        finally:
+            elapsed = perf_counter() - started
+            in_flight[()] -= 1
+            route = route_template(scope)
+            method = scope["method"]
+            status = status_holder[0]
+            http_latency.observe(elapsed, route, method)
+            http_requests.inc(route, method, _STATUS_CLASSES.get(status // 100, "other"))
+            if status >= 500:
+                http_errors.inc(route, method)
+
+
+def cache_families(caches: dict):
+    """Scrape-time families for TTLCache-style objects exposing stats()"""
+    entries = GaugeFamily("cache_entries", "Entries held by in-process caches", ("cache",))
+    hits = CounterFamily("cache_hits_total", "In-process cache hits", ("cache",))
+    misses = CounterFamily("cache_misses_total", "In-process cache misses", ("cache",))
+    for name, cache in caches.items():
+        stats = cache.stats()
+        entries.values[(name,)] = stats["entries"]
+        hits.values[(name,)] = stats["hits"]
+        misses.values[(name,)] = stats["misses"]
+    return entries, hits, misses
@@ -4,14 +4,44 @@ from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 import jwt
+import uuid
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def generate_id():
-    import uuid
     return str(uuid.uuid4())
 
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _relation(name: str):
+    """List-valued relation stored in a slot and only allocated on first access"""
+    slot = "_" + name
+
+    def get(self):
+        value = getattr(self, slot)
+        if value is None:
+            value = []
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+
+def _enum_value(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _isoformat(value: Optional[datetime]):
+    return value.isoformat() if value else None
+
+
 class Role(Enum):
     ADMIN = "ADMIN"
     OFFICER = "OFFICER"
@@ -23,20 +53,41 @@ class DutyStatus(Enum):
     MISSED = "MISSED"
 
 
+class FaceStatus(Enum):
+    PENDING = "PENDING"
+    VERIFIED = "VERIFIED"
+    FAILED = "FAILED"
+
+
 class NotificationType(Enum):
     ALERT = "ALERT"
     REMINDER = "REMINDER"
     MISSED_DUTY = "MISSED_DUTY"
 
 
+# The domain classes below use __slots__ and lazily created relation lists so
+# hydrating thousands of rows stays cheap. Use `from_row` to wrap an existing
+# database row: it keeps the row's id and timestamps instead of generating new ones.
+
+
 class User:
+    __slots__ = (
+        "id", "empid", "passwordHash", "role", "profileImage", "unreadNotifications",
+        "lastLatitude", "lastLongitude", "lastSeenAt", "createdAt", "updatedAt",
+        "_dutyAssignments", "_assignedDuties", "_dutyLogs", "_notifications", "_reports", "_faceEmbeddings",
+    )
+
     def __init__(
         self,
-        id: str = None,  # Change this line
+        id: str = None,
         empid: str = None,
         passwordHash: Optional[str] = None,
         role: Role = Role.OFFICER,
         profileImage: Optional[List[str]] = None,
+        unreadNotifications: int = 0,
+        lastLatitude: Optional[float] = None,
+        lastLongitude: Optional[float] = None,
+        lastSeenAt: Optional[datetime] = None,
         createdAt: Optional[datetime] = None,
         updatedAt: Optional[datetime] = None,
         dutyAssignments: Optional[List["DutyAssignment"]] = None,
@@ -46,19 +97,48 @@ class User:
         reports: Optional[List["DutyReport"]] = None,
         faceEmbeddings: Optional[List["FaceEmbedding"]] = None,
     ):
-        self.id = id or generate_id()  # Change this line
+        self.id = id or generate_id()
         self.empid = empid
         self.passwordHash = passwordHash
-        self.role = Role(role) if isinstance(role, str) else role  
-        self.profileImage = profileImage if profileImage is not None else []  # Fix the assignment
-        self.createdAt = createdAt or datetime.now(timezone.utc)
+        self.role = Role(role) if isinstance(role, str) else role
+        self.profileImage = profileImage if profileImage is not None else []
+        self.unreadNotifications = unreadNotifications
+        self.lastLatitude = lastLatitude
+        self.lastLongitude = lastLongitude
+        self.lastSeenAt = lastSeenAt
+        self.createdAt = createdAt or _utcnow()
         self.updatedAt = updatedAt
-        self.dutyAssignments = dutyAssignments or []
-        self.assignedDuties = assignedDuties or []
-        self.dutyLogs = dutyLogs or []
-        self.notifications = notifications or []
-        self.reports = reports or []
-        self.faceEmbeddings = faceEmbeddings or []
+        self._dutyAssignments = dutyAssignments
+        self._assignedDuties = assignedDuties
+        self._dutyLogs = dutyLogs
+        self._notifications = notifications
+        self._reports = reports
+        self._faceEmbeddings = faceEmbeddings
+
+    dutyAssignments = _relation("dutyAssignments")
+    assignedDuties = _relation("assignedDuties")
+    dutyLogs = _relation("dutyLogs")
+    notifications = _relation("notifications")
+    reports = _relation("reports")
+    faceEmbeddings = _relation("faceEmbeddings")
+
+    @classmethod
+    def from_row(cls, row) -> "User":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.empid = row.empid
+        self.passwordHash = row.passwordHash
+        self.role = Role(row.role)
+        self.profileImage = row.profileImage or []
+        self.unreadNotifications = row.unreadNotifications
+        self.lastLatitude = row.lastLatitude
+        self.lastLongitude = row.lastLongitude
+        self.lastSeenAt = row.lastSeenAt
+        self.createdAt = row.createdAt
+        self.updatedAt = row.updatedAt
+        self._dutyAssignments = self._assignedDuties = self._dutyLogs = None
+        self._notifications = self._reports = self._faceEmbeddings = None
+        return self
 
     def set_password(self, password: str):
         self.passwordHash = pwd_context.hash(password)
@@ -73,47 +153,72 @@ class User:
         payload = {
             "empid": self.empid,
             "role": self.role.value,
-            "exp": datetime.now(timezone.utc) + timedelta(days=expiration_days)
+            "exp": _utcnow() + timedelta(days=expiration_days)
         }
         token = jwt.encode(payload, secret_key, algorithm="HS256")
         return token
-    
+
     def to_dict(self):
         return {
             "id": self.id,
             "empid": self.empid,
-            "role": self.role.value if isinstance(self.role, Enum) else self.role,
+            "role": _enum_value(self.role),
             "profileImage": self.profileImage,
             "passwordHash": self.passwordHash,
-            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
-            "updatedAt": self.updatedAt.isoformat() if self.updatedAt else None,
+            "createdAt": _isoformat(self.createdAt),
+            "updatedAt": _isoformat(self.updatedAt),
         }
-    
+
 
 class FaceEmbedding:
+    __slots__ = ("id", "userId", "embedding", "quality", "modelVersion", "createdAt", "user")
+
     def __init__(
         self,
         userId: str,
         embedding: List[float],
         createdAt: Optional[datetime] = None,
         user: Optional[User] = None,
+        quality: Optional[float] = None,
+        modelVersion: str = "vggface2-160",
     ):
         self.id = generate_id()
         self.userId = userId
         self.embedding = embedding
-        self.createdAt = createdAt or datetime.now(timezone.utc)
+        self.quality = quality
+        self.modelVersion = modelVersion
+        self.createdAt = createdAt or _utcnow()
         self.user = user
 
+    @classmethod
+    def from_row(cls, row) -> "FaceEmbedding":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.userId = row.userId
+        self.embedding = row.embedding
+        self.quality = row.quality
+        self.modelVersion = row.modelVersion
+        self.createdAt = row.createdAt
+        self.user = None
+        return self
+
     def to_dict(self):
         return {
             "id": self.id,
             "userId": self.userId,
             "embedding": self.embedding,
-            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
+            "quality": self.quality,
+            "modelVersion": self.modelVersion,
+            "createdAt": _isoformat(self.createdAt),
         }
 
 
 class DutyAssignment:
+    __slots__ = (
+        "id", "officerId", "assignedBy", "location", "latitude", "longitude", "radius",
+        "startTime", "endTime", "status", "templateId", "officer", "admin", "_logs",
+    )
+
     def __init__(
         self,
         officerId: str,
@@ -125,6 +230,7 @@ class DutyAssignment:
         startTime: datetime = None,
         endTime: datetime = None,
         status: DutyStatus = DutyStatus.PENDING,
+        templateId: Optional[str] = None,
         officer: Optional[User] = None,
         admin: Optional[User] = None,
         logs: Optional[List["DutyLog"]] = None,
@@ -139,10 +245,29 @@ class DutyAssignment:
         self.startTime = startTime
         self.endTime = endTime
         self.status = status
+        self.templateId = templateId
         self.officer = officer
         self.admin = admin
-        self.logs = logs or []
+        self._logs = logs
 
+    logs = _relation("logs")
+
+    @classmethod
+    def from_row(cls, row) -> "DutyAssignment":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.officerId = row.officerId
+        self.assignedBy = row.assignedBy
+        self.location = row.location
+        self.latitude = row.latitude
+        self.longitude = row.longitude
+        self.radius = row.radius
+        self.startTime = row.startTime
+        self.endTime = row.endTime
+        self.status = DutyStatus(row.status)
+        self.templateId = row.templateId
+        self.officer = self.admin = self._logs = None
+        return self
 
     def to_dict(self):
         return {
@@ -153,13 +278,19 @@ class DutyAssignment:
             "latitude": self.latitude,
             "longitude": self.longitude,
             "radius": self.radius,
-            "startTime": self.startTime.isoformat() if self.startTime else None,
-            "endTime": self.endTime.isoformat() if self.endTime else None,
-            "status": self.status.value if isinstance(self.status, Enum) else self.status,
+            "startTime": _isoformat(self.startTime),
+            "endTime": _isoformat(self.endTime),
+            "status": _enum_value(self.status),
+            "templateId": self.templateId,
         }
 
 
 class DutyLog:
+    __slots__ = (
+        "id", "dutyId", "officerId", "checkinTime", "selfiePath", "faceVerified", "locationVerified",
+        "faceStatus", "faceConfidence", "distance", "remarks", "duty", "officer", "createdAt", "updatedAt",
+    )
+
     def __init__(
         self,
         id: str,
@@ -170,41 +301,71 @@ class DutyLog:
         faceVerified: bool = False,
         locationVerified: bool = False,
         remarks: Optional[str] = None,
-        createdAt: Optional[datetime] = None,  # Add this parameter
-        updatedAt: Optional[datetime] = None,  # Add this parameter
+        createdAt: Optional[datetime] = None,
+        updatedAt: Optional[datetime] = None,
         duty: Optional[DutyAssignment] = None,
         officer: Optional[User] = None,
+        faceStatus: Optional[FaceStatus] = None,
+        faceConfidence: Optional[float] = None,
+        distance: Optional[float] = None,
     ):
+        now = None if (checkinTime and createdAt and updatedAt) else _utcnow()
         self.id = id or generate_id()
         self.dutyId = dutyId
         self.officerId = officerId
-        self.checkinTime = checkinTime or datetime.now(timezone.utc)
+        self.checkinTime = checkinTime or now
         self.selfiePath = selfiePath
         self.faceVerified = faceVerified
         self.locationVerified = locationVerified
+        self.faceStatus = FaceStatus(faceStatus) if isinstance(faceStatus, str) else faceStatus
+        self.faceConfidence = faceConfidence
+        self.distance = distance
         self.remarks = remarks
         self.duty = duty
         self.officer = officer
-        self.createdAt = createdAt or datetime.now(timezone.utc)  # Use provided or default
-        self.updatedAt = updatedAt or datetime.now(timezone.utc)  # Use provided or default
+        self.createdAt = createdAt or now
+        self.updatedAt = updatedAt or now
 
+    @classmethod
+    def from_row(cls, row) -> "DutyLog":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.dutyId = row.dutyId
+        self.officerId = row.officerId
+        self.checkinTime = row.checkinTime
+        self.selfiePath = row.selfiePath
+        self.faceVerified = row.faceVerified
+        self.locationVerified = row.locationVerified
+        self.faceStatus = FaceStatus(row.faceStatus) if row.faceStatus else None
+        self.faceConfidence = row.faceConfidence
+        self.distance = row.distance
+        self.remarks = row.remarks
+        self.createdAt = row.createdAt
+        self.updatedAt = row.updatedAt
+        self.duty = self.officer = None
+        return self
 
-    def to_dict(self):        
+    def to_dict(self):
         return {
             "id": self.id,
             "dutyId": self.dutyId,
             "officerId": self.officerId,
-            "checkinTime": self.checkinTime.isoformat() if self.checkinTime else None,
+            "checkinTime": _isoformat(self.checkinTime),
             "selfiePath": self.selfiePath,
             "faceVerified": self.faceVerified,
+            "faceStatus": _enum_value(self.faceStatus),
+            "faceConfidence": self.faceConfidence,
             "locationVerified": self.locationVerified,
+            "distance": self.distance,
             "remarks": self.remarks,
-            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
-            "updatedAt": self.updatedAt.isoformat() if self.updatedAt else None,
+            "createdAt": _isoformat(self.createdAt),
+            "updatedAt": _isoformat(self.updatedAt),
         }
 
 
 class Notification:
+    __slots__ = ("id", "userId", "message", "type", "createdAt", "read", "user")
+
     def __init__(
         self,
         userId: str,
@@ -218,23 +379,36 @@ class Notification:
         self.userId = userId
         self.message = message
         self.type = type
-        self.createdAt = createdAt or datetime.now(timezone.utc)
+        self.createdAt = createdAt or _utcnow()
         self.read = read
         self.user = user
 
+    @classmethod
+    def from_row(cls, row) -> "Notification":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.userId = row.userId
+        self.message = row.message
+        self.type = NotificationType(row.type)
+        self.createdAt = row.createdAt
+        self.read = row.read
+        self.user = None
+        return self
 
     def to_dict(self):
         return {
             "id": self.id,
             "userId": self.userId,
             "message": self.message,
-            "type": self.type.value if isinstance(self.type, Enum) else self.type,
-            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
+            "type": _enum_value(self.type),
+            "createdAt": _isoformat(self.createdAt),
             "read": self.read,
         }
 
 
 class DutyReport:
+    __slots__ = ("id", "officerId", "date", "totalAssigned", "completed", "missed", "complianceRate", "officer")
+
     def __init__(
         self,
         officerId: str,
@@ -254,12 +428,24 @@ class DutyReport:
         self.complianceRate = complianceRate
         self.officer = officer
 
-    
+    @classmethod
+    def from_row(cls, row) -> "DutyReport":
+        self = cls.__new__(cls)
+        self.id = row.id
+        self.officerId = row.officerId
+        self.date = row.date
+        self.totalAssigned = row.totalAssigned
+        self.completed = row.completed
+        self.missed = row.missed
+        self.complianceRate = row.complianceRate
+        self.officer = None
+        return self
+
     def to_dict(self):
         return {
             "id": self.id,
             "officerId": self.officerId,
-            "date": self.date.isoformat() if self.date else None,
+            "date": _isoformat(self.date),
             "totalAssigned": self.totalAssigned,
             "completed": self.completed,
             "missed": self.missed,
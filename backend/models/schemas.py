@@ -1,6 +1,7 @@
 from pydantic import BaseModel, validator, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 class UserOut(BaseModel):
     id: str
@@ -80,4 +81,120 @@ class LocationUpdateRequest(BaseModel):
     def validate_duty_id(cls, v):
         if not v or v.strip() == "":
             raise ValueError('dutyId cannot be empty')
-        return v.strip()
\ No newline at end of file
+        return v.strip()
+
+class NotificationCreateSchema(BaseModel):
+    message: str = Field(..., min_length=1, max_length=1000)
+    type: str = "ALERT"
+    # Explicit recipients, or everyone with `role`; one of the two is required
+    userIds: Optional[List[str]] = None
+    role: Optional[str] = None
+
+    @validator('message')
+    def validate_message(cls, v):
+        if not v or v.strip() == "":
+            raise ValueError('message cannot be empty')
+        return v.strip()
+
+    @validator('type')
+    def validate_type(cls, v):
+        if v not in ['ALERT', 'REMINDER', 'MISSED_DUTY']:
+            raise ValueError('type must be one of ALERT, REMINDER or MISSED_DUTY')
+        return v
+
+    @validator('role')
+    def validate_role(cls, v):
+        if v is not None and v not in ['ADMIN', 'OFFICER']:
+            raise ValueError('role must be either ADMIN or OFFICER')
+        return v
+
+class MarkReadSchema(BaseModel):
+    # Omit to mark the whole inbox as read
+    ids: Optional[List[str]] = Field(default=None, max_length=500)
+
+class PatrolTemplateCreateSchema(BaseModel):
+    location: str = Field(..., min_length=1)
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius: float = Field(default=100, gt=0, le=10000)
+    startTime: time  # Local time of day the shift starts, e.g. "22:00"
+    durationMinutes: int = Field(..., gt=0, le=1440)
+    timezone: str = "Asia/Kolkata"
+    # 0 = Monday ... 6 = Sunday; empty runs every day
+    weekdays: List[int] = []
+    officerIds: List[str] = Field(..., min_length=1)
+    officersPerShift: int = Field(default=1, ge=1)
+    startDate: date
+    endDate: Optional[date] = None
+
+    @validator('location')
+    def validate_location(cls, v):
+        if not v or v.strip() == "":
+            raise ValueError('location cannot be empty')
+        return v.strip()
+
+    @validator('timezone')
+    def validate_timezone(cls, v):
+        try:
+            ZoneInfo(v)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f'unknown timezone: {v}')
+        return v
+
+    @validator('weekdays')
+    def validate_weekdays(cls, v):
+        if any(day < 0 or day > 6 for day in v):
+            raise ValueError('weekdays must be between 0 (Monday) and 6 (Sunday)')
+        return sorted(set(v))
+
+    @validator('officerIds')
+    def validate_officer_ids(cls, v):
+        officers = [officer.strip() for officer in v if officer and officer.strip()]
+        if len(officers) != len(v):
+            raise ValueError('officerIds cannot contain empty ids')
+        if len(set(officers)) != len(officers):
+            raise ValueError('officerIds cannot contain duplicates')
+        return officers
+
+    @validator('officersPerShift')
+    def validate_officers_per_shift(cls, v, values):
+        if 'officerIds' in values and v > len(values['officerIds']):
+            raise ValueError('officersPerShift cannot exceed the number of officers in the rotation')
+        return v
+
+    @validator('endDate')
+    def validate_end_date(cls, v, values):
+        if v is not None and 'startDate' in values and v < values['startDate']:
+            raise ValueError('endDate cannot be before startDate')
+        return v
+
+class BeatSchema(BaseModel):
+    location: str = Field(..., min_length=1)
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius: float = Field(default=100, gt=0, le=10000)
+    startTime: datetime
+    endTime: datetime
+    officers: int = Field(default=1, ge=1, le=50)
+
+    @validator('endTime')
+    def validate_end_time(cls, v, values):
+        if 'startTime' in values and v <= values['startTime']:
+            raise ValueError('endTime must be after startTime')
+        return v
+
+    @validator('location')
+    def validate_location(cls, v):
+        if not v or v.strip() == "":
+            raise ValueError('location cannot be empty')
+        return v.strip()
+
+class AssignmentProposeSchema(BaseModel):
+    beats: List[BeatSchema] = Field(..., min_length=1)
+    # Officers to choose from; every officer when omitted
+    officerIds: Optional[List[str]] = None
+    # Never send an officer further than this from their last position
+    maxDistanceMeters: Optional[float] = Field(default=None, gt=0)
+
+class AssignmentCommitSchema(BaseModel):
+    duties: List[DutyCreateSchema] = Field(..., min_length=1)
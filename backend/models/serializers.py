@@ -0,0 +1,106 @@
+from fastapi.responses import ORJSONResponse
+
+# Rows coming back from Prisma are mapped straight to plain dicts here instead of
+# being rebuilt as domain models first. Datetimes and enums are left as-is;
+# orjson encodes them natively (ISO 8601 / enum value) in ORJSONResponse.
+FastJSONResponse = ORJSONResponse
+
+
+def duty_row(row) -> dict:
+    return {
+        "id": row.id,
+        "officerId": row.officerId,
+        "assignedBy": row.assignedBy,
+        "location": row.location,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "radius": row.radius,
+        "startTime": row.startTime,
+        "endTime": row.endTime,
+        "status": row.status,
+        "templateId": row.templateId,
+    }
+
+
+def user_row(row) -> dict:
+    return {
+        "id": row.id,
+        "empid": row.empid,
+        "role": row.role,
+        "profileImage": row.profileImage or [],
+        "createdAt": row.createdAt,
+        "updatedAt": row.updatedAt,
+    }
+
+
+def duty_rows(rows) -> list:
+    return [duty_row(row) for row in rows]
+
+
+def user_rows(rows) -> list:
+    return [user_row(row) for row in rows]
+
+
+def log_row(row) -> dict:
+    return {
+        "id": row.id,
+        "dutyId": row.dutyId,
+        "officerId": row.officerId,
+        "checkinTime": row.checkinTime,
+        "selfiePath": row.selfiePath,
+        "faceVerified": row.faceVerified,
+        "faceStatus": row.faceStatus,
+        "faceConfidence": row.faceConfidence,
+        "locationVerified": row.locationVerified,
+        "distance": row.distance,
+        "remarks": row.remarks,
+        "createdAt": row.createdAt,
+        "updatedAt": row.updatedAt,
+    }
+
+
+def log_rows(rows) -> list:
+    return [log_row(row) for row in rows]
+
+
+def notification_row(row) -> dict:
+    return {
+        "id": row.id,
+        "userId": row.userId,
+        "message": row.message,
+        "type": row.type,
+        "createdAt": row.createdAt,
+        "read": row.read,
+    }
+
+
+def notification_rows(rows) -> list:
+    return [notification_row(row) for row in rows]
+
+
+def patrol_template_row(row) -> dict:
+    return {
+        "id": row.id,
+        "createdBy": row.createdBy,
+        "location": row.location,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "radius": row.radius,
+        "startTime": f"{row.startMinute // 60:02d}:{row.startMinute % 60:02d}",
+        "durationMinutes": row.durationMinutes,
+        "timezone": row.timezone,
+        "weekdays": row.weekdays or [],
+        "officerIds": row.officerIds or [],
+        "officersPerShift": row.officersPerShift,
+        # Calendar days, stored as UTC midnight
+        "startDate": row.startDate.date(),
+        "endDate": row.endDate.date() if row.endDate else None,
+        "generatedUntil": row.generatedUntil.date() if row.generatedUntil else None,
+        "active": row.active,
+        "createdAt": row.createdAt,
+        "updatedAt": row.updatedAt,
+    }
+
+
+def patrol_template_rows(rows) -> list:
+    return [patrol_template_row(row) for row in rows]
@@ -1,7 +1,7 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from prisma import Prisma
+from database import db
 import os
 
 from models.model import Role, User
@@ -15,7 +15,6 @@ if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is required")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
-db = Prisma()
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -61,16 +60,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Convert database record to User model instance with null safety
-        user = User(
-            id=user_data.id,
-            empid=user_data.empid,
-            role=user_data.role,
-            profileImage=user_data.profileImage if user_data.profileImage else [],
-            passwordHash=user_data.passwordHash,
-            createdAt=user_data.createdAt,
-            updatedAt=user_data.updatedAt
-        )
+        # Wrap the database record without generating a new id or timestamps
+        user = User.from_row(user_data)
         
         return user
         
@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta
+import os
+import uuid
+
+from services.cache import TTLCache
+
+# Histogram upper bounds; the last bucket of each histogram is the overflow bucket.
+LATENCY_BOUNDS = [60, 300, 600, 900, 1800, 3600, 7200]           # seconds after startTime
+DISTANCE_BOUNDS = [10, 25, 50, 100, 200, 500, 1000]               # metres from duty location
+
+PERIODS = ("day", "week", "month")
+
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "60"))
+
+cache = TTLCache(ttl_seconds=ANALYTICS_CACHE_TTL_SECONDS, max_entries=512)
+
+# One rollup row per (officer, station, day); the station is the SHO who assigned
+# the duty. Histogram arrays are added element-wise.
+ANALYTICS_UPSERT_SQL = """
+INSERT INTO "AnalyticsRollup" ("id", "officerId", "stationId", "date", "totalAssigned", "completed", "missed",
+                               "checkins", "latencySum", "latencyBuckets", "distanceSum", "distanceBuckets")
+VALUES ($1, $2, $3, $4::timestamp(3), $5::int, $6::int, $7::int, $8::int, $9::float8, $10::int[], $11::float8, $12::int[])
+ON CONFLICT ("officerId", "stationId", "date") DO UPDATE SET
+    "totalAssigned" = "AnalyticsRollup"."totalAssigned" + EXCLUDED."totalAssigned",
+    "completed" = "AnalyticsRollup"."completed" + EXCLUDED."completed",
+    "missed" = "AnalyticsRollup"."missed" + EXCLUDED."missed",
+    "checkins" = "AnalyticsRollup"."checkins" + EXCLUDED."checkins",
+    "latencySum" = "AnalyticsRollup"."latencySum" + EXCLUDED."latencySum",
+    "latencyBuckets" = ARRAY(
+        SELECT COALESCE(a, 0) + COALESCE(b, 0)
+        FROM unnest("AnalyticsRollup"."latencyBuckets", EXCLUDED."latencyBuckets") AS t(a, b)
+    ),
+    "distanceSum" = "AnalyticsRollup"."distanceSum" + EXCLUDED."distanceSum",
+    "distanceBuckets" = ARRAY(
+        SELECT COALESCE(a, 0) + COALESCE(b, 0)
+        FROM unnest("AnalyticsRollup"."distanceBuckets", EXCLUDED."distanceBuckets") AS t(a, b)
+    )
+"""
+
+
+def bucket_index(bounds, value: float) -> int:
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+class AnalyticsDelta:
+    """Accumulates the counters for one (officer, station, day) rollup row"""
+
+    __slots__ = ("assigned", "completed", "missed", "checkins",
+                 "latency_sum", "latency_buckets", "distance_sum", "distance_buckets")
+
+    def __init__(self):
+        self.assigned = 0
+        self.completed = 0
+        self.missed = 0
+        self.checkins = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.distance_sum = 0.0
+        self.distance_buckets = [0] * (len(DISTANCE_BOUNDS) + 1)
+
+    def add_checkin(self, latency_seconds: float = None, distance: float = None):
+        self.checkins += 1
+        if latency_seconds is not None:
+            latency_seconds = max(latency_seconds, 0.0)
+            self.latency_sum += latency_seconds
+            self.latency_buckets[bucket_index(LATENCY_BOUNDS, latency_seconds)] += 1
+        if distance is not None:
+            self.distance_sum += distance
+            self.distance_buckets[bucket_index(DISTANCE_BOUNDS, distance)] += 1
+
+
+def rollup_statement(officer_id: str, station_id: str, day: datetime, delta: AnalyticsDelta):
+    """Build the (sql, *args) tuple that adds one delta to its rollup row"""
+    return (
+        ANALYTICS_UPSERT_SQL,
+        uuid.uuid4().hex,
+        officer_id,
+        station_id,
+        day.replace(tzinfo=None).isoformat(),
+        delta.assigned,
+        delta.completed,
+        delta.missed,
+        delta.checkins,
+        delta.latency_sum,
+        delta.latency_buckets,
+        delta.distance_sum,
+        delta.distance_buckets,
+    )
+
+
+def invalidate(officer_id: str, station_id: str):
+    """Drop cached analytics derived from this officer's or station's rollups"""
+    cache.invalidate(f"officer:{officer_id}", f"station:{station_id}", "all")
+
+
+def period_start(day: datetime, period: str) -> datetime:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _percentile(bounds, buckets, fraction: float):
+    """Upper bound of the histogram bucket containing the given fraction of samples"""
+    total = sum(buckets)
+    if not total:
+        return None
+    target = total * fraction
+    running = 0
+    for index, count in enumerate(buckets):
+        running += count
+        if running >= target:
+            return bounds[index] if index < len(bounds) else None
+    return None
+
+
+def _empty_bucket():
+    return {
+        "totalAssigned": 0,
+        "completed": 0,
+        "missed": 0,
+        "checkins": 0,
+        "latencySum": 0.0,
+        "latencyBuckets": [0] * (len(LATENCY_BOUNDS) + 1),
+        "distanceSum": 0.0,
+        "distanceBuckets": [0] * (len(DISTANCE_BOUNDS) + 1),
+    }
+
+
+def _add_row(bucket: dict, row):
+    bucket["totalAssigned"] += row.totalAssigned
+    bucket["completed"] += row.completed
+    bucket["missed"] += row.missed
+    bucket["checkins"] += row.checkins
+    bucket["latencySum"] += row.latencySum
+    bucket["distanceSum"] += row.distanceSum
+    for index, count in enumerate(row.latencyBuckets or []):
+        bucket["latencyBuckets"][index] += count
+    for index, count in enumerate(row.distanceBuckets or []):
+        bucket["distanceBuckets"][index] += count
+
+
+def _finish(bucket: dict) -> dict:
+    total = bucket["totalAssigned"]
+    latency_samples = sum(bucket["latencyBuckets"])
+    distance_samples = sum(bucket["distanceBuckets"])
+    return {
+        "totalAssigned": total,
+        "completed": bucket["completed"],
+        "missed": bucket["missed"],
+        "complianceRate": round(bucket["completed"] / total, 4) if total else 0.0,
+        "checkins": bucket["checkins"],
+        "checkinLatency": {
+            "averageSeconds": round(bucket["latencySum"] / latency_samples, 2) if latency_samples else None,
+            "p50Seconds": _percentile(LATENCY_BOUNDS, bucket["latencyBuckets"], 0.5),
+            "p90Seconds": _percentile(LATENCY_BOUNDS, bucket["latencyBuckets"], 0.9),
+            "bounds": LATENCY_BOUNDS,
+            "histogram": bucket["latencyBuckets"],
+        },
+        "checkinDistance": {
+            "averageMeters": round(bucket["distanceSum"] / distance_samples, 2) if distance_samples else None,
+            "bounds": DISTANCE_BOUNDS,
+            "histogram": bucket["distanceBuckets"],
+        },
+    }
+
+
+def summarize(rows, period: str) -> dict:
+    """Fold daily rollup rows into day/week/month buckets plus an overall total"""
+    overall = _empty_bucket()
+    buckets = {}
+    for row in rows:
+        key = period_start(row.date.replace(tzinfo=None), period).date().isoformat()
+        if key not in buckets:
+            buckets[key] = _empty_bucket()
+        _add_row(buckets[key], row)
+        _add_row(overall, row)
+
+    return {
+        "period": period,
+        "summary": _finish(overall),
+        "buckets": [{"start": key, **_finish(buckets[key])} for key in sorted(buckets)],
+    }
@@ -0,0 +1,165 @@
+from datetime import datetime, timezone
+from time import perf_counter
+import asyncio
+import os
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services import duties as duty_writes
+
+# Officer-to-beat assignment as a linear sum assignment problem. Rows are
+# officers, columns are beat slots (a beat needing two officers is two columns)
+# and the cost is the great-circle distance from the officer's last reported
+# position to the beat centre. The matrix is built with NumPy broadcasting and
+# solved optimally with SciPy's Hungarian-style solver, so a district-sized
+# night (1000 x 1000) is planned in one request instead of one create_duty at a time.
+
+EARTH_RADIUS_METERS = 6371000
+# Officers who have never reported a position rank behind every located officer
+UNKNOWN_POSITION_METERS = float(os.getenv("ASSIGN_UNKNOWN_POSITION_METERS", "50000"))
+MAX_ASSIGNMENT_OFFICERS = int(os.getenv("MAX_ASSIGNMENT_OFFICERS", "2000"))
+MAX_ASSIGNMENT_SLOTS = int(os.getenv("MAX_ASSIGNMENT_SLOTS", "2000"))
+# Cost of a pair that must not be proposed: the officer is busy or too far away.
+# Finite, so the solver still finds the best assignment of everyone else.
+UNAVAILABLE_COST = 1e12
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _timestamps(values) -> np.ndarray:
+    return np.array([_aware(value).timestamp() for value in values], dtype=np.float64)
+
+
+def distance_matrix(officer_lat, officer_lon, beat_lat, beat_lon) -> np.ndarray:
+    """Haversine distances in metres, officers x beats"""
+    lat1 = np.radians(np.asarray(officer_lat, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(officer_lon, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(beat_lat, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(beat_lon, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def busy_matrix(officer_rows, busy_starts, busy_ends, beat_starts, beat_ends, officers: int) -> np.ndarray:
+    """officers x beats, True where one of the officer's duties overlaps the beat's window"""
+    busy = np.zeros((officers, len(beat_starts)), dtype=bool)
+    if len(officer_rows):
+        overlap = (busy_starts[:, None] < beat_ends[None, :]) & (busy_ends[:, None] > beat_starts[None, :])
+        np.logical_or.at(busy, officer_rows, overlap)
+    return busy
+
+
+def cost_matrix(officers, beats, busy: dict, max_distance: float = None):
+    """
+    (cost, distance, slot_beats) for the given officer rows and beat specs.
+    `busy` maps officerId -> [(start, end)] of existing duties; `distance` is
+    NaN for officers with no reported position.
+    """
+    slot_beats = np.repeat(np.arange(len(beats)), [beat.officers for beat in beats])
+
+    located = np.array([o.lastLatitude is not None and o.lastLongitude is not None for o in officers], dtype=bool)
+    officer_lat = np.array([o.lastLatitude if o.lastLatitude is not None else 0.0 for o in officers])
+    officer_lon = np.array([o.lastLongitude if o.lastLongitude is not None else 0.0 for o in officers])
+    distance = distance_matrix(
+        officer_lat, officer_lon, [beat.latitude for beat in beats], [beat.longitude for beat in beats]
+    )
+
+    rows = {officer.id: i for i, officer in enumerate(officers)}
+    intervals = [(rows[officer_id], start, end) for officer_id, spans in busy.items() if officer_id in rows
+                 for start, end in spans]
+    unavailable = busy_matrix(
+        np.array([row for row, _, _ in intervals], dtype=np.intp),
+        _timestamps(start for _, start, _ in intervals),
+        _timestamps(end for _, _, end in intervals),
+        _timestamps(beat.startTime for beat in beats),
+        _timestamps(beat.endTime for beat in beats),
+        len(officers),
+    )
+
+    if max_distance is not None:
+        unavailable |= located[:, None] & (distance > max_distance)
+    cost = np.where(located[:, None], distance, UNKNOWN_POSITION_METERS)
+    cost[unavailable] = UNAVAILABLE_COST
+    distance[~located, :] = np.nan
+    return cost[:, slot_beats], distance, slot_beats
+
+
+def solve(cost: np.ndarray):
+    """Optimal (officer rows, slot columns), without the pairs that were never allowed"""
+    rows, cols = linear_sum_assignment(cost)
+    allowed = cost[rows, cols] < UNAVAILABLE_COST
+    return rows[allowed], cols[allowed]
+
+
+def plan(officers, beats, busy: dict, max_distance: float = None):
+    """Build and solve the problem: (distance, slot_beats, rows, cols, timings)"""
+    started = perf_counter()
+    cost, distance, slot_beats = cost_matrix(officers, beats, busy, max_distance)
+    built = perf_counter()
+    if officers:
+        rows, cols = solve(cost)
+    else:
+        rows, cols = np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    solved = perf_counter()
+    timings = {"costMatrixMs": round((built - started) * 1000, 2), "solveMs": round((solved - built) * 1000, 2)}
+    return distance, slot_beats, rows, cols, timings
+
+
+async def propose(db, beats, officer_ids=None, max_distance: float = None) -> dict:
+    """
+    Propose which officer covers each beat slot, minimising the total distance
+    officers travel from their last reported positions. Officers with a duty
+    overlapping a beat's window are not considered for it. Nothing is written;
+    the returned duties can be committed as they are.
+    """
+    where = {"role": "OFFICER"}
+    if officer_ids is not None:
+        where["id"] = {"in": list(officer_ids)}
+    officers = await db.user.find_many(where=where, order={"id": "asc"})
+    if len(officers) > MAX_ASSIGNMENT_OFFICERS:
+        raise ValueError(f"At most {MAX_ASSIGNMENT_OFFICERS} officers can be assigned at once")
+    if sum(beat.officers for beat in beats) > MAX_ASSIGNMENT_SLOTS:
+        raise ValueError(f"At most {MAX_ASSIGNMENT_SLOTS} beat slots can be assigned at once")
+
+    window_start = min(_aware(beat.startTime) for beat in beats)
+    window_end = max(_aware(beat.endTime) for beat in beats)
+    busy = await duty_writes.busy_intervals(db, [officer.id for officer in officers], window_start, window_end)
+
+    # A 1000 x 1000 problem is around a tenth of a second of CPU; keep it off the event loop
+    distance, slot_beats, rows, cols, timings = await asyncio.to_thread(plan, officers, beats, busy, max_distance)
+
+    assignments = []
+    covered = np.zeros(len(beats), dtype=np.int64)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        index = int(slot_beats[col])
+        beat = beats[index]
+        covered[index] += 1
+        meters = distance[row, index]
+        assignments.append({
+            "beat": index,
+            "officerId": officers[row].id,
+            "location": beat.location,
+            "latitude": beat.latitude,
+            "longitude": beat.longitude,
+            "radius": beat.radius,
+            "startTime": beat.startTime,
+            "endTime": beat.endTime,
+            # None for an officer who has never reported a position
+            "distance": None if np.isnan(meters) else round(float(meters), 2),
+        })
+    assignments.sort(key=lambda assignment: assignment["beat"])
+
+    return {
+        "assignments": assignments,
+        "unassigned": [
+            {"beat": index, "missing": int(beat.officers - covered[index])}
+            for index, beat in enumerate(beats) if covered[index] < beat.officers
+        ],
+        "totalDistance": round(sum(a["distance"] for a in assignments if a["distance"] is not None), 2),
+        "officers": len(officers),
+        "slots": int(len(slot_beats)),
+        "timings": timings,
+    }
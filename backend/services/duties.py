@@ -0,0 +1,60 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from services import analytics, reports, sync, versions
+
+# Bulk duty writes for callers that schedule many duties at once (patrol
+# templates, the assignment solver). Overlaps are checked against one query for
+# the whole window, and every duty goes in with a single create_many alongside
+# the rollups, ETag version bumps and sync entries create_duty writes one by one.
+
+OVERLAP_DETAIL = "Officer already has an overlapping duty assignment"
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def overlaps(start: datetime, end: datetime, other_start: datetime, other_end: datetime) -> bool:
+    return start < other_end and end > other_start
+
+
+async def busy_intervals(db, officer_ids, start: datetime, end: datetime) -> dict:
+    """officerId -> [(startTime, endTime)] of their duties overlapping [start, end)"""
+    busy = defaultdict(list)
+    if not officer_ids:
+        return busy
+    existing = await db.dutyassignment.find_many(where={
+        "officerId": {"in": list(officer_ids)},
+        "startTime": {"lt": end},
+        "endTime": {"gt": start},
+    })
+    for duty in existing:
+        busy[duty.officerId].append((_aware(duty.startTime), _aware(duty.endTime)))
+    return busy
+
+
+def claim(busy: dict, officer_id: str, start: datetime, end: datetime) -> bool:
+    """Book [start, end) for the officer unless it overlaps something already booked"""
+    start, end = _aware(start), _aware(end)
+    if any(overlaps(start, end, other_start, other_end) for other_start, other_end in busy[officer_id]):
+        return False
+    busy[officer_id].append((start, end))
+    return True
+
+
+def queue_duties(batcher, duties):
+    """Queue the inserts for DutyAssignment objects and everything derived from them on a batch"""
+    if not duties:
+        return
+    batcher.dutyassignment.create_many(data=[duty.to_dict() for duty in duties])
+    for statement in reports.rollup_statements(reports.aggregate_duties(duties)):
+        batcher.execute_raw(*statement)
+    versions.bump(batcher, versions.DUTIES, *(versions.officer_duties(duty.officerId) for duty in duties))
+    sync.record_many(batcher, [(duty.officerId, sync.DUTY, duty.id) for duty in duties])
+
+
+def invalidate(duties):
+    """Drop cached analytics after a batch carrying queue_duties() committed"""
+    for officer_id, station_id in {(duty.officerId, duty.assignedBy) for duty in duties}:
+        analytics.invalidate(officer_id, station_id)
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+import os
+
+from services.cache import TTLCache
+
+ACTIVE_DUTY_CACHE_TTL_SECONDS = float(os.getenv("ACTIVE_DUTY_CACHE_TTL_SECONDS", "300"))
+
+# Duty rows for windows that have not closed yet. Check-ins and location pings
+# look the same duty up repeatedly during a shift; apart from status the row is
+# immutable, and status changes evict it.
+cache = TTLCache(ttl_seconds=ACTIVE_DUTY_CACHE_TTL_SECONDS, max_entries=20000)
+
+
+def is_active(duty, now: datetime = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    end = duty.endTime
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return end >= now
+
+
+async def get_duty(db, duty_id: str):
+    """Look a duty up by id, serving active duties from the in-process cache"""
+    duty = cache.get(duty_id)
+    if duty is not None:
+        return duty
+
+    duty = await db.dutyassignment.find_unique(where={"id": duty_id})
+    if duty is not None and is_active(duty):
+        cache.set(duty_id, duty, tags=[f"officer:{duty.officerId}"])
+    return duty
+
+
+def invalidate(*duty_ids: str):
+    for duty_id in duty_ids:
+        cache.pop(duty_id)
+
+
+def invalidate_officer(officer_id: str):
+    cache.invalidate(f"officer:{officer_id}")
@@ -0,0 +1,167 @@
+from time import monotonic, perf_counter
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+import httpx
+
+import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FACE_RECOG_SERVICE_URL = os.getenv("FACE_RECOG_SERVICE_URL")
+FACE_VERIFY_TIMEOUT_SECONDS = float(os.getenv("FACE_VERIFY_TIMEOUT_SECONDS", "3"))
+FACE_SERVICE_MAX_CONNECTIONS = int(os.getenv("FACE_SERVICE_MAX_CONNECTIONS", "50"))
+FACE_BREAKER_FAILURES = int(os.getenv("FACE_BREAKER_FAILURES", "5"))
+FACE_BREAKER_RESET_SECONDS = float(os.getenv("FACE_BREAKER_RESET_SECONDS", "30"))
+
+
+class FaceServiceUnavailable(Exception):
+    """The face service could not give an answer (timeout, 5xx or open circuit)"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls fail
+    fast; once `reset_timeout` has elapsed a single trial call is let through and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Face service circuit opened")
+            self.opened_at = monotonic()
+
+
+class FaceVerificationClient:
+    """Pooled async client for the face-recognition service's /verify endpoint"""
+
+    def __init__(self, base_url: str, timeout: float, max_connections: int, breaker: CircuitBreaker):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.breaker = breaker
+        self._client = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def verify(self, user_id: str, selfie_url: str) -> dict:
+        """
+        Ask the face service whether the selfie matches the user.
+
+        Returns {"verified": bool, "confidence": float, "reason": str | None}.
+        Raises FaceServiceUnavailable when no verdict could be obtained.
+        """
+        if not self.breaker.allow():
+            metrics.observe_face("verify", "circuit_open", 0.0)
+            raise FaceServiceUnavailable("Face service circuit is open")
+
+        started = perf_counter()
+        try:
+            response = await self._http().post(
+                "/verify",
+                json={"user_id": user_id, "selfie_url": selfie_url},
+                # Lets the face service shed the request instead of answering after we gave up
+                headers={"X-Request-Deadline-Ms": str(int(self.timeout * 1000))},
+            )
+        except asyncio.CancelledError:
+            self.breaker.trial_in_flight = False
+            metrics.observe_face("verify", "cancelled", perf_counter() - started)
+            raise
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            metrics.observe_face("verify", "error", perf_counter() - started)
+            raise FaceServiceUnavailable(f"Face service request failed: {str(e)}")
+
+        metrics.observe_face("verify", f"{response.status_code // 100}xx", perf_counter() - started)
+
+        if response.status_code == 429:
+            # Shed by admission control: the service is healthy but saturated, so the
+            # breaker is left alone and the check-in is retried like any other outage
+            self.breaker.trial_in_flight = False
+            raise FaceServiceUnavailable("Face service is saturated")
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise FaceServiceUnavailable(f"Face service returned {response.status_code}")
+
+        self.breaker.record_success()
+
+        if response.status_code >= 400:
+            # The service answered: the selfie has no face or the user is not enrolled
+            try:
+                detail = response.json().get("detail")
+            except ValueError:
+                detail = None
+            return {"verified": False, "confidence": 0.0, "reason": detail or f"HTTP {response.status_code}"}
+
+        body = response.json()
+        return {
+            "verified": bool(body.get("verified")),
+            "confidence": float(body.get("confidence", 0.0)),
+            "reason": None,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+face_client = FaceVerificationClient(
+    FACE_RECOG_SERVICE_URL,
+    timeout=FACE_VERIFY_TIMEOUT_SECONDS,
+    max_connections=FACE_SERVICE_MAX_CONNECTIONS,
+    breaker=CircuitBreaker(FACE_BREAKER_FAILURES, FACE_BREAKER_RESET_SECONDS),
+)
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+
+from models.model import DutyStatus, FaceStatus, NotificationType
+from services import duty_cache, notifications, reports, sync, versions
+from services.face_client import FaceServiceUnavailable, face_client
+
+logger = logging.getLogger(__name__)
+
+# How long a check-in waits for the face verdict before degrading to pending. The
+# request itself runs on to the client's FACE_VERIFY_TIMEOUT_SECONDS in the background.
+CHECKIN_FACE_WAIT_SECONDS = float(os.getenv("CHECKIN_FACE_WAIT_SECONDS", "2.5"))
+PENDING_RETRY_ATTEMPTS = int(os.getenv("FACE_PENDING_RETRY_ATTEMPTS", "4"))
+PENDING_RETRY_DELAY_SECONDS = float(os.getenv("FACE_PENDING_RETRY_DELAY_SECONDS", "5"))
+
+_background = set()
+
+
+def start(user_id: str, selfie_url: str):
+    """Start verification in the background so it overlaps the duty checks"""
+    if not face_client.enabled:
+        return None
+    return asyncio.create_task(face_client.verify(user_id, selfie_url))
+
+
+def cancel(task):
+    if task is not None and not task.done():
+        task.cancel()
+
+
+async def resolve(task, timeout: float = CHECKIN_FACE_WAIT_SECONDS) -> dict:
+    """
+    Wait a bounded time for a verification started with start().
+
+    Returns {"status": FaceStatus, "confidence": float | None, "reason": str | None};
+    a slow or unavailable face service yields FaceStatus.PENDING.
+    """
+    if task is None:
+        logger.warning("FACE_RECOG_SERVICE_URL is not set; skipping face verification")
+        return {"status": FaceStatus.VERIFIED, "confidence": None, "reason": None}
+
+    # Not wait_for: a request cancelled here would never reach the HTTP timeout, so
+    # slowness would never count toward the circuit breaker. complete_later() takes
+    # over the unfinished request instead.
+    done, _ = await asyncio.wait({task}, timeout=timeout)
+    if not done:
+        return {"status": FaceStatus.PENDING, "confidence": None, "reason": "Face service timed out"}
+    try:
+        result = task.result()
+    except FaceServiceUnavailable as e:
+        return {"status": FaceStatus.PENDING, "confidence": None, "reason": str(e)}
+
+    return {
+        "status": FaceStatus.VERIFIED if result["verified"] else FaceStatus.FAILED,
+        "confidence": result["confidence"],
+        "reason": result["reason"],
+    }
+
+
+async def reject(db, log, duty, reason: str = None):
+    """
+    Drop a pending check-in whose late verdict was FAILED, as if the synchronous
+    403 had been returned: the officer can check in again. The pending path
+    writes no rollups or position, so only the log and its sync entry are undone.
+    """
+    async with db.tx() as tx:
+        deleted = await tx.dutylog.delete_many(where={"id": log.id, "faceStatus": FaceStatus.PENDING.value})
+        if not deleted:
+            return
+        message = f"Face verification failed for your check-in at {duty.location}"
+        if reason:
+            message += f" ({reason})"
+        async with tx.batch_() as batcher:
+            sync.record(batcher, log.officerId, sync.LOG, log.id, deleted=True)
+            notifications.notify(batcher, [(log.officerId, f"{message}. Please check in again.", NotificationType.ALERT)])
+
+
+async def apply_result(db, log, duty, result: dict):
+    """Record a late verdict on a pending check-in and complete the duty if it matched"""
+    if not result["verified"]:
+        await reject(db, log, duty, result["reason"])
+        return
+
+    updated = await db.dutylog.update_many(
+        where={"id": log.id, "faceStatus": FaceStatus.PENDING.value},
+        data={
+            "faceStatus": FaceStatus.VERIFIED.value,
+            "faceVerified": True,
+            "faceConfidence": result["confidence"],
+            "updatedAt": datetime.now(timezone.utc),
+        },
+    )
+    if not updated:
+        return
+
+    completed = await db.dutyassignment.update_many(
+        where={"id": duty.id, "status": DutyStatus.PENDING.value},
+        data={"status": DutyStatus.COMPLETED.value},
+    )
+    if not completed:
+        await sync.record_now(db, log.officerId, [(sync.LOG, log.id, False)])
+        return
+
+    duty_cache.invalidate(duty.id)
+    async with db.batch_() as batcher:
+        versions.bump(batcher, versions.DUTIES, versions.officer_duties(duty.officerId))
+        sync.record(batcher, log.officerId, sync.LOG, log.id)
+        sync.record(batcher, duty.officerId, sync.DUTY, duty.id)
+    await reports.record_duty_completed(db, duty, checkin_time=log.checkinTime, distance=log.distance)
+
+
+async def _complete(db, log, duty, task=None):
+    if task is not None:
+        # The check-in's own request: let it finish or time out rather than send another
+        try:
+            await apply_result(db, log, duty, await task)
+            return
+        except FaceServiceUnavailable as e:
+            logger.info(f"Face verification for check-in {log.id} still pending: {str(e)}")
+    delay = PENDING_RETRY_DELAY_SECONDS
+    for _ in range(PENDING_RETRY_ATTEMPTS):
+        try:
+            result = await face_client.verify(log.officerId, log.selfiePath)
+        except FaceServiceUnavailable as e:
+            logger.info(f"Face verification for check-in {log.id} still pending: {str(e)}")
+            await asyncio.sleep(delay)
+            delay *= 2
+            continue
+        await apply_result(db, log, duty, result)
+        return
+    # Left PENDING; the periodic sweep picks it up once the service recovers
+
+
+async def complete_later(db, log, duty, pending=None):
+    """
+    Schedule background completion of a check-in recorded while the face service
+    was unavailable, starting from `pending`, the check-in's unfinished verification
+    """
+    async def runner():
+        try:
+            await _complete(db, log, duty, pending)
+        except Exception as e:
+            logger.error(f"Background face verification for check-in {log.id} failed: {str(e)}")
+
+    task = asyncio.create_task(runner())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def retry_pending(db, older_than_seconds: float = 60, batch_size: int = 50) -> int:
+    """Re-verify check-ins that are still pending (e.g. after a restart or a long outage)"""
+    if not face_client.enabled or face_client.breaker.state == "open":
+        return 0
+
+    # By check-in time: location pings keep bumping updatedAt on the same log
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+    logs = await db.dutylog.find_many(
+        where={"faceStatus": FaceStatus.PENDING.value, "checkinTime": {"lt": cutoff}},
+        order={"checkinTime": "asc"},
+        include={"duty": True},
+        take=batch_size,
+    )
+
+    async def verify(log):
+        try:
+            result = await face_client.verify(log.officerId, log.selfiePath)
+        except FaceServiceUnavailable:
+            return 0
+        await apply_result(db, log, log.duty, result)
+        return 1
+
+    return sum(await asyncio.gather(*(verify(log) for log in logs if log.duty)))
+
+
+async def run_pending_sweeper(db, interval_seconds: float):
+    """Background loop that retries pending face verifications"""
+    while True:
+        try:
+            resolved = await retry_pending(db)
+            if resolved:
+                logger.info(f"Resolved {resolved} pending face verifications")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Pending face verification sweep failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
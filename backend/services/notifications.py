@@ -0,0 +1,105 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+import base64
+import binascii
+
+from models import serializers
+from models.model import generate_id
+
+# User.unreadNotifications is a denormalized count of the user's unread
+# Notification rows. Every write that creates or reads notifications changes the
+# counter in the same transaction, so the badge comes from the User row the auth
+# dependency already loads instead of a count() on every app open.
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Recipients per batch when fanning a notification out
+FAN_OUT_CHUNK_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row) -> str:
+    raw = f"{row.createdAt.isoformat()}|{row.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Malformed notifications cursor")
+
+
+async def list_page(db, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+                    unread_only: bool = False) -> dict:
+    """
+    One page of a user's inbox, newest first. Pages are keyed on (createdAt, id)
+    rather than an offset, so each one is an index range scan and rows arriving
+    while the user scrolls neither shift nor repeat entries.
+    """
+    where = {"userId": user_id}
+    if unread_only:
+        where["read"] = False
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        where["OR"] = [
+            {"createdAt": {"lt": created_at}},
+            {"createdAt": created_at, "id": {"lt": row_id}},
+        ]
+
+    rows = await db.notification.find_many(
+        where=where, order=[{"createdAt": "desc"}, {"id": "desc"}], take=limit + 1
+    )
+    page = rows[:limit]
+    return {
+        "notifications": serializers.notification_rows(page),
+        "nextCursor": encode_cursor(page[-1]) if len(rows) > limit else None,
+    }
+
+
+def notify(batcher, notifications):
+    """Queue [(user_id, message, type)] notifications and the matching counter bumps on a batch"""
+    if not notifications:
+        return
+    batcher.notification.create_many(data=[
+        {"id": generate_id(), "userId": user_id, "message": message, "type": getattr(kind, "value", kind)}
+        for user_id, message, kind in notifications
+    ])
+    # One counter update per distinct increment instead of one per recipient
+    recipients = defaultdict(list)
+    for user_id, count in Counter(user_id for user_id, _, _ in notifications).items():
+        recipients[count].append(user_id)
+    for count, user_ids in recipients.items():
+        batcher.user.update_many(
+            where={"id": {"in": user_ids}}, data={"unreadNotifications": {"increment": count}}
+        )
+
+
+async def fan_out(db, user_ids, message: str, kind) -> int:
+    """Send one notification to every user in `user_ids`, FAN_OUT_CHUNK_SIZE recipients per round trip"""
+    for offset in range(0, len(user_ids), FAN_OUT_CHUNK_SIZE):
+        chunk = user_ids[offset:offset + FAN_OUT_CHUNK_SIZE]
+        async with db.batch_() as batcher:
+            notify(batcher, [(user_id, message, kind) for user_id in chunk])
+    return len(user_ids)
+
+
+async def mark_read(db, user_id: str, ids=None) -> int:
+    """
+    Mark the given notifications (or the whole inbox) read and return how many
+    changed. The counter is decremented by update_many's own row count inside
+    the same transaction, so overlapping calls never subtract a row twice.
+    """
+    where = {"userId": user_id, "read": False}
+    if ids is not None:
+        where["id"] = {"in": ids}
+    async with db.tx() as tx:
+        changed = await tx.notification.update_many(where=where, data={"read": True})
+        if changed:
+            await tx.user.update(where={"id": user_id}, data={"unreadNotifications": {"decrement": changed}})
+    return changed
@@ -0,0 +1,175 @@
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+import asyncio
+import logging
+import os
+
+from prisma.errors import UniqueViolationError
+
+from models.model import DutyAssignment
+from services import duties as duty_writes
+
+logger = logging.getLogger(__name__)
+
+# A PatrolTemplate is a recurring beat: a geofence, a local time-of-day window,
+# the weekdays it runs on and an officer rotation. It is expanded lazily into
+# ordinary DutyAssignment rows for the next PATROL_HORIZON_DAYS, so check-ins,
+# reports and sync treat the result like any other duty. Each expansion writes
+# its duties, rollups, version bumps and sync entries in one batch together with
+# the template's generatedUntil mark, so a day is expanded exactly once.
+
+PATROL_HORIZON_DAYS = int(os.getenv("PATROL_HORIZON_DAYS", "30"))
+MAX_HORIZON_DAYS = 366
+
+def to_day(value: datetime) -> date:
+    """The local calendar day stored as UTC midnight in a DateTime column"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).date()
+
+
+def from_day(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def today(template, now: datetime = None) -> date:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(ZoneInfo(template.timezone)).date()
+
+
+def runs_on(template, day: date) -> bool:
+    return not template.weekdays or day.weekday() in template.weekdays
+
+
+def occurrence_index(template, day: date) -> int:
+    """How many shifts the template has run from its start date up to, not including, `day`"""
+    start = to_day(template.startDate)
+    full_weeks, rest = divmod((day - start).days, 7)
+    per_week = len(set(template.weekdays)) if template.weekdays else 7
+    return full_weeks * per_week + sum(1 for i in range(rest) if runs_on(template, start + timedelta(days=i)))
+
+
+def rotation(template, index: int) -> list:
+    """Officers on shift for the template's `index`th occurrence"""
+    officers = template.officerIds
+    first = index * template.officersPerShift
+    return [officers[(first + i) % len(officers)] for i in range(template.officersPerShift)]
+
+
+def shift_window(template, day: date):
+    local = datetime.combine(day, time(), tzinfo=ZoneInfo(template.timezone))
+    start = (local + timedelta(minutes=template.startMinute)).astimezone(timezone.utc)
+    return start, start + timedelta(minutes=template.durationMinutes)
+
+
+def occurrences(template, first: date, last: date, now: datetime):
+    """(officerId, startTime, endTime) for every shift on local days in [first, last) that has not ended"""
+    index = occurrence_index(template, first)
+    day = first
+    while day < last:
+        if runs_on(template, day):
+            start, end = shift_window(template, day)
+            if end > now:
+                for officer_id in rotation(template, index):
+                    yield officer_id, start, end
+            index += 1
+        day += timedelta(days=1)
+
+
+async def expand(db, template, until: date, now: datetime = None) -> dict:
+    """
+    Expand the template's shifts on local days before `until` into duties.
+
+    Days already expanded and shifts that have ended are skipped. A shift that
+    overlaps one of the officer's existing duties is not created and is
+    reported in `conflicts` instead, as is one for an officer who no longer
+    exists. Existing duties are loaded with one query for the whole range.
+    """
+    now = now or datetime.now(timezone.utc)
+    first = max(to_day(template.generatedUntil or template.startDate), today(template, now))
+    last = until
+    finished = False
+    if template.endDate is not None and to_day(template.endDate) + timedelta(days=1) <= last:
+        last, finished = to_day(template.endDate) + timedelta(days=1), True
+    if first >= last:
+        if finished:
+            # Nothing left to expand before the end date
+            await db.patroltemplate.update(where={"id": template.id}, data={"active": False})
+        return {"created": 0, "conflicts": [], "generatedUntil": to_day(template.generatedUntil or template.startDate)}
+
+    candidates = list(occurrences(template, first, last, now))
+    duties, conflicts = [], []
+    if candidates:
+        officer_ids = list({officer_id for officer_id, _, _ in candidates})
+        known = {
+            user.id for user in await db.user.find_many(where={"id": {"in": officer_ids}, "role": "OFFICER"})
+        }
+        busy = await duty_writes.busy_intervals(
+            db, known, min(start for _, start, _ in candidates), max(end for _, _, end in candidates)
+        )
+        for officer_id, start, end in candidates:
+            if officer_id not in known:
+                conflicts.append({"officerId": officer_id, "startTime": start, "detail": "Officer not found"})
+                continue
+            if not duty_writes.claim(busy, officer_id, start, end):
+                conflicts.append({"officerId": officer_id, "startTime": start, "detail": duty_writes.OVERLAP_DETAIL})
+                continue
+            duties.append(DutyAssignment(
+                officerId=officer_id,
+                assignedBy=template.createdBy,
+                location=template.location,
+                latitude=template.latitude,
+                longitude=template.longitude,
+                radius=template.radius,
+                startTime=start,
+                endTime=end,
+                templateId=template.id,
+            ))
+
+    progress = {"generatedUntil": from_day(last)}
+    if finished:
+        progress["active"] = False
+    try:
+        async with db.batch_() as batcher:
+            duty_writes.queue_duties(batcher, duties)
+            batcher.patroltemplate.update(where={"id": template.id}, data=progress)
+    except UniqueViolationError:
+        # Another worker expanded the same days first; its batch carried everything
+        logger.info(f"Patrol template {template.id} was already expanded")
+        return {"created": 0, "conflicts": [], "generatedUntil": last}
+
+    duty_writes.invalidate(duties)
+    return {"created": len(duties), "conflicts": conflicts, "generatedUntil": last}
+
+
+async def extend_all(db, now: datetime = None) -> int:
+    """Expand every active template up to its rolling horizon; returns the number of duties created"""
+    now = now or datetime.now(timezone.utc)
+    # Templates run in local time, so allow a day either side of the UTC horizon
+    horizon = from_day(now.date() + timedelta(days=PATROL_HORIZON_DAYS + 1))
+    templates = await db.patroltemplate.find_many(where={
+        "active": True,
+        "OR": [{"generatedUntil": None}, {"generatedUntil": {"lt": horizon}}],
+    })
+    created = 0
+    for template in templates:
+        try:
+            result = await expand(db, template, today(template, now) + timedelta(days=PATROL_HORIZON_DAYS), now)
+            created += result["created"]
+        except Exception as e:
+            logger.error(f"Failed to expand patrol template {template.id}: {str(e)}")
+    return created
+
+
+async def run_patrol_generator(db, interval_seconds: float):
+    """Background loop that keeps every active template expanded PATROL_HORIZON_DAYS ahead"""
+    while True:
+        try:
+            created = await extend_all(db)
+            if created:
+                logger.info(f"Created {created} duties from patrol templates")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Patrol generation failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,288 @@
+from datetime import datetime, timedelta, timezone
+from math import cos, floor, radians
+from time import perf_counter
+import asyncio
+import heapq
+import logging
+import os
+
+from models.model import DutyStatus
+from services.assignment import EARTH_RADIUS_METERS, distance_matrix
+
+logger = logging.getLogger(__name__)
+
+# An officer's last reported position lives on the User row (lastLatitude,
+# lastLongitude, lastSeenAt). It is written in the same batch as the check-in
+# or location ping that reported it, so it costs no extra round trip there.
+#
+# Each worker also keeps those positions in a grid of POSITION_CELL_DEGREES
+# cells for nearest-officer queries. Pings the worker serves update it at once;
+# pings served by other workers arrive through a periodic delta refresh of the
+# users seen since the last one.
+#
+# Pings on the read-only per-duty location endpoint are not worth a round trip
+# of their own: record_later() updates the index at once and leaves the row
+# write to the same loop, which persists each officer's latest one in a batch.
+
+POSITION_CELL_DEGREES = float(os.getenv("POSITION_CELL_DEGREES", "0.01"))  # About 1.1 km
+# Duties that start or end are picked up by the nearest-officer query within this long
+ON_DUTY_REFRESH_SECONDS = float(os.getenv("ON_DUTY_REFRESH_SECONDS", "15"))
+MAX_NEAREST_OFFICERS = int(os.getenv("MAX_NEAREST_OFFICERS", "50"))
+# Commits can land out of lastSeenAt order; re-read this far behind the watermark
+WATERMARK_SKEW_SECONDS = 5
+
+_METERS_PER_DEGREE = radians(1) * EARTH_RADIUS_METERS
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def record(batcher, user_id: str, latitude: float, longitude: float, seen_at: datetime):
+    """Queue a position update on the batch that performs the write"""
+    batcher.user.update(
+        where={"id": user_id},
+        data={"lastLatitude": latitude, "lastLongitude": longitude, "lastSeenAt": seen_at},
+    )
+    # The officer was there whether or not the rest of the batch commits
+    index.update(user_id, latitude, longitude, seen_at)
+
+
+_pending = {}  # userId -> (latitude, longitude, seenAt) not written yet
+
+
+def record_later(user_id: str, latitude: float, longitude: float, seen_at: datetime):
+    """Update the index now and queue the row write for the next flush"""
+    seen_at = _aware(seen_at)
+    index.update(user_id, latitude, longitude, seen_at)
+    current = _pending.get(user_id)
+    if current is None or current[2] <= seen_at:
+        _pending[user_id] = (latitude, longitude, seen_at)
+
+
+async def flush_pending(db) -> int:
+    """Write the queued positions in one batch, skipping rows that already hold a newer one"""
+    if not _pending:
+        return 0
+    pending = dict(_pending)
+    _pending.clear()
+    try:
+        async with db.batch_() as batcher:
+            for user_id, (latitude, longitude, seen_at) in pending.items():
+                # update_many: an officer deleted meanwhile must not fail the whole batch
+                batcher.user.update_many(
+                    where={"id": user_id, "OR": [{"lastSeenAt": None}, {"lastSeenAt": {"lt": seen_at}}]},
+                    data={"lastLatitude": latitude, "lastLongitude": longitude, "lastSeenAt": seen_at},
+                )
+    except Exception:
+        for user_id, position in pending.items():
+            current = _pending.get(user_id)
+            if current is None or current[2] < position[2]:
+                _pending[user_id] = position
+        raise
+    return len(pending)
+
+
+def _cell(latitude: float, longitude: float):
+    return floor(latitude / POSITION_CELL_DEGREES), floor(longitude / POSITION_CELL_DEGREES)
+
+
+def _ring(row: int, col: int, radius: int):
+    """Cells at Chebyshev distance `radius` from (row, col)"""
+    if radius == 0:
+        yield row, col
+        return
+    for c in range(col - radius, col + radius + 1):
+        yield row - radius, c
+        yield row + radius, c
+    for r in range(row - radius + 1, row + radius):
+        yield r, col - radius
+        yield r, col + radius
+
+
+class OfficerIndex:
+    """Latest officer positions bucketed into a lat/lon grid for k-nearest queries"""
+
+    def __init__(self):
+        self.positions = {}  # userId -> (latitude, longitude, seenAt)
+        self.cells = {}  # (row, col) -> {userId}
+        self.watermark = None
+        self.ready = False
+        self._lock = asyncio.Lock()
+        self._on_duty = {}
+        self._on_duty_at = None
+
+    def update(self, user_id: str, latitude: float, longitude: float, seen_at: datetime):
+        seen_at = _aware(seen_at)
+        current = self.positions.get(user_id)
+        if current is not None:
+            if current[2] > seen_at:
+                return
+            old = _cell(current[0], current[1])
+            if old != _cell(latitude, longitude):
+                self.cells[old].discard(user_id)
+                if not self.cells[old]:
+                    del self.cells[old]
+        self.positions[user_id] = (latitude, longitude, seen_at)
+        self.cells.setdefault(_cell(latitude, longitude), set()).add(user_id)
+
+    def remove(self, user_id: str):
+        current = self.positions.pop(user_id, None)
+        if current is not None:
+            cell = _cell(current[0], current[1])
+            self.cells[cell].discard(user_id)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def _apply(self, users):
+        for user in users:
+            if user.lastLatitude is not None and user.lastLongitude is not None and user.lastSeenAt is not None:
+                self.update(user.id, user.lastLatitude, user.lastLongitude, user.lastSeenAt)
+                if self.watermark is None or _aware(user.lastSeenAt) > self.watermark:
+                    self.watermark = _aware(user.lastSeenAt)
+
+    async def load(self, db):
+        """Seed the index from every user's last position"""
+        self._apply(await db.user.find_many(where={"lastSeenAt": {"not": None}}))
+        self.ready = True
+
+    async def refresh(self, db):
+        """Pick up positions other workers recorded since the last refresh"""
+        if self.watermark is None:
+            return await self.load(db)
+        since = self.watermark - timedelta(seconds=WATERMARK_SKEW_SECONDS)
+        self._apply(await db.user.find_many(where={"lastSeenAt": {"gte": since}}))
+
+    async def ensure_ready(self, db):
+        if not self.ready:
+            async with self._lock:
+                if not self.ready:
+                    await self.load(db)
+
+    async def on_duty(self, db, now: datetime = None) -> dict:
+        """officerId -> the duty whose window contains `now`, refreshed every ON_DUTY_REFRESH_SECONDS"""
+        now = now or datetime.now(timezone.utc)
+        if self._on_duty_at is None or (now - self._on_duty_at).total_seconds() > ON_DUTY_REFRESH_SECONDS:
+            async with self._lock:
+                if self._on_duty_at is None or (now - self._on_duty_at).total_seconds() > ON_DUTY_REFRESH_SECONDS:
+                    duties = await db.dutyassignment.find_many(where={
+                        "status": {"in": [DutyStatus.PENDING.value, DutyStatus.COMPLETED.value]},
+                        "startTime": {"lte": now},
+                        "endTime": {"gte": now},
+                    })
+                    self._on_duty = {duty.officerId: duty for duty in duties}
+                    self._on_duty_at = now
+        return self._on_duty
+
+    def _lower_bound(self, latitude: float, radius: int) -> float:
+        """Metres that any point in ring `radius` around the query's cell is at least away"""
+        if radius <= 1:
+            return 0.0
+        # A degree of longitude is the shorter one; take it at the ring's most poleward latitude
+        widest = min(89.0, abs(latitude) + radius * POSITION_CELL_DEGREES)
+        return (radius - 1) * POSITION_CELL_DEGREES * _METERS_PER_DEGREE * cos(radians(widest))
+
+    def nearest(self, latitude: float, longitude: float, k: int, accept=None, max_distance: float = None):
+        """
+        Up to `k` (distance, userId) pairs nearest to the point, nearest first,
+        among officers `accept(user_id)` allows. Rings of cells are searched
+        outwards until the k-th distance is below what any further ring could hold.
+        """
+        row, col = _cell(latitude, longitude)
+        best = []  # max-heap of (-distance, userId), at most k entries
+        visited = 0
+        radius = 0
+        while visited < len(self.positions):
+            bound = self._lower_bound(latitude, radius)
+            if len(best) >= k and -best[0][0] <= bound:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+            if 8 * radius > len(self.cells):
+                # Sparser than the ring: finish with every occupied cell not searched yet
+                cells = [cell for cell in self.cells if max(abs(cell[0] - row), abs(cell[1] - col)) >= radius]
+                radius = None
+            else:
+                cells = _ring(row, col, radius)
+                radius += 1
+
+            candidates = []
+            for cell in cells:
+                members = self.cells.get(cell)
+                if members:
+                    visited += len(members)
+                    candidates.extend(user_id for user_id in members if accept is None or accept(user_id))
+            if candidates:
+                points = [self.positions[user_id] for user_id in candidates]
+                distances = distance_matrix(
+                    [latitude], [longitude], [p[0] for p in points], [p[1] for p in points]
+                )[0]
+                for user_id, meters in zip(candidates, distances.tolist()):
+                    if max_distance is not None and meters > max_distance:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-meters, user_id))
+                    elif meters < -best[0][0]:
+                        heapq.heapreplace(best, (-meters, user_id))
+            if radius is None:
+                break
+        return sorted((-negative, user_id) for negative, user_id in best)
+
+    def stats(self) -> dict:
+        return {
+            "officers": len(self.positions),
+            "cells": len(self.cells),
+            "watermark": self.watermark,
+            "onDuty": len(self._on_duty),
+        }
+
+
+index = OfficerIndex()
+
+
+async def nearest_on_duty(db, latitude: float, longitude: float, k: int, max_distance: float = None) -> dict:
+    """The `k` officers on duty right now whose last reported position is nearest the point"""
+    if k < 1 or k > MAX_NEAREST_OFFICERS:
+        raise ValueError(f"k must be between 1 and {MAX_NEAREST_OFFICERS}")
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError("Invalid coordinates")
+
+    await index.ensure_ready(db)
+    on_duty = await index.on_duty(db)
+    started = perf_counter()
+    found = index.nearest(latitude, longitude, k, on_duty.__contains__, max_distance)
+    searched = perf_counter()
+
+    officers = []
+    for meters, user_id in found:
+        position, duty = index.positions[user_id], on_duty[user_id]
+        duty_status = duty.status.value if isinstance(duty.status, DutyStatus) else str(duty.status)
+        officers.append({
+            "officerId": user_id,
+            "latitude": position[0],
+            "longitude": position[1],
+            "lastSeenAt": position[2],
+            "distance": round(meters, 2),
+            "dutyId": duty.id,
+            "dutyLocation": duty.location,
+            "checkedIn": duty_status == DutyStatus.COMPLETED.value,
+        })
+    return {
+        "officers": officers,
+        "onDuty": len(on_duty),
+        "indexed": len(index.positions),
+        "searchMs": round((searched - started) * 1000, 3),
+    }
+
+
+async def run_position_refresh(db, interval_seconds: float):
+    """Background loop writing queued positions and picking up pings other workers served"""
+    while True:
+        try:
+            await flush_pending(db)
+            await index.refresh(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Position refresh failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
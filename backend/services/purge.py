@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+
+from services import analytics, duty_cache, positions, versions
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "50"))
+# Most rows of one table a purge transaction deletes; a busy officer has thousands of pings
+PURGE_ROW_BATCH = int(os.getenv("PURGE_ROW_BATCH", "1000"))
+# Pause between chunks so check-ins get the connection pool in between
+PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.05"))
+
+
+# (model, column referencing the user, primary key) for every table holding a
+# user's data, children first
+USER_DATA = (
+    ("notification", "userId", "id"),
+    ("dutyreport", "officerId", "id"),
+    ("analyticsrollup", "officerId", "id"),
+    ("syncchange", "officerId", "seq"),
+    ("dutylog", "officerId", "id"),
+    ("dutyassignment", "officerId", "id"),
+    ("faceembedding", "userId", "id"),
+    ("enrollmentjob", "userId", "id"),
+    ("patroltemplate", "createdBy", "id"),
+)
+# Deleting these changes what the duty lists return
+DUTY_MODELS = ("dutylog", "dutyassignment")
+
+
+def delete_users(batcher, user_ids):
+    """Queue the deletion of users and everything that references them, children first"""
+    ids = {"in": list(user_ids)}
+    for model, column, _ in USER_DATA:
+        getattr(batcher, model).delete_many(where={column: ids})
+    batcher.user.delete_many(where={"id": ids})
+    versions.bump(batcher, versions.USERS, versions.DUTIES, *(versions.officer_duties(i) for i in user_ids))
+
+
+def _forget(user_ids):
+    for user_id in user_ids:
+        duty_cache.invalidate_officer(user_id)
+        positions.index.remove(user_id)
+    analytics.cache.clear()
+
+
+async def delete_user(db, user_id: str):
+    """Delete one user and their data in a single transaction"""
+    async with db.batch_() as batcher:
+        delete_users(batcher, [user_id])
+    _forget([user_id])
+
+
+async def delete_user_data(db, user_ids, row_batch: int = PURGE_ROW_BATCH):
+    """Delete the users' rows table by table, at most `row_batch` rows per transaction"""
+    ids = {"in": list(user_ids)}
+    for model, column, key in USER_DATA:
+        while True:
+            rows = await getattr(db, model).find_many(where={column: ids}, take=row_batch, order={key: "asc"})
+            if not rows:
+                break
+            keys = [getattr(row, key) for row in rows]
+            async with db.batch_() as batcher:
+                getattr(batcher, model).delete_many(where={key: {"in": keys}})
+                if model in DUTY_MODELS:
+                    versions.bump(batcher, versions.DUTIES, *(versions.officer_duties(i) for i in user_ids))
+            if model == "dutyassignment":
+                duty_cache.invalidate(*keys)
+            await asyncio.sleep(PURGE_PAUSE_SECONDS)
+
+
+async def purge_users(db, chunk_size: int = PURGE_CHUNK_SIZE, progress: dict = None,
+                      row_batch: int = PURGE_ROW_BATCH) -> int:
+    """
+    Delete every user in chunks of `chunk_size`.
+
+    Officers go first so that, by the time admins are deleted, no duty still
+    references them. A chunk's data is deleted in transactions of at most
+    `row_batch` rows of one table, so no transaction grows with how much
+    history the users have; the users themselves go last, together with
+    anything written for them in the meantime. A failure leaves earlier
+    chunks deleted and later ones intact.
+    """
+    deleted = 0
+    for role in ("OFFICER", "ADMIN"):
+        while True:
+            users = await db.user.find_many(where={"role": role}, take=chunk_size, order={"id": "asc"})
+            if not users:
+                break
+            user_ids = [user.id for user in users]
+            await delete_user_data(db, user_ids, row_batch)
+            async with db.batch_() as batcher:
+                delete_users(batcher, user_ids)
+            _forget(user_ids)
+            deleted += len(user_ids)
+            if progress is not None:
+                progress["deleted"] = deleted
+            await asyncio.sleep(PURGE_PAUSE_SECONDS)
+    return deleted
+
+
+async def run_purge(db, state: dict, chunk_size: int):
+    """Background job wrapper that records progress and outcome in `state`"""
+    state.update(
+        status="running", deleted=0, total=await db.user.count(), error=None,
+        startedAt=datetime.now(timezone.utc).isoformat(), finishedAt=None,
+    )
+    try:
+        deleted = await purge_users(db, chunk_size, progress=state)
+        state.update(status="completed", deleted=deleted)
+        logger.info(f"Purged {deleted} users and related data")
+    except Exception as e:
+        logger.error(f"User purge failed: {str(e)}")
+        state.update(status="failed", error=str(e))
+    finally:
+        state["finishedAt"] = datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,287 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import uuid
+
+from models.model import DutyStatus, FaceStatus, NotificationType
+from services import analytics, duty_cache, notifications, sync, versions
+
+logger = logging.getLogger(__name__)
+
+# Single-statement, atomic increment of a DutyReport row. The compliance rate is
+# recomputed from the post-increment counters so concurrent writers never leave
+# a stale rate behind.
+ROLLUP_UPSERT_SQL = """
+INSERT INTO "DutyReport" ("id", "officerId", "date", "totalAssigned", "completed", "missed", "complianceRate")
+VALUES ($1, $2, $3::timestamp(3), $4::int, $5::int, $6::int,
+        CASE WHEN $4::int > 0 THEN $5::float8 / $4::int ELSE 0 END)
+ON CONFLICT ("officerId", "date") DO UPDATE SET
+    "totalAssigned" = "DutyReport"."totalAssigned" + EXCLUDED."totalAssigned",
+    "completed" = "DutyReport"."completed" + EXCLUDED."completed",
+    "missed" = "DutyReport"."missed" + EXCLUDED."missed",
+    "complianceRate" = CASE
+        WHEN "DutyReport"."totalAssigned" + EXCLUDED."totalAssigned" > 0
+        THEN ("DutyReport"."completed" + EXCLUDED."completed")::float8
+             / ("DutyReport"."totalAssigned" + EXCLUDED."totalAssigned")
+        ELSE 0
+    END
+"""
+
+# Conditional flip that reports which rows it changed, so overlapping sweeps
+# never count, notify or roll up the same duty twice
+MARK_MISSED_SQL = """
+UPDATE "DutyAssignment" SET "status" = 'MISSED'
+WHERE "id" = ANY($1::text[]) AND "status" = 'PENDING'
+RETURNING "id"
+"""
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def day_bucket(value: datetime) -> datetime:
+    """Truncate a timestamp to the UTC day used as the rollup key"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_statement(officer_id: str, day: datetime, assigned: int = 0, completed: int = 0, missed: int = 0):
+    """Build the (sql, *args) tuple that adds the given deltas to one rollup row"""
+    return (
+        ROLLUP_UPSERT_SQL,
+        uuid.uuid4().hex,
+        officer_id,
+        day_bucket(day).replace(tzinfo=None).isoformat(),
+        assigned,
+        completed,
+        missed,
+    )
+
+
+def duty_key(duty):
+    """Rollup key for a duty: (officer, station, day). The station is the assigning SHO."""
+    return duty.officerId, duty.assignedBy, day_bucket(duty.startTime)
+
+
+def checkin_latency(duty, checkin_time: datetime) -> float:
+    start = duty.startTime
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if checkin_time.tzinfo is None:
+        checkin_time = checkin_time.replace(tzinfo=timezone.utc)
+    return (checkin_time - start).total_seconds()
+
+
+def rollup_statements(deltas: dict) -> list:
+    """
+    Turn {(officerId, stationId, day): AnalyticsDelta} into the statements that
+    update both the per-officer DutyReport rows and the per-station analytics rows.
+    """
+    report_deltas = defaultdict(lambda: [0, 0, 0])
+    statements = []
+    for (officer_id, station_id, day), delta in deltas.items():
+        counters = report_deltas[(officer_id, day)]
+        counters[0] += delta.assigned
+        counters[1] += delta.completed
+        counters[2] += delta.missed
+        statements.append(analytics.rollup_statement(officer_id, station_id, day, delta))
+
+    for (officer_id, day), (assigned, completed, missed) in report_deltas.items():
+        if assigned or completed or missed:
+            statements.append(rollup_statement(officer_id, day, assigned, completed, missed))
+    return statements
+
+
+async def apply_rollups(db, deltas: dict):
+    """Apply rollup deltas to DutyReport and AnalyticsRollup in one batch"""
+    if not deltas:
+        return
+    async with db.batch_() as batcher:
+        for statement in rollup_statements(deltas):
+            batcher.execute_raw(*statement)
+    for officer_id, station_id, _ in deltas:
+        analytics.invalidate(officer_id, station_id)
+
+
+def duty_statements(duty, assigned=0, completed=0, missed=0, checkin_time=None, distance=None) -> list:
+    """Rollup statements for a single duty event, for callers that batch them with their own writes"""
+    delta = analytics.AnalyticsDelta()
+    delta.assigned = assigned
+    delta.completed = completed
+    delta.missed = missed
+    if checkin_time is not None:
+        delta.add_checkin(checkin_latency(duty, checkin_time), distance)
+    return rollup_statements({duty_key(duty): delta})
+
+
+def invalidate(duty):
+    """Drop cached analytics after a batch carrying duty_statements() committed"""
+    analytics.invalidate(duty.officerId, duty.assignedBy)
+
+
+async def _record(db, duty, **counters):
+    try:
+        async with db.batch_() as batcher:
+            for statement in duty_statements(duty, **counters):
+                batcher.execute_raw(*statement)
+        invalidate(duty)
+    except Exception as e:
+        # The rollup is derived data; a rebuild repairs it, so never fail the write path
+        logger.error(f"Failed to update duty report for duty {duty.id}: {str(e)}")
+
+
+async def record_duty_completed(db, duty, checkin_time: datetime = None, distance: float = None):
+    await _record(db, duty, completed=1, checkin_time=checkin_time, distance=distance)
+
+
+def aggregate_duties(duties, deltas: dict = None) -> dict:
+    """Fold a chunk of DutyAssignment rows into rollup deltas"""
+    deltas = deltas if deltas is not None else defaultdict(analytics.AnalyticsDelta)
+    for duty in duties:
+        delta = deltas[duty_key(duty)]
+        delta.assigned += 1
+        status = duty.status.value if isinstance(duty.status, DutyStatus) else str(duty.status)
+        if status == DutyStatus.COMPLETED.value:
+            delta.completed += 1
+        elif status == DutyStatus.MISSED.value:
+            delta.missed += 1
+    return deltas
+
+
+def aggregate_checkins(logs, deltas: dict = None) -> dict:
+    """Fold a chunk of check-in DutyLog rows (with their duty included) into rollup deltas"""
+    deltas = deltas if deltas is not None else defaultdict(analytics.AnalyticsDelta)
+    for log in logs:
+        if log.duty is None:
+            continue
+        deltas[duty_key(log.duty)].add_checkin(checkin_latency(log.duty, log.checkinTime), log.distance)
+    return deltas
+
+
+async def mark_missed_duties(db, now: datetime = None, batch_size: int = 500) -> int:
+    """Flip PENDING duties whose window has closed to MISSED and count them in the rollups"""
+    now = now or datetime.now(timezone.utc)
+    total = 0
+    while True:
+        expired = await db.dutyassignment.find_many(
+            where={
+                "status": DutyStatus.PENDING.value,
+                "endTime": {"lt": now},
+                # A check-in awaiting its face verdict is settled by the verification sweep
+                "logs": {"none": {"faceStatus": FaceStatus.PENDING.value}},
+            },
+            take=batch_size,
+        )
+        if not expired:
+            return total
+
+        # Only the rows this statement flips are counted: a concurrent sweep on
+        # another worker, or a late check-in, gets the rest
+        deltas = defaultdict(analytics.AnalyticsDelta)
+        async with db.tx() as tx:
+            rows = await tx.query_raw(MARK_MISSED_SQL, [duty.id for duty in expired])
+            flipped_ids = {row["id"] for row in rows}
+            flipped = [duty for duty in expired if duty.id in flipped_ids]
+            if flipped:
+                async with tx.batch_() as batcher:
+                    versions.bump(batcher, versions.DUTIES, *(versions.officer_duties(duty.officerId) for duty in flipped))
+                    for duty in flipped:
+                        sync.record(batcher, duty.officerId, sync.DUTY, duty.id)
+                        deltas[duty_key(duty)].missed += 1
+                    notifications.notify(batcher, [
+                        (duty.officerId, f"Missed duty at {duty.location}", NotificationType.MISSED_DUTY)
+                        for duty in flipped
+                    ])
+                    for statement in rollup_statements(deltas):
+                        batcher.execute_raw(*statement)
+
+        duty_cache.invalidate(*(duty.id for duty in flipped))
+        for officer_id, station_id, _ in deltas:
+            analytics.invalidate(officer_id, station_id)
+
+        total += len(flipped)
+        if len(expired) < batch_size:
+            return total
+
+
+async def run_missed_duty_sweeper(db, interval_seconds: float):
+    """Background loop that periodically marks expired duties as missed"""
+    while True:
+        try:
+            missed = await mark_missed_duties(db)
+            if missed:
+                logger.info(f"Marked {missed} duties as missed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Missed duty sweep failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+
+async def _stream(find_many, chunk_size: int, **query):
+    """Yield successive chunks of rows using id-ordered cursor pagination"""
+    cursor = None
+    while True:
+        page = {"take": chunk_size, "order": {"id": "asc"}, **query}
+        if cursor:
+            page.update(cursor={"id": cursor}, skip=1)
+
+        rows = await find_many(**page)
+        if not rows:
+            return
+        yield rows
+
+        if len(rows) < chunk_size:
+            return
+        cursor = rows[-1].id
+
+
+async def rebuild_reports(db, chunk_size: int = DEFAULT_CHUNK_SIZE, progress: dict = None) -> int:
+    """
+    Rebuild every DutyReport and AnalyticsRollup row from history.
+
+    Duties and check-in logs are streamed in id order with cursor pagination so
+    memory stays bounded by chunk_size; each chunk is folded and added to the
+    rollups in one batch. Duties written while the rebuild runs may be counted
+    twice, so run it while assignments are quiet.
+    """
+    await db.dutyreport.delete_many()
+    await db.analyticsrollup.delete_many()
+
+    processed = 0
+    async for duties in _stream(db.dutyassignment.find_many, chunk_size):
+        await apply_rollups(db, aggregate_duties(duties))
+        processed += len(duties)
+        if progress is not None:
+            progress["processed"] = processed
+
+    # Only check-ins whose face verdict completed the duty count, as on the live path
+    async for logs in _stream(db.dutylog.find_many, chunk_size,
+                              where={"faceStatus": FaceStatus.VERIFIED.value}, include={"duty": True}):
+        await apply_rollups(db, aggregate_checkins(logs))
+        processed += len(logs)
+        if progress is not None:
+            progress["processed"] = processed
+
+    analytics.cache.clear()
+    return processed
+
+
+def serialize_report(report) -> dict:
+    return {
+        "officerId": report.officerId,
+        "date": report.date.date().isoformat() if report.date else None,
+        "totalAssigned": report.totalAssigned,
+        "completed": report.completed,
+        "missed": report.missed,
+        "complianceRate": round(report.complianceRate, 4),
+    }
+
+
+def default_range(start: datetime = None, end: datetime = None, days: int = 30):
+    """Resolve optional query bounds into a UTC [start, end] day range"""
+    end = day_bucket(end) if end else day_bucket(datetime.now(timezone.utc))
+    start = day_bucket(start) if start else end - timedelta(days=days - 1)
+    return start, end
@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+
+from models import serializers
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Every write that changes an officer's duties or logs appends a SyncChange row.
+# Its autoincrement seq is the monotonic change sequence behind the sync token.
+DUTY = "duty"
+LOG = "log"
+
+TOKEN_PREFIX = "v1."
+
+# Sequence values are allocated before commit, so a lower seq can become visible
+# after a higher one. The token only advances over changes older than this
+# window; younger ones are sent again on the next sync (upserts are idempotent).
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
+
+# Compaction keeps the change log from growing with every ping. An entry with a
+# newer one for the same entity is never needed and goes at once. Entries older
+# than SYNC_RETENTION_DAYS go too, and the highest seq among them becomes the
+# horizon: a token below it may have missed changes and gets a full resync.
+# A horizon is published one compaction before anything under it is deleted,
+# so workers' cached copies (SYNC_HORIZON_CACHE_SECONDS) are always ahead of it.
+SYNC_RETENTION_DAYS = float(os.getenv("SYNC_RETENTION_DAYS", "30"))
+SYNC_HORIZON_CACHE_SECONDS = 60
+SYNC_COMPACT_CHUNK_SIZE = int(os.getenv("SYNC_COMPACT_CHUNK_SIZE", "50000"))
+HORIZON_ID = "sync"
+
+# Deletes entries in a seq range that a later entry for the same entity supersedes
+DELETE_SUPERSEDED_SQL = """
+DELETE FROM "SyncChange" AS old
+USING "SyncChange" AS newer
+WHERE old."seq" > $1 AND old."seq" <= $2
+  AND newer."officerId" = old."officerId"
+  AND newer."entity" = old."entity"
+  AND newer."entityId" = old."entityId"
+  AND newer."seq" > old."seq"
+"""
+
+horizon_cache = TTLCache(ttl_seconds=SYNC_HORIZON_CACHE_SECONDS, max_entries=1)
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def record(batcher, officer_id: str, entity: str, entity_id: str, deleted: bool = False):
+    """Queue a change entry on the batch that performs the write"""
+    batcher.syncchange.create(
+        data={"officerId": officer_id, "entity": entity, "entityId": entity_id, "deleted": deleted}
+    )
+
+
+def record_many(batcher, changes):
+    """Queue [(officerId, entity, entityId)] change entries as a single insert"""
+    if changes:
+        batcher.syncchange.create_many(data=[
+            {"officerId": officer_id, "entity": entity, "entityId": entity_id}
+            for officer_id, entity, entity_id in changes
+        ])
+
+
+async def record_now(db, officer_id: str, changes):
+    """Append [(entity, entityId, deleted)] change entries for an officer in one batch"""
+    async with db.batch_() as batcher:
+        for entity, entity_id, deleted in changes:
+            record(batcher, officer_id, entity, entity_id, deleted)
+
+
+def encode_token(seq: int) -> str:
+    return f"{TOKEN_PREFIX}{seq}"
+
+
+def decode_token(token: str) -> int:
+    if not token.startswith(TOKEN_PREFIX):
+        raise InvalidSyncToken("Unrecognised sync token")
+    try:
+        seq = int(token[len(TOKEN_PREFIX):])
+    except ValueError:
+        raise InvalidSyncToken("Malformed sync token")
+    if seq < 0:
+        raise InvalidSyncToken("Malformed sync token")
+    return seq
+
+
+def _settle_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def snapshot(db, officer_id: str) -> dict:
+    """Full state for a client without a token, plus the token to continue from"""
+    latest = await db.syncchange.find_first(
+        where={"officerId": officer_id, "createdAt": {"lte": _settle_cutoff()}},
+        order={"seq": "desc"},
+    )
+    duties = await db.dutyassignment.find_many(where={"officerId": officer_id})
+    logs = await db.dutylog.find_many(where={"officerId": officer_id})
+    return {
+        "token": encode_token(latest.seq if latest else 0),
+        "full": True,
+        "hasMore": False,
+        "duties": serializers.duty_rows(duties),
+        "logs": serializers.log_rows(logs),
+        "deleted": {"duties": [], "logs": []},
+    }
+
+
+async def horizon(db) -> int:
+    """Highest seq compaction may have dropped without a newer entry to replace it"""
+    value = horizon_cache.get(HORIZON_ID)
+    if value is None:
+        row = await db.synchorizon.find_unique(where={"id": HORIZON_ID})
+        value = row.seq if row else 0
+        horizon_cache.set(HORIZON_ID, value)
+    return value
+
+
+async def changes_since(db, officer_id: str, token: str, limit: int) -> dict:
+    """Duties and logs created, changed or deleted after the token, with tombstones"""
+    seq = decode_token(token)
+    if seq < await horizon(db):
+        return await snapshot(db, officer_id)
+    changes = await db.syncchange.find_many(
+        where={"officerId": officer_id, "seq": {"gt": seq}},
+        order={"seq": "asc"},
+        take=limit + 1,
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    cutoff = _settle_cutoff()
+    next_seq = seq
+    for change in changes:
+        if _aware(change.createdAt) > cutoff:
+            break
+        next_seq = change.seq
+
+    # Latest change per entity wins
+    latest = {}
+    for change in changes:
+        latest[(change.entity, change.entityId)] = change.deleted
+
+    duty_ids = [entity_id for (entity, entity_id), deleted in latest.items() if entity == DUTY and not deleted]
+    log_ids = [entity_id for (entity, entity_id), deleted in latest.items() if entity == LOG and not deleted]
+
+    duties = await db.dutyassignment.find_many(where={"id": {"in": duty_ids}}) if duty_ids else []
+    logs = await db.dutylog.find_many(where={"id": {"in": log_ids}}) if log_ids else []
+
+    found = {row.id for row in duties} | {row.id for row in logs}
+    deleted_duties = [entity_id for (entity, entity_id), deleted in latest.items()
+                      if entity == DUTY and (deleted or entity_id not in found)]
+    deleted_logs = [entity_id for (entity, entity_id), deleted in latest.items()
+                    if entity == LOG and (deleted or entity_id not in found)]
+
+    return {
+        "token": encode_token(next_seq),
+        "full": False,
+        # Only ask for another page when the token moved past everything returned
+        "hasMore": has_more and next_seq == changes[-1].seq,
+        "duties": serializers.duty_rows(duties),
+        "logs": serializers.log_rows(logs),
+        "deleted": {"duties": deleted_duties, "logs": deleted_logs},
+    }
+
+
+async def compact(db, now: datetime = None, chunk_size: int = SYNC_COMPACT_CHUNK_SIZE) -> dict:
+    """Drop superseded and expired change entries, then publish the next horizon"""
+    now = now or datetime.now(timezone.utc)
+    superseded = 0
+    first = await db.syncchange.find_first(order={"seq": "asc"})
+    last = await db.syncchange.find_first(order={"seq": "desc"})
+    if last is not None:
+        # One bounded statement per seq range keeps each delete's locks brief
+        for start in range(first.seq - 1, last.seq, chunk_size):
+            superseded += await db.execute_raw(DELETE_SUPERSEDED_SQL, start, start + chunk_size)
+
+    current = await db.synchorizon.find_unique(where={"id": HORIZON_ID})
+    expired = 0
+    if current is not None and current.seq and first is not None:
+        # Same seq ranges, up to the horizon published on the previous run
+        for start in range(first.seq - 1, current.seq, chunk_size):
+            end = min(start + chunk_size, current.seq)
+            expired += await db.syncchange.delete_many(where={"seq": {"gt": start, "lte": end}})
+
+    cutoff = now - timedelta(days=SYNC_RETENTION_DAYS)
+    newest_expired = await db.syncchange.find_first(where={"createdAt": {"lt": cutoff}}, order={"seq": "desc"})
+    if newest_expired is not None:
+        await db.synchorizon.upsert(
+            where={"id": HORIZON_ID},
+            data={"create": {"id": HORIZON_ID, "seq": newest_expired.seq}, "update": {"seq": newest_expired.seq}},
+        )
+    return {"superseded": superseded, "expired": expired,
+            "horizon": newest_expired.seq if newest_expired else (current.seq if current else 0)}
+
+
+async def run_sync_compactor(db, interval_seconds: float):
+    """Background loop that compacts the change log"""
+    # Deletes trail the published horizon by a whole interval; it must outlast cached copies
+    interval_seconds = max(interval_seconds, 2 * SYNC_HORIZON_CACHE_SECONDS)
+    while True:
+        try:
+            result = await compact(db)
+            if result["superseded"] or result["expired"]:
+                logger.info(f"Compacted sync log: {result}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Sync compaction failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
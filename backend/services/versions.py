@@ -0,0 +1,79 @@
+from zlib import crc32
+
+from fastapi import Request, Response, status
+
+# Collection versions back the ETags on the polled list endpoints. Each version
+# is a counter row in CollectionVersion, bumped in the same batch as the write
+# that changes the collection, so every worker sees the same value and a
+# conditional GET costs one primary-key lookup instead of a scan + serialization.
+
+DUTIES = "duties"
+USERS = "users"
+
+etag_stats = {}
+
+
+def officer_duties(officer_id: str) -> str:
+    return f"officer-duties:{officer_id}"
+
+
+def bump(batcher, *keys: str):
+    """Queue version bumps on a batch (or run them on a client inside a transaction)"""
+    for key in dict.fromkeys(keys):
+        batcher.collectionversion.upsert(
+            where={"key": key},
+            data={"create": {"key": key, "version": 1}, "update": {"version": {"increment": 1}}},
+        )
+
+
+async def bump_now(db, *keys: str):
+    async with db.batch_() as batcher:
+        bump(batcher, *keys)
+
+
+async def current(db, key: str) -> int:
+    row = await db.collectionversion.find_unique(where={"key": key})
+    return row.version if row else 0
+
+
+def etag(key: str, version: int) -> str:
+    return f'W/"{crc32(key.encode()):08x}-{version}"'
+
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses weak comparison, so W/"x" and "x" are equivalent
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _matches(header: str, tag: str) -> bool:
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(_opaque(c) == _opaque(tag) for c in candidates)
+
+
+async def conditional(db, request: Request, key: str, collection: str):
+    """
+    Resolve the ETag for a collection and answer If-None-Match.
+
+    Returns (tag, response): response is a ready 304 when the client copy is
+    current, otherwise None and the caller renders the collection with `tag`.
+    """
+    tag = etag(key, await current(db, key))
+    counters = etag_stats.setdefault(collection, {"notModified": 0, "full": 0})
+    if _matches(request.headers.get("if-none-match"), tag):
+        counters["notModified"] += 1
+        return tag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    counters["full"] += 1
+    return tag, None
+
+
+def stats() -> dict:
+    result = {}
+    for collection, counters in etag_stats.items():
+        total = counters["notModified"] + counters["full"]
+        result[collection] = {
+            **counters,
+            "hitRate": round(counters["notModified"] / total, 4) if total else 0.0,
+        }
+    return result
@@ -0,0 +1,212 @@
+from contextlib import asynccontextmanager
+from time import monotonic
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+
+# --- Admission Control ---
+# Every request that runs inference holds one of FACE_MAX_IN_FLIGHT slots. The
+# rest wait in a bounded priority queue: /verify before /enroll before
+# background work (batches, enrollment jobs, re-embedding). A request is shed
+# with 429 and Retry-After when the queue is full of equal or higher priority
+# work, or when its expected wait already exceeds its deadline, so a check-in
+# storm cannot pile up images and tensors until latency or memory runs away.
+
+FACE_MAX_IN_FLIGHT = int(os.getenv("FACE_MAX_IN_FLIGHT", "4"))
+FACE_ADMISSION_QUEUE = int(os.getenv("FACE_ADMISSION_QUEUE", "32"))
+# Slots background work can never take, so long batches cannot starve /verify
+FACE_RESERVED_SLOTS = int(os.getenv("FACE_RESERVED_SLOTS", "1"))
+# Below the backend's 3 s client timeout: no point starting work the caller has given up on
+VERIFY_DEADLINE_SECONDS = float(os.getenv("FACE_VERIFY_DEADLINE_SECONDS", "2.5"))
+ENROLL_DEADLINE_SECONDS = float(os.getenv("FACE_ENROLL_DEADLINE_SECONDS", "30"))
+# Callers may tighten the deadline with their own remaining budget
+DEADLINE_HEADER = b"x-request-deadline-ms"
+
+VERIFY, ENROLL, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {VERIFY: "verify", ENROLL: "enroll", BACKGROUND: "background"}
+
+# (method, path) -> (priority, deadline in seconds or None)
+ROUTES = {
+    ("POST", "/verify"): (VERIFY, VERIFY_DEADLINE_SECONDS),
+    ("POST", "/enroll"): (ENROLL, ENROLL_DEADLINE_SECONDS),
+    ("POST", "/verify/batch"): (BACKGROUND, None),
+}
+
+_INITIAL_SERVICE_SECONDS = 0.5  # Until real requests have been timed
+_EWMA_WEIGHT = 0.2
+
+
+class Rejected(Exception):
+    """The request was shed; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded, deadline-aware priority queue in front of it"""
+
+    def __init__(self, limit: int, queue_size: int, reserved: int = 0):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.reserved = reserved
+        self.in_flight = 0
+        self.service_seconds = _INITIAL_SERVICE_SECONDS
+        self._waiters = []  # heap of (priority, seq, future, deadline)
+        self._seq = itertools.count()
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed = {reason: 0 for reason in ("queue_full", "deadline", "evicted", "expired")}
+
+    def _capacity(self, priority: int) -> int:
+        return self.limit if priority < BACKGROUND else max(1, self.limit - self.reserved)
+
+    def _expected_wait(self, ahead: int) -> float:
+        """Time until `ahead` queued requests and then this one get a slot"""
+        return math.ceil((ahead + 1) / self.limit) * self.service_seconds
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._expected_wait(len(self._waiters))))
+
+    def _reject(self, reason: str, message: str) -> Rejected:
+        self.shed[reason] += 1
+        return Rejected(message, self._retry_after())
+
+    async def acquire(self, priority: int, deadline: float = None):
+        """Wait for a slot; `deadline` is a monotonic() time. Raises Rejected when shed."""
+        ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority)
+        if ahead == 0 and self.in_flight < self._capacity(priority):
+            self.in_flight += 1
+            self.admitted[PRIORITY_NAMES[priority]] += 1
+            return
+
+        if deadline is not None and monotonic() + self._expected_wait(ahead) > deadline:
+            raise self._reject("deadline", "Face service is saturated; the request would miss its deadline.")
+        if len(self._waiters) >= self.queue_size:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                raise self._reject("queue_full", "Face service is saturated.")
+            # Make room by shedding the newest waiter of the lowest priority
+            self._remove(worst)
+            worst[2].set_exception(self._reject("evicted", "Face service is saturated."))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._seq), future, deadline)
+        heapq.heappush(self._waiters, waiter)
+        timeout = None if deadline is None else max(0.0, deadline - monotonic())
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was granted just as the deadline passed
+                pass
+            else:
+                self._remove(waiter)
+                raise self._reject("expired", "Face service is saturated; the request timed out in the queue.")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        self.admitted[PRIORITY_NAMES[priority]] += 1
+
+    def _remove(self, waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+
+    def release(self, seconds: float = None):
+        """Give a slot back, optionally recording how long the work held it"""
+        if seconds is not None:
+            self.service_seconds += _EWMA_WEIGHT * (seconds - self.service_seconds)
+        self.in_flight -= 1
+        # The heap is ordered by priority, so once the head does not fit nothing behind it does
+        while self._waiters and self.in_flight < self._capacity(self._waiters[0][0]):
+            _, _, future, deadline = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if deadline is not None and monotonic() > deadline:
+                future.set_exception(self._reject("expired", "Face service is saturated; the request timed out in the queue."))
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def timed_release(self, priority: int, started: float):
+        # Background work holds a slot for whole batches; its duration says nothing about the next request
+        self.release(monotonic() - started if priority < BACKGROUND else None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int, deadline: float = None):
+        await self.acquire(priority, deadline)
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.timed_release(priority, started)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "reserved": self.reserved,
+            "inFlight": self.in_flight,
+            "queued": {
+                name: sum(1 for waiter in self._waiters if waiter[0] == priority)
+                for priority, name in PRIORITY_NAMES.items()
+            },
+            "queueSize": self.queue_size,
+            "serviceSeconds": round(self.service_seconds, 3),
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware admitting the inference routes through the controller.
+    Shed requests get 429 with Retry-After before their body is even read.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        route = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if route is None:
+            return await self.app(scope, receive, send)
+
+        priority, budget = route
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER and value.isdigit():
+                caller_budget = int(value) / 1000
+                budget = caller_budget if budget is None else min(budget, caller_budget)
+        started = monotonic()
+        try:
+            await self.controller.acquire(priority, None if budget is None else started + budget)
+        except Rejected as e:
+            body = json.dumps({"detail": e.reason}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(e.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        admitted = monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.timed_release(priority, admitted)
+
+
+admission = AdmissionController(FACE_MAX_IN_FLIGHT, FACE_ADMISSION_QUEUE, FACE_RESERVED_SLOTS)
@@ -0,0 +1,114 @@
+"""
+Per-worker memory and time-to-ready with and without preloaded models.
+
+Starts gunicorn with gunicorn.conf.py for each setting, polls /ready until every
+worker has answered (each reply carries the worker's pid), then reads the
+master's and workers' memory from /proc. RSS counts shared pages in every
+process; PSS splits them between the processes sharing them, so the PSS total is
+the service's real footprint. Linux only. Needs DATABASE_URL, since workers
+connect on startup.
+
+    cd face-recognition && python benchmarks/prefork_memory.py --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import requests
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory(pid: int) -> dict:
+    """RSS, PSS and private (USS) memory of a process in MiB, from smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    mib = lambda kb: round(kb / 1024, 1)  # noqa: E731
+    return {
+        "rss": mib(fields["Rss"]),
+        "pss": mib(fields["Pss"]),
+        "uss": mib(fields["Private_Clean"] + fields["Private_Dirty"]),
+    }
+
+
+def children(pid: int):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure(workers: int, preload: bool, port: int, timeout: float) -> dict:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), FACE_PRELOAD="1" if preload else "0", PORT=str(port))
+    started = time.perf_counter()
+    master = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready_pids, first_ready = set(), None
+        while len(ready_pids) < workers:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"only {len(ready_pids)}/{workers} workers ready after {timeout}s")
+            try:
+                # A fresh connection per poll lets the kernel hand it to any worker
+                response = requests.get(f"http://127.0.0.1:{port}/ready", timeout=1, headers={"Connection": "close"})
+                if response.status_code == 200:
+                    ready_pids.add(response.json()["pid"])
+                    first_ready = first_ready or time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        all_ready = time.perf_counter() - started
+
+        worker_memory = [memory(pid) for pid in children(master.pid)]
+        master_memory = memory(master.pid)
+        return {
+            "workers": workers,
+            "preload": preload,
+            "firstReadySeconds": round(first_ready, 2),
+            "allReadySeconds": round(all_ready, 2),
+            "master": master_memory,
+            "perWorker": {
+                key: round(sum(m[key] for m in worker_memory) / len(worker_memory), 1) for key in ("rss", "pss", "uss")
+            },
+            "totalPss": round(master_memory["pss"] + sum(m["pss"] for m in worker_memory), 1),
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        sys.exit("This benchmark reads /proc and only runs on Linux")
+
+    results = [measure(args.workers, preload, args.port, args.timeout) for preload in (False, True)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<12}{'first ready':>13}{'all ready':>11}{'RSS/worker':>12}{'PSS/worker':>12}"
+          f"{'USS/worker':>12}{'total PSS':>11}")
+    for r in results:
+        mode = "preload" if r["preload"] else "per-worker"
+        w = r["perWorker"]
+        print(f"{mode:<12}{r['firstReadySeconds']:>12.2f}s{r['allReadySeconds']:>10.2f}s"
+              f"{w['rss']:>8.1f} MiB{w['pss']:>8.1f} MiB{w['uss']:>8.1f} MiB{r['totalPss']:>7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
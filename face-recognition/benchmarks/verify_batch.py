@@ -0,0 +1,69 @@
+"""
+Throughput of /verify/batch against sequential /verify calls.
+
+Reads (user_id, selfie_url) pairs from a JSON file, a list of
+{"user_id": ..., "selfie_url": ...} objects, and sends them to a running
+service either as sequential /verify calls or as /verify/batch requests.
+Both paths share the selfie cache, so restart the service before each run to
+compare them cold.
+
+    cd face-recognition && python benchmarks/verify_batch.py pairs.json --mode sequential
+    cd face-recognition && python benchmarks/verify_batch.py pairs.json --mode batch
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+
+def run_sequential(client, pairs):
+    statuses = {}
+    for pair in pairs:
+        response = client.post("/verify", json=pair)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+
+def run_batch(client, pairs, batch_size):
+    statuses, first_result = {}, None
+    started = time.perf_counter()
+    for offset in range(0, len(pairs), batch_size):
+        with client.stream("POST", "/verify/batch", json={"items": pairs[offset:offset + batch_size]}) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                first_result = first_result or time.perf_counter() - started
+                status = json.loads(line).get("status", 200)
+                statuses[status] = statuses.get(status, 0) + 1
+    return statuses, first_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pairs", help="JSON file with a list of {user_id, selfie_url}")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--batch-size", type=int, default=200, help="items per /verify/batch request")
+    parser.add_argument("--mode", choices=("sequential", "batch"), required=True)
+    args = parser.parse_args()
+
+    with open(args.pairs) as f:
+        pairs = json.load(f)
+
+    with httpx.Client(base_url=args.url, timeout=httpx.Timeout(300.0)) as client:
+        if args.mode == "sequential":
+            started = time.perf_counter()
+            statuses = run_sequential(client, pairs)
+            elapsed = time.perf_counter() - started
+            print(f"sequential  {len(pairs)} items in {elapsed:.2f}s  {len(pairs) / elapsed:8.1f} items/s  {statuses}")
+        else:
+            started = time.perf_counter()
+            statuses, first_result = run_batch(client, pairs, args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f"batch       {len(pairs)} items in {elapsed:.2f}s  {len(pairs) / elapsed:8.1f} items/s  {statuses}"
+                  f"  first result after {first_result or 0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from time import monotonic
+import hashlib
+import os
+
+import numpy as np
+
+# --- Selfie Embedding Cache ---
+# Retries and re-verifications send the same selfie again. Results are cached by
+# the SHA-256 of the image bytes, so identical content never goes through MTCNN
+# and the resnet twice. A URL -> digest map in front of that also skips the
+# download for a URL seen recently. "No face detected" is cached as well.
+
+SELFIE_CACHE_MAX_ENTRIES = int(os.getenv("SELFIE_CACHE_MAX_ENTRIES", "10000"))
+SELFIE_CACHE_MAX_BYTES = int(os.getenv("SELFIE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# A URL could be overwritten with a new upload, so URL entries expire
+SELFIE_URL_TTL_SECONDS = float(os.getenv("SELFIE_URL_TTL_SECONDS", "600"))
+
+MISSING = object()
+_ENTRY_OVERHEAD = 200  # Rough bytes per entry for keys, tuples and dict slots
+
+
+def digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class SelfieCache:
+    """LRU of content digest -> embedding (or None for no face), bounded by entries and bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int, url_ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.url_ttl = url_ttl
+        self._embeddings = OrderedDict()  # digest -> (embedding, size)
+        self._urls = OrderedDict()  # url -> (digest, expires_at, size)
+        self.bytes = 0
+        self.hits = 0
+        self.url_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup_url(self, url: str):
+        """Cached result for a recently seen URL, or MISSING"""
+        entry = self._urls.get(url)
+        if entry is None:
+            return MISSING
+        key, expires_at, _ = entry
+        if expires_at < monotonic() or key not in self._embeddings:
+            self._drop_url(url)
+            return MISSING
+        self._urls.move_to_end(url)
+        self._embeddings.move_to_end(key)
+        self.url_hits += 1
+        return self._embeddings[key][0]
+
+    def get(self, key: str):
+        """Cached result for an image digest, or MISSING"""
+        entry = self._embeddings.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        self._embeddings.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, embedding, url: str = None):
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        if key not in self._embeddings:
+            size = _ENTRY_OVERHEAD + (embedding.nbytes if embedding is not None else 0)
+            self._embeddings[key] = (embedding, size)
+            self.bytes += size
+        if url is not None:
+            self.remember_url(url, key)
+        self._evict()
+        return embedding
+
+    def remember_url(self, url: str, key: str):
+        self._drop_url(url)
+        size = _ENTRY_OVERHEAD + len(url)
+        self._urls[url] = (key, monotonic() + self.url_ttl, size)
+        self.bytes += size
+
+    def _drop_url(self, url: str):
+        entry = self._urls.pop(url, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def _evict(self):
+        while self._urls and (len(self._urls) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, _, size) = self._urls.popitem(last=False)
+            self.bytes -= size
+        while self._embeddings and (len(self._embeddings) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, size) = self._embeddings.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop everything, e.g. when embeddings from another model version take over"""
+        self._embeddings.clear()
+        self._urls.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.url_hits + self.misses
+        return {
+            "entries": len(self._embeddings),
+            "urls": len(self._urls),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "urlHits": self.url_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": round((self.hits + self.url_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+selfie_cache = SelfieCache(SELFIE_CACHE_MAX_ENTRIES, SELFIE_CACHE_MAX_BYTES, SELFIE_URL_TTL_SECONDS)
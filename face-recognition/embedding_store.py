@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding Snapshot ---
+# All embeddings are written periodically to one contiguous float32 matrix,
+# grouped by user, with a JSON index of user -> row range. Workers open it with
+# np.memmap, so the OS page cache holds one copy shared by every process and
+# startup does not scale with the number of officers. Rows created after the
+# snapshot's watermark are read from Postgres as a small per-user delta. Only
+# the active model version's embeddings are included.
+
+SNAPSHOT_DIR = os.getenv("EMBEDDING_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("EMBEDDING_SNAPSHOT_INTERVAL_SECONDS", "900"))
+DELTA_REFRESH_SECONDS = float(os.getenv("EMBEDDING_DELTA_REFRESH_SECONDS", "5"))
+# Rows are read with createdAt a little behind "now" so a row committed late is
+# still picked up by the next delta rather than missed by both
+WATERMARK_SKEW_SECONDS = 5
+SNAPSHOT_CHUNK_SIZE = 5000
+EMBEDDING_DIM = 512
+
+POINTER_FILE = "current.json"
+LOCK_FILE = ".lock"
+
+
+def _aware(value):
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def write_snapshot(db, version: str, directory: str = SNAPSHOT_DIR) -> dict:
+    """
+    Stream every embedding of a model version into a new snapshot and atomically point current.json at it.
+    Returns the snapshot's index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    watermark = datetime.now(timezone.utc) - timedelta(seconds=WATERMARK_SKEW_SECONDS)
+    name = f"embeddings-{int(time.time() * 1000)}"
+    matrix_path = os.path.join(directory, name + ".f32")
+
+    users, count, cursor = {}, 0, None
+    with open(matrix_path + ".tmp", "wb") as matrix:
+        while True:
+            page = {
+                "where": {"modelVersion": version},
+                "take": SNAPSHOT_CHUNK_SIZE,
+                "order": [{"userId": "asc"}, {"id": "asc"}],
+            }
+            if cursor:
+                page.update(cursor={"id": cursor}, skip=1)
+            rows = await db.faceembedding.find_many(**page)
+            if not rows:
+                break
+            block = np.asarray([row.embedding for row in rows], dtype=np.float32)
+            matrix.write(block.tobytes())
+            for offset, row in enumerate(rows):
+                start, _ = users.get(row.userId, (count + offset, None))
+                users[row.userId] = (start, count + offset + 1)
+            count += len(rows)
+            cursor = rows[-1].id
+            if len(rows) < SNAPSHOT_CHUNK_SIZE:
+                break
+        matrix.flush()
+        os.fsync(matrix.fileno())
+
+    index = {
+        "matrix": name + ".f32",
+        "version": version,
+        "count": count,
+        "dim": EMBEDDING_DIM,
+        "watermark": watermark.isoformat(),
+        "users": users,
+    }
+    os.replace(matrix_path + ".tmp", matrix_path)
+    with open(os.path.join(directory, name + ".json.tmp"), "w") as f:
+        json.dump(index, f)
+    os.replace(os.path.join(directory, name + ".json.tmp"), os.path.join(directory, name + ".json"))
+    pointer_tmp = os.path.join(directory, POINTER_FILE + ".tmp")
+    with open(pointer_tmp, "w") as f:
+        json.dump({"index": name + ".json"}, f)
+    os.replace(pointer_tmp, os.path.join(directory, POINTER_FILE))
+    _remove_old_snapshots(directory, keep={name})
+    return index
+
+
+def _remove_old_snapshots(directory, keep):
+    # Workers still holding an old memmap keep reading it; unlinking only drops the name
+    for filename in os.listdir(directory):
+        stem, _, _ = filename.partition(".")
+        if filename.startswith("embeddings-") and stem not in keep:
+            os.remove(os.path.join(directory, filename))
+
+
+class EmbeddingStore:
+    """Per-worker view over the shared snapshot plus a delta of users enrolled since"""
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.version = None
+        self.matrix = None
+        self.users = {}
+        self.index_name = None
+        self.watermark = None
+        self.delta = {}  # userId -> float32 matrix overriding the snapshot
+        self.stale = set()  # users re-enrolled on this worker but not refreshed yet
+
+    @property
+    def ready(self) -> bool:
+        return self.watermark is not None
+
+    def switch(self, version: str) -> bool:
+        """Serve another model version: forget everything until its snapshot is loaded"""
+        if version == self.version:
+            return False
+        self.version = version
+        self.matrix = None
+        self.users = {}
+        self.index_name = None
+        self.watermark = None
+        self.delta = {}
+        self.stale = set()
+        return True
+
+    def load(self) -> bool:
+        """Open the snapshot current.json points at; False when there is none or it is unchanged"""
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE)) as f:
+                index_name = json.load(f)["index"]
+        except FileNotFoundError:
+            return False
+        if index_name == self.index_name:
+            return False
+        with open(os.path.join(self.directory, index_name)) as f:
+            index = json.load(f)
+        if index.get("version") != self.version:
+            # Written for another model version; the writer will replace it
+            return False
+
+        count, dim = index["count"], index["dim"]
+        matrix = None
+        if count:
+            matrix = np.memmap(os.path.join(self.directory, index["matrix"]), dtype=np.float32,
+                               mode="r", shape=(count, dim))
+        self.matrix = matrix
+        self.users = {user_id: tuple(bounds) for user_id, bounds in index["users"].items()}
+        self.index_name = index_name
+        self.watermark = _aware(datetime.fromisoformat(index["watermark"]))
+        # Deltas older than the new snapshot are now part of it
+        self.delta = {}
+        return True
+
+    async def refresh_delta(self, db):
+        """Reload every user with embeddings created after the watermark (two queries)"""
+        if not self.ready:
+            return
+        since = self.watermark
+        recent = await db.faceembedding.find_many(where={"createdAt": {"gt": since}, "modelVersion": self.version})
+        user_ids = {row.userId for row in recent} | self.stale
+        if not user_ids:
+            return
+        rows = await db.faceembedding.find_many(
+            where={"userId": {"in": list(user_ids)}, "modelVersion": self.version}
+        )
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row.userId, []).append(row.embedding)
+        for user_id in user_ids:
+            vectors = grouped.get(user_id)
+            self.delta[user_id] = np.asarray(vectors, dtype=np.float32) if vectors else None
+        self.stale -= user_ids
+
+    def invalidate(self, user_id: str):
+        """Stop serving this user from memory until the next refresh (e.g. after enrolling here)"""
+        self.delta.pop(user_id, None)
+        self.stale.add(user_id)
+
+    def embeddings_for(self, user_id: str):
+        """
+        Float32 matrix of the user's embeddings, None when the user has none, or
+        False when this worker cannot answer and the caller should ask the database.
+        """
+        if not self.ready or user_id in self.stale:
+            return False
+        if user_id in self.delta:
+            return self.delta[user_id]
+        bounds = self.users.get(user_id)
+        if bounds is None:
+            # Possibly enrolled since the last refresh
+            return False
+        start, end = bounds
+        return self.matrix[start:end]
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "snapshot": self.index_name,
+            "rows": 0 if self.matrix is None else int(self.matrix.shape[0]),
+            "users": len(self.users),
+            "deltaUsers": len(self.delta),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+
+
+def _try_lock(directory):
+    os.makedirs(directory, exist_ok=True)
+    handle = open(os.path.join(directory, LOCK_FILE), "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+async def maybe_write_snapshot(db, store: EmbeddingStore) -> bool:
+    """Write a snapshot if it is due and no other worker is writing one"""
+    if store.ready and datetime.now(timezone.utc) - store.watermark < timedelta(seconds=SNAPSHOT_INTERVAL_SECONDS):
+        return False
+    lock = _try_lock(store.directory)
+    if lock is None:
+        return False
+    try:
+        # Another worker may have finished one while we waited for the lock
+        store.load()
+        if store.ready and datetime.now(timezone.utc) - store.watermark < timedelta(seconds=SNAPSHOT_INTERVAL_SECONDS):
+            return False
+        await write_snapshot(db, store.version, store.directory)
+        store.load()
+        return True
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+async def run_snapshot_loop(db, store: EmbeddingStore, before_refresh=None):
+    """
+    Background loop: pick up new snapshots, write one when due, refresh the delta.
+    `before_refresh` is awaited first on every round, e.g. to follow model version changes.
+    """
+    while True:
+        try:
+            if before_refresh is not None:
+                await before_refresh()
+            store.load()
+            if await maybe_write_snapshot(db, store):
+                logger.info(f"Wrote embedding snapshot {store.index_name} ({store.stats()['rows']} rows)")
+            await store.refresh_delta(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Embedding snapshot refresh failed: {e}")
+        await asyncio.sleep(DELTA_REFRESH_SECONDS)
+
+
+embedding_store = EmbeddingStore()
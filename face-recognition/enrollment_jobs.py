@@ -0,0 +1,181 @@
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+import asyncio
+import logging
+import os
+
+from fastapi import HTTPException
+from prisma import Json
+from prisma.errors import UniqueViolationError
+
+logger = logging.getLogger(__name__)
+
+# --- Enrollment Jobs ---
+# POST /enroll/jobs answers 202 with a job id right away and queues the work on a
+# bounded in-process queue drained by a few workers, so slow uploads and
+# inference never hold the request open. Job state lives in the EnrollmentJob
+# table, so any worker can answer a status poll. A full queue is refused with
+# 503 rather than growing without bound.
+
+ENROLL_QUEUE_SIZE = int(os.getenv("ENROLL_QUEUE_SIZE", "100"))
+ENROLL_WORKERS = int(os.getenv("ENROLL_WORKERS", "2"))
+# Jobs queued, or running, for longer than this belonged to a worker that went away
+ENROLL_JOB_STALE_SECONDS = float(os.getenv("ENROLL_JOB_STALE_SECONDS", "900"))
+ENROLL_RETRY_AFTER_SECONDS = 5
+
+_SAMPLES = 1000  # Recent jobs kept for the timing percentiles
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)  # noqa: E731
+    return {"p50": pick(0.5), "p95": pick(0.95)}
+
+
+class EnrollmentQueue:
+    """Bounded queue of enrollment jobs processed by `workers` tasks calling `handler(user_id, sources)`"""
+
+    def __init__(self, db, handler, size: int, workers: int):
+        self.db = db
+        self.handler = handler
+        self.size = size
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+        self._reserved = 0  # Slots held by submissions still inserting their row
+        self.busy = 0
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._waits = deque(maxlen=_SAMPLES)
+        self._runs = deque(maxlen=_SAMPLES)
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def submit(self, user_id: str, sources, idempotency_key: str = None):
+        """
+        Record and queue a job. Returns (job, created); a repeated idempotency key
+        returns the existing job instead. Raises 503 when the queue is full.
+        """
+        if idempotency_key:
+            existing = await self.db.enrollmentjob.find_unique(where={'idempotencyKey': idempotency_key})
+            if existing:
+                self.deduplicated += 1
+                return existing, False
+        if self._queue.qsize() + self._reserved >= self.size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Enrollment queue is full, retry later.",
+                headers={"Retry-After": str(ENROLL_RETRY_AFTER_SECONDS)},
+            )
+
+        self._reserved += 1
+        try:
+            job = await self.db.enrollmentjob.create(data={'userId': user_id, 'idempotencyKey': idempotency_key})
+        except UniqueViolationError:
+            # A concurrent submission with the same key won the insert
+            self.deduplicated += 1
+            return await self.db.enrollmentjob.find_unique(where={'idempotencyKey': idempotency_key}), False
+        finally:
+            self._reserved -= 1
+        self._queue.put_nowait((job.id, user_id, sources, monotonic()))
+        self.submitted += 1
+        return job, True
+
+    async def _work(self):
+        while True:
+            job_id, user_id, sources, queued_at = await self._queue.get()
+            started = monotonic()
+            self._waits.append(started - queued_at)
+            self.busy += 1
+            try:
+                await self._run(job_id, user_id, sources)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Enrollment job {job_id} could not be recorded: {e}")
+            finally:
+                self.busy -= 1
+                self._runs.append(monotonic() - started)
+                self._queue.task_done()
+
+    async def _run(self, job_id, user_id, sources):
+        # Each transition is conditional on the previous state, so a job that get()
+        # has already given up on is neither started nor overwritten with a result
+        started = await self.db.enrollmentjob.update_many(
+            where={'id': job_id, 'status': 'QUEUED'}, data={'status': 'RUNNING', 'startedAt': _now()}
+        )
+        if not started:
+            return
+        try:
+            result, status_code = await self.handler(user_id, sources), 200
+        except HTTPException as e:
+            result, status_code = {"detail": e.detail}, e.status_code
+        except Exception as e:
+            logger.warning(f"Enrollment job {job_id} failed: {e}")
+            result, status_code = {"detail": f"Enrollment failed: {e}"}, 500
+
+        succeeded = status_code < 400
+        self.succeeded += succeeded
+        self.failed += not succeeded
+        await self.db.enrollmentjob.update_many(
+            where={'id': job_id, 'status': 'RUNNING'},
+            data={
+                'status': 'SUCCEEDED' if succeeded else 'FAILED',
+                'statusCode': status_code,
+                'result': Json(result),
+                'finishedAt': _now(),
+            },
+        )
+
+    async def get(self, job_id: str):
+        """The job, with one left behind by a vanished worker reported (and stored) as failed"""
+        job = await self.db.enrollmentjob.find_unique(where={'id': job_id})
+        if job is None:
+            return job
+        cutoff = _now() - timedelta(seconds=ENROLL_JOB_STALE_SECONDS)
+        # A queued job is judged by when it was submitted, a running one by when it started
+        since = job.startedAt if job.status == 'RUNNING' and job.startedAt else job.createdAt
+        if job.status in ('QUEUED', 'RUNNING') and since < cutoff:
+            await self.db.enrollmentjob.update_many(
+                where={'id': job_id, 'status': job.status},
+                data={
+                    'status': 'FAILED',
+                    'statusCode': 500,
+                    'result': Json({"detail": "Enrollment was interrupted; please resubmit."}),
+                    'finishedAt': _now(),
+                },
+            )
+            job = await self.db.enrollmentjob.find_unique(where={'id': job_id})
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "queueDepth": self._queue.qsize() if self._queue else 0,
+            "capacity": self.size,
+            "workers": self.workers,
+            "busy": self.busy,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "waitSeconds": _percentiles(self._waits),
+            "processingSeconds": _percentiles(self._runs),
+        }
@@ -1,19 +1,55 @@
 from facenet_pytorch import MTCNN, InceptionResnetV1
 import torch
 import numpy as np
+import logging
+import os
 from PIL import Image
 
+logger = logging.getLogger(__name__)
+
+# --- Model Versions ---
+# Embeddings from different weights or preprocessing are not comparable, so every
+# stored embedding is tagged with the version of the pipeline that produced it.
+PIPELINES = {
+    "vggface2-160": {"pretrained": "vggface2", "image_size": 160, "margin": 0},
+}
+DEFAULT_VERSION = "vggface2-160"
+
 # --- Load Models Once ---
 # These models are loaded into memory when the server starts, not on every request.
-print("Loading Face Recognition models...")
+logger.info("Loading Face Recognition models...")
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-mtcnn = MTCNN(keep_all=False, device=device)
-resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
-print(f"Face Recognition models loaded onto {device}.")
+
+def _load_pipeline(version):
+    config = PIPELINES[version]
+    detector = MTCNN(keep_all=False, image_size=config["image_size"], margin=config["margin"], device=device)
+    model = InceptionResnetV1(pretrained=config["pretrained"]).eval().to(device)
+    return detector, model
+
+mtcnn, resnet = _load_pipeline(DEFAULT_VERSION)
+_pipelines = {DEFAULT_VERSION: (mtcnn, resnet)}
+logger.info(f"Face Recognition models loaded onto {device}.")
 # -------------------------
 
-def extract_embedding(pil_image):
+def pipeline(version=None):
+    """(detector, model) for a pipeline version, loading other versions on first use."""
+    version = version or DEFAULT_VERSION
+    if version not in _pipelines:
+        logger.info(f"Loading face pipeline {version}...")
+        _pipelines[version] = _load_pipeline(version)
+    return _pipelines[version]
+
+# --- Enrollment Quality Gates ---
+MIN_FACE_PROBABILITY = float(os.getenv("ENROLL_MIN_FACE_PROBABILITY", "0.95"))
+MIN_FACE_SIZE = int(os.getenv("ENROLL_MIN_FACE_SIZE", "80"))  # Shorter side of the face box, in pixels
+MIN_SHARPNESS = float(os.getenv("ENROLL_MIN_SHARPNESS", "60"))  # Variance of the Laplacian of the face crop
+# Size and sharpness at which an image stops earning a higher quality score
+IDEAL_FACE_SIZE = 160
+IDEAL_SHARPNESS = 300
+
+def extract_embedding(pil_image, version=None):
     """Extracts a face embedding from a PIL image."""
+    mtcnn, resnet = pipeline(version)
     face = mtcnn(pil_image)
     if face is None:
         return None
@@ -26,6 +62,98 @@ def extract_embedding(pil_image):
     
     return emb.tolist() # Return as a standard Python list for the database
 
+def extract_embeddings(pil_images, version=None):
+    """
+    Extracts embeddings for many images, running the resnet once over all detected faces.
+    Returns a list aligned with the input holding an L2-normalised array, or None where no face was found.
+    """
+    mtcnn, resnet = pipeline(version)
+    faces = [mtcnn(img) for img in pil_images]
+    found = [i for i, face in enumerate(faces) if face is not None]
+    embeddings = [None] * len(pil_images)
+    if not found:
+        return embeddings
+
+    with torch.no_grad():
+        batch = resnet(torch.stack([faces[i] for i in found]).to(device)).cpu().numpy()
+    batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+    for i, emb in zip(found, batch):
+        embeddings[i] = emb
+    return embeddings
+
+def warm_up():
+    """Runs one detection and one embedding on blank inputs so the first request skips lazy initialisation."""
+    blank = Image.new("RGB", (IDEAL_FACE_SIZE, IDEAL_FACE_SIZE))
+    with torch.no_grad():
+        mtcnn.detect(blank)
+        resnet(torch.zeros(1, 3, IDEAL_FACE_SIZE, IDEAL_FACE_SIZE, device=device))
+
+def sharpness(pil_image, box):
+    """Variance of the Laplacian over the face crop; low values mean a blurred face."""
+    crop = pil_image.crop(tuple(int(v) for v in box)).convert("L").resize((IDEAL_FACE_SIZE, IDEAL_FACE_SIZE))
+    a = np.asarray(crop, dtype=np.float32)
+    laplacian = a[:-2, 1:-1] + a[2:, 1:-1] + a[1:-1, :-2] + a[1:-1, 2:] - 4 * a[1:-1, 1:-1]
+    return float(laplacian.var())
+
+def assess_face(pil_image, version=None):
+    """
+    Detects the most confident face, checks it against the enrollment gates and embeds it.
+    Returns (candidate, None) where candidate holds the embedding and its quality scores,
+    or (None, reason) when the image is rejected.
+    """
+    mtcnn, resnet = pipeline(version)
+    pil_image = pil_image.convert("RGB")
+    boxes, probs = mtcnn.detect(pil_image)
+    if boxes is None:
+        return None, "no face detected"
+
+    best = int(np.argmax(probs))
+    box, probability = boxes[best], float(probs[best])
+    size = float(min(box[2] - box[0], box[3] - box[1]))
+    if probability < MIN_FACE_PROBABILITY:
+        return None, f"face detection confidence {probability:.3f} is below {MIN_FACE_PROBABILITY}"
+    if size < MIN_FACE_SIZE:
+        return None, f"face is {size:.0f}px, smaller than {MIN_FACE_SIZE}px"
+    sharp = sharpness(pil_image, box)
+    if sharp < MIN_SHARPNESS:
+        return None, f"face is too blurred (sharpness {sharp:.0f} < {MIN_SHARPNESS:.0f})"
+
+    face = mtcnn.extract(pil_image, boxes[[best]], None)
+    with torch.no_grad():
+        emb = resnet(face.unsqueeze(0).to(device))
+    emb = emb.cpu().numpy()[0]
+    emb = emb / np.linalg.norm(emb)
+
+    quality = probability * min(1.0, size / IDEAL_FACE_SIZE) * min(1.0, sharp / IDEAL_SHARPNESS)
+    return {
+        "embedding": emb.tolist(),
+        "probability": probability,
+        "size": size,
+        "sharpness": sharp,
+        "quality": round(quality, 4),
+    }, None
+
+def select_embeddings(candidates, limit, max_similarity):
+    """
+    Greedily keeps the highest-quality candidates, skipping any whose cosine similarity
+    to an already kept one exceeds max_similarity, until `limit` are kept.
+    Returns (kept, skipped) as lists of the candidate dicts.
+    """
+    ordered = sorted(candidates, key=lambda c: c["quality"], reverse=True)
+    kept, skipped, kept_vectors = [], [], []
+    for candidate in ordered:
+        vector = np.asarray(candidate["embedding"], dtype=np.float32)
+        if len(kept) >= limit:
+            candidate["reason"] = f"per-user cap of {limit} embeddings reached"
+            skipped.append(candidate)
+        elif kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) > max_similarity:
+            candidate["reason"] = "near-duplicate of a better enrolled image"
+            skipped.append(candidate)
+        else:
+            kept.append(candidate)
+            kept_vectors.append(vector)
+    return kept, skipped
+
 def cosine_sim(a, b):
     """Calculates the cosine similarity between two embeddings."""
-    return float(np.dot(a, b))
\ No newline at end of file
+    return float(np.dot(a, b))
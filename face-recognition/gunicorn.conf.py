@@ -0,0 +1,35 @@
+# Gunicorn settings for running several face-recognition workers on one host.
+#
+# With preload_app the master imports main.py (and so face_recog.py) once, which
+# loads the MTCNN and InceptionResnetV1 weights before forking. Workers inherit
+# those pages copy-on-write instead of each loading their own copy, so model
+# memory and startup time no longer grow with the worker count. Inference never
+# writes to the weights, so the pages stay shared.
+#
+# CUDA cannot be initialised before fork; GPU deployments set FACE_PRELOAD=0 so
+# each worker loads the models itself.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("FACE_PRELOAD", "1") == "1"
+# Model loading happens before the first fork, so workers boot in well under this
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Each worker gets an even share of the cores instead of every worker using all of them
+threads_per_worker = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // workers)
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach; otherwise the
+    # first collection in each worker writes to every object header and copies the pages
+    if preload_app:
+        gc.freeze()
+    server.log.info(f"Starting {workers} workers (preload={preload_app}, torch threads={threads_per_worker})")
+
+
+def post_fork(server, worker):
+    import torch
+
+    torch.set_num_threads(threads_per_worker)
@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from PIL import Image
 import requests
 from io import BytesIO
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+import numpy as np
+
+# Configured before face_recog is imported so its model-loading messages show
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # Import your face recognition utility functions and the Prisma client
 import face_recog as fu
+from admission import BACKGROUND, AdmissionMiddleware, admission
+import model_versions
+from embedding_cache import MISSING, digest, selfie_cache
+from embedding_store import embedding_store, run_snapshot_loop
+from enrollment_jobs import ENROLL_QUEUE_SIZE, ENROLL_WORKERS, EnrollmentQueue
+from uploads import BatchVerifyRequest, parse_enroll, parse_verify
 from prisma import Prisma
 
 # --- Application Setup ---
@@ -14,30 +30,94 @@ app = FastAPI(
     title="Face Recognition Microservice",
     description="A service to enroll and verify faces, storing embeddings in PostgreSQL.",
 )
+# Bounded concurrency for inference routes: sheds with 429 instead of queueing without limit
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # --- Database Connection ---
 db = Prisma(auto_register=True)
 
 # --- Configuration ---
 RECOGNITION_THRESHOLD = 0.8 # Confidence threshold for a successful match
+MAX_EMBEDDINGS_PER_USER = int(os.getenv("MAX_EMBEDDINGS_PER_USER", "5")) # Bounds the cost of /verify per user
+MAX_EMBEDDING_SIMILARITY = float(os.getenv("MAX_EMBEDDING_SIMILARITY", "0.95")) # Above this, images are near-duplicates
+LEGACY_EMBEDDING_QUALITY = 0.5 # Score for embeddings enrolled before quality scoring existed
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "16")) # Parallel selfie downloads per batch request
+BATCH_INFERENCE_SIZE = int(os.getenv("BATCH_INFERENCE_SIZE", "16")) # Selfies embedded per resnet pass
+
+async def load_embeddings(user_ids, version):
+    """
+    Stored embeddings of a model version per user as float32 matrices (None when not enrolled),
+    from the shared snapshot where possible and one query for the users it cannot answer for.
+    """
+    in_store = version == embedding_store.version
+    stored = {user_id: embedding_store.embeddings_for(user_id) if in_store else False for user_id in user_ids}
+    missing = [user_id for user_id, matrix in stored.items() if matrix is False]
+    if missing:
+        grouped = {user_id: [] for user_id in missing}
+        where = {'userId': {'in': missing}, 'modelVersion': version}
+        for record in await db.faceembedding.find_many(where=where):
+            grouped[record.userId].append(record.embedding)
+        for user_id, vectors in grouped.items():
+            stored[user_id] = np.asarray(vectors, dtype=np.float32) if vectors else None
+    return stored
+
+def best_similarity(stored_embeddings, embedding):
+    return max(0.0, float(np.max(stored_embeddings @ embedding)))
 
-# --- Pydantic Models for API Data Validation ---
-class EnrollRequest(BaseModel):
-    user_id: str # This should be the user's unique ID from your main User table
-    image_urls: List[str]
+def load_image(source):
+    """Image bytes for a source: uploaded content as is, otherwise downloaded from its URL."""
+    if source.content is not None:
+        return source.content
+    response = requests.get(source.url, stream=True)
+    response.raise_for_status()
+    return response.content
 
-class VerifyRequest(BaseModel):
-    user_id: str
-    selfie_url: str
+async def fetch_image(source):
+    """load_image for the event loop: downloads through the shared async client."""
+    if source.content is not None:
+        return source.content
+    response = await app.state.http.get(source.url)
+    response.raise_for_status()
+    return response.content
+
+def _selfie_embedding(content, version):
+    return fu.extract_embedding(Image.open(BytesIO(content)), version)
 
 # --- API Endpoints ---
 
 @app.on_event("startup")
 async def startup():
+    app.state.ready = False
     await db.connect()
+    app.state.http = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+    app.state.reembed_tasks = {}
+    app.state.enrollments = EnrollmentQueue(db, enroll_job, ENROLL_QUEUE_SIZE, ENROLL_WORKERS)
+    app.state.enrollments.start()
+    # Open the shared embedding snapshot; the loop keeps it and its delta current
+    embedding_store.switch(await model_versions.active_version(db))
+    embedding_store.load()
+    app.state.snapshot_task = asyncio.create_task(
+        run_snapshot_loop(db, embedding_store, before_refresh=follow_active_version)
+    )
+    # Pay for lazy allocations now rather than on the first check-in
+    await asyncio.to_thread(fu.warm_up)
+    app.state.ready = True
+
+async def follow_active_version():
+    """Switch this worker to the active model version once another one is activated."""
+    version = await model_versions.active_version(db)
+    if embedding_store.switch(version):
+        # Cached selfie embeddings came from the previous pipeline
+        selfie_cache.clear()
+        logger.info(f"Now verifying with face model version {version}")
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.state.snapshot_task.cancel()
+    app.state.enrollments.stop()
+    for task in app.state.reembed_tasks.values():
+        task.cancel()
+    await app.state.http.aclose()
     if db.is_connected():
         await db.disconnect()
 
@@ -45,6 +125,22 @@ async def shutdown():
 async def root():
     return {"message": "Face Recognition Microservice is running."}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until this worker is connected and has run a warm-up inference."""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True, "pid": os.getpid()}
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"selfies": selfie_cache.stats(), "embeddings": embedding_store.stats()}
+
+@app.get("/admission-stats")
+async def admission_stats():
+    """In-flight and queued inference requests by priority, and how many were shed and why."""
+    return admission.stats()
+
 @app.get("/users")
 async def get_users():
     """
@@ -54,74 +150,166 @@ async def get_users():
     return {"users": users}
 
 @app.post("/enroll")
-async def enroll_face(request: EnrollRequest):
+async def enroll_face(request: Request):
+    """
+    Enrolls a user by scoring their images and keeping the best, most diverse embeddings.
+    Images that fail the quality gates or add nothing over better ones are reported back.
+    Takes image URLs as JSON, or the images themselves as multipart "images" parts or a raw body.
+    """
+    user_id, sources = await parse_enroll(request)
+    return await enroll_user(user_id, sources)
+
+def _score_image(source, user_id, version):
+    try:
+        img = Image.open(BytesIO(load_image(source)))
+        return fu.assess_face(img, version)
+    except Exception as e:
+        # Log the error but continue trying other images
+        logger.warning(f"Failed to process image {source.label} for user {user_id}: {e}")
+        return None, f"could not process image: {e}"
+
+async def enroll_user(user_id, sources):
     """
-    Enrolls a user by processing their images and storing the embeddings in PostgreSQL.
+    Scores the images and stores the kept embeddings; shared by /enroll and enrollment jobs.
+    Raises HTTPException for an unknown user or when no image is usable.
     """
+    version = embedding_store.version
+
     # --- FIX: First, verify the user actually exists ---
-    user = await db.user.find_unique(where={'id': request.user_id})
+    user = await db.user.find_unique(where={'id': user_id})
     if not user:
         # If the user is not found, we can't create an embedding for them.
         # It's better to stop here and return a clear error.
         raise HTTPException(
             status_code=404, 
-            detail=f"User with ID '{request.user_id}' not found. Cannot enroll face."
+            detail=f"User with ID '{user_id}' not found. Cannot enroll face."
         )
 
-    # --- If the user exists, proceed as before ---
-    successful_enrollments = 0
-    for url in request.image_urls:
-        try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
-            embedding = fu.extract_embedding(img)
-            
-            if embedding:
-                # Store the new embedding, now we know the user exists.
-                await db.faceembedding.create(
-                    data={'userId': request.user_id, 'embedding': embedding}
-                )
-                successful_enrollments += 1
-        except Exception as e:
-            # Log the error but continue trying other images
-            print(f"Failed to process image {url} for user {request.user_id}: {e}")
+    # --- Score every image; only faces passing the quality gates become candidates ---
+    candidates, rejected = [], []
+    for source in sources:
+        # Downloads and inference run off the event loop so other requests keep flowing
+        candidate, reason = await asyncio.to_thread(_score_image, source, user_id, version)
+        if candidate:
+            candidate["source"] = source.label
+            candidates.append(candidate)
+        else:
+            rejected.append({**source.label, "reason": reason})
 
-    if successful_enrollments == 0:
+    if not candidates:
          raise HTTPException(
             status_code=400, 
-            detail=f"Could not process any of the provided images for user {request.user_id}."
+            detail={
+                "message": f"Could not process any of the provided images for user {user_id}.",
+                "rejected": rejected,
+            }
         )
 
-    return {"message": f"Successfully enrolled {successful_enrollments} images for user {request.user_id}"}
+    # --- Existing embeddings compete with the new ones for the per-user cap ---
+    existing = await db.faceembedding.find_many(where={'userId': user_id, 'modelVersion': version})
+    for record in existing:
+        candidates.append({
+            "id": record.id,
+            "embedding": record.embedding,
+            "quality": record.quality if record.quality is not None else LEGACY_EMBEDDING_QUALITY,
+        })
+
+    kept, skipped = fu.select_embeddings(candidates, MAX_EMBEDDINGS_PER_USER, MAX_EMBEDDING_SIMILARITY)
+    added = [c for c in kept if "id" not in c]
+    dropped = [c["id"] for c in skipped if "id" in c]
+    rejected += [{**c["source"], "reason": c["reason"]} for c in skipped if "source" in c]
+
+    # Replacements and additions commit together so the user is never left unenrolled
+    async with db.batch_() as batcher:
+        if dropped:
+            batcher.faceembedding.delete_many(where={'id': {'in': dropped}})
+        for candidate in added:
+            batcher.faceembedding.create(
+                data={
+                    'userId': user_id,
+                    'embedding': candidate["embedding"],
+                    'quality': candidate["quality"],
+                    'modelVersion': version,
+                }
+            )
+    embedding_store.invalidate(user_id)
+
+    return {
+        "message": f"Successfully enrolled {len(added)} images for user {user_id}",
+        "enrolled": [{**c["source"], "quality": c["quality"]} for c in added],
+        "embeddings": len(kept),
+        "rejected": rejected,
+    }
+
+async def enroll_job(user_id, sources):
+    # Queued enrollments run behind interactive requests and never miss a deadline
+    async with admission.slot(BACKGROUND):
+        return await enroll_user(user_id, sources)
+
+@app.post("/enroll/jobs", status_code=202)
+async def submit_enrollment(request: Request, response: Response):
+    """
+    Queues an enrollment (same body as /enroll) and returns the job right away; poll
+    GET /enroll/jobs/{id} for the outcome. Resubmitting with the same Idempotency-Key
+    header returns the original job instead of enrolling twice.
+    """
+    user_id, sources = await parse_enroll(request)
+    job, _ = await app.state.enrollments.submit(user_id, sources, request.headers.get("Idempotency-Key"))
+    response.headers["Location"] = f"/enroll/jobs/{job.id}"
+    return job
+
+@app.get("/enroll/stats")
+async def enrollment_stats():
+    """Queue depth, worker usage and recent wait/processing times of this worker's enrollment queue."""
+    return app.state.enrollments.stats()
+
+@app.get("/enroll/jobs/{job_id}")
+async def get_enrollment(job_id: str):
+    """
+    Job status: QUEUED, RUNNING, SUCCEEDED or FAILED. Once finished, `result` holds what
+    /enroll would have returned and `statusCode` its HTTP status.
+    """
+    job = await app.state.enrollments.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Enrollment job not found.")
+    return job
 
 @app.post("/verify")
-async def verify_face(request: VerifyRequest):
+async def verify_face(request: Request):
     """
     Verifies a new selfie against a user's stored embeddings from PostgreSQL.
+    Takes a selfie URL as JSON, or the selfie itself as a multipart "selfie" part or a raw body.
     """
-    # 1. Get the embedding from the new selfie
+    user_id, source = await parse_verify(request)
+    version = embedding_store.version
+
+    # 1. Get the embedding from the new selfie, reusing earlier results for the same URL or image bytes
     try:
-        response = requests.get(request.selfie_url, stream=True)
-        response.raise_for_status()
-        img = Image.open(BytesIO(response.content))
-        unknown_embedding = fu.extract_embedding(img)
-        if not unknown_embedding:
+        unknown_embedding = selfie_cache.lookup_url(source.url) if source.url else MISSING
+        if unknown_embedding is MISSING:
+            content = await fetch_image(source)
+            key = digest(content)
+            unknown_embedding = selfie_cache.get(key)
+            if unknown_embedding is MISSING:
+                # Decoding and inference block for tens of milliseconds; keep them off the event loop
+                embedding = await asyncio.to_thread(_selfie_embedding, content, version)
+                unknown_embedding = selfie_cache.put(key, embedding, url=source.url)
+            elif source.url:
+                selfie_cache.remember_url(source.url, key)
+        if unknown_embedding is None:
             raise HTTPException(status_code=400, detail="No face detected in the provided selfie.")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not process selfie image: {e}")
 
-    # 2. Get the user's stored embeddings from the PostgreSQL database
-    stored_embeddings = await db.faceembedding.find_many(where={'userId': request.user_id})
-    if not stored_embeddings:
+    # 2. Get the user's stored embeddings from the shared snapshot, or PostgreSQL if it cannot answer
+    stored_embeddings = (await load_embeddings([user_id], version))[user_id]
+    if stored_embeddings is None:
         raise HTTPException(status_code=404, detail="User is not enrolled for face recognition.")
 
     # 3. Compare the new selfie to all stored embeddings and find the best match
-    highest_similarity = 0.0
-    for record in stored_embeddings:
-        similarity = fu.cosine_sim(unknown_embedding, record.embedding)
-        if similarity > highest_similarity:
-            highest_similarity = similarity
+    highest_similarity = best_similarity(stored_embeddings, unknown_embedding)
 
     # 4. Return the result based on the confidence threshold
     is_verified = highest_similarity >= RECOGNITION_THRESHOLD
@@ -130,3 +318,161 @@ async def verify_face(request: VerifyRequest):
         "confidence": round(highest_similarity, 4)
     }
 
+@app.post("/verify/batch")
+async def verify_batch(request: BatchVerifyRequest):
+    """
+    Verifies many (user_id, selfie_url) pairs, e.g. check-ins queued while the service was down.
+    Selfies are downloaded concurrently and embedded in batches, stored embeddings for every
+    user are loaded up front, and results stream back as NDJSON lines in completion order,
+    each tagged with the item's index. Failed items carry "status" and "detail" like /verify's errors.
+    """
+    items = request.items
+    version = embedding_store.version
+    stored = await load_embeddings({item.user_id for item in items}, version)
+    return StreamingResponse(_verify_stream(items, stored, version), media_type="application/x-ndjson")
+
+async def _fetch_selfie(http, semaphore, queue, index, url):
+    """Puts (index, embedding | MISSING, content, key, error) on the queue for one selfie"""
+    async with semaphore:
+        try:
+            embedding = selfie_cache.lookup_url(url)
+            if embedding is not MISSING:
+                return await queue.put((index, embedding, None, None, None))
+            response = await http.get(url)
+            response.raise_for_status()
+            key = digest(response.content)
+            embedding = selfie_cache.get(key)
+            if embedding is not MISSING:
+                selfie_cache.remember_url(url, key)
+            await queue.put((index, embedding, response.content, key, None))
+        except Exception as e:
+            await queue.put((index, None, None, None, f"Could not process selfie image: {e}"))
+
+def _embed_batch(contents, version):
+    images, positions, results = [], [], [None] * len(contents)
+    for i, content in enumerate(contents):
+        try:
+            images.append(Image.open(BytesIO(content)).convert("RGB"))
+            positions.append(i)
+        except Exception as e:
+            results[i] = e
+    try:
+        embedded = fu.extract_embeddings(images, version)
+    except Exception:
+        # One degenerate image (e.g. too small for MTCNN) fails the whole call; redo them one by one
+        embedded = []
+        for image in images:
+            try:
+                embedded.append(fu.extract_embeddings([image], version)[0])
+            except Exception as e:
+                embedded.append(e)
+    for i, embedding in zip(positions, embedded):
+        results[i] = embedding
+    return results
+
+def _batch_result(index, user_id, stored, embedding, error):
+    result = {"index": index, "user_id": user_id}
+    if error:
+        result.update(status=500, detail=error)
+    elif embedding is None:
+        result.update(status=400, detail="No face detected in the provided selfie.")
+    elif stored[user_id] is None:
+        result.update(status=404, detail="User is not enrolled for face recognition.")
+    else:
+        similarity = best_similarity(stored[user_id], embedding)
+        result.update(verified=similarity >= RECOGNITION_THRESHOLD, confidence=round(similarity, 4))
+    return result
+
+async def _verify_stream(items, stored, version):
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    fetches = [
+        asyncio.create_task(_fetch_selfie(app.state.http, semaphore, queue, i, item.selfie_url))
+        for i, item in enumerate(items)
+    ]
+    try:
+        remaining = len(items)
+        while remaining:
+            # Block for one finished download, then take whatever else is ready as the batch
+            pending = [await queue.get()]
+            while len(pending) < BATCH_INFERENCE_SIZE and not queue.empty():
+                pending.append(queue.get_nowait())
+            remaining -= len(pending)
+
+            outcomes, to_embed = {}, []
+            for index, embedding, content, key, error in pending:
+                if embedding is MISSING:
+                    to_embed.append((index, content, key))
+                else:
+                    outcomes[index] = (embedding, error)
+            if to_embed:
+                try:
+                    embedded = await asyncio.to_thread(_embed_batch, [content for _, content, _ in to_embed], version)
+                except Exception as e:
+                    # Fail this batch's items, not the rest of the stream
+                    embedded = [e] * len(to_embed)
+                for (index, _, key), embedding in zip(to_embed, embedded):
+                    if isinstance(embedding, Exception):
+                        outcomes[index] = (None, f"Could not process selfie image: {embedding}")
+                    else:
+                        outcomes[index] = (selfie_cache.put(key, embedding, url=items[index].selfie_url), None)
+
+            lines = [
+                json.dumps(_batch_result(index, items[index].user_id, stored, embedding, error)) + "\n"
+                for index, (embedding, error) in outcomes.items()
+            ]
+            yield "".join(lines)
+    finally:
+        # The client went away or we are done; stop any downloads still running
+        for task in fetches:
+            task.cancel()
+
+# --- Model Versions ---
+
+@app.get("/models")
+async def list_model_versions():
+    """
+    Known pipeline versions, the one this worker verifies with, and every re-embedding job's progress.
+    """
+    records = await db.facemodelversion.find_many(order={'createdAt': 'asc'})
+    return {
+        "active": embedding_store.version,
+        "available": list(fu.PIPELINES),
+        "versions": records,
+    }
+
+@app.post("/models/{version}/reembed", status_code=202)
+async def start_reembedding(version: str):
+    """
+    Starts (or resumes) re-embedding every user's profile images with pipeline `version`
+    in this worker's background. 409 while the job runs elsewhere or the version is active.
+    """
+    if version not in fu.PIPELINES:
+        raise HTTPException(status_code=400, detail=f"Unknown face model version '{version}'.")
+    task = app.state.reembed_tasks.get(version)
+    if (task and not task.done()) or not await model_versions.claim(db, version):
+        raise HTTPException(status_code=409, detail=f"Re-embedding for '{version}' is already running or active.")
+    app.state.reembed_tasks[version] = asyncio.create_task(
+        model_versions.run_reembedding(db, app.state.http, version)
+    )
+    return await db.facemodelversion.find_unique(where={'id': version})
+
+@app.post("/models/{version}/activate")
+async def activate_model_version(version: str, force: bool = False):
+    """
+    Switches /verify to `version` for every worker (within one snapshot refresh interval).
+    Requires a completed re-embedding; refuses while users enrolled under the current
+    version have no embeddings for the new one, unless `force` is set.
+    """
+    record = await db.facemodelversion.find_unique(where={'id': version})
+    if not record or record.status != 'COMPLETED':
+        raise HTTPException(status_code=409, detail=f"Re-embedding for '{version}' has not completed.")
+    unmigrated = await model_versions.unmigrated_users(db, version, embedding_store.version)
+    if unmigrated and not force:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{unmigrated} enrolled users have no '{version}' embeddings; re-run the job or pass force=true.",
+        )
+    await model_versions.activate(db, version)
+    await follow_active_version()
+    return {"active": version, "unmigrated": unmigrated}
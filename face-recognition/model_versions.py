@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+import asyncio
+import logging
+import os
+
+from PIL import Image
+
+import face_recog as fu
+from admission import BACKGROUND, admission
+
+logger = logging.getLogger(__name__)
+
+# --- Re-embedding ---
+# A change of weights or preprocessing makes every stored embedding incomparable
+# with new selfies. The re-embedding job streams users in id order, embeds their
+# User.profileImage photos with the target pipeline and writes the results next
+# to the old version's rows. Each batch of users is written together with the
+# job's cursor in one transaction, so an interrupted job resumes after the last
+# committed batch. /verify keeps using the active version until the target is
+# activated, which flips FaceModelVersion.active in one transaction.
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "32")) # Users per checkpoint
+REEMBED_IMAGES_PER_USER = int(os.getenv("REEMBED_IMAGES_PER_USER", "5"))
+# A RUNNING job whose heartbeat is older than this is assumed dead and can be taken over
+REEMBED_STALE_SECONDS = float(os.getenv("REEMBED_STALE_SECONDS", "300"))
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+async def active_version(db) -> str:
+    record = await db.facemodelversion.find_first(where={'active': True})
+    return record.id if record else fu.DEFAULT_VERSION
+
+
+async def claim(db, version: str) -> bool:
+    """
+    Mark the job for `version` as running in this process. Fails while another
+    worker holds it with a fresh heartbeat, so only one job runs per version.
+    """
+    await db.facemodelversion.upsert(where={'id': version}, data={'create': {'id': version}, 'update': {}})
+    stale = _now() - timedelta(seconds=REEMBED_STALE_SECONDS)
+    claimed = await db.facemodelversion.update_many(
+        where={
+            'id': version,
+            'active': False,
+            'OR': [
+                {'status': {'not': 'RUNNING'}},
+                {'heartbeatAt': None},
+                {'heartbeatAt': {'lt': stale}},
+            ],
+        },
+        data={'status': 'RUNNING', 'heartbeatAt': _now(), 'error': None},
+    )
+    return claimed > 0
+
+
+async def _download(http, url):
+    try:
+        response = await http.get(url)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.warning(f"Re-embedding could not download {url}: {e}")
+        return None
+
+
+def _embed(contents, version):
+    images, positions = [], []
+    for i, content in enumerate(contents):
+        if content is None:
+            continue
+        try:
+            images.append(Image.open(BytesIO(content)).convert("RGB"))
+            positions.append(i)
+        except Exception as e:
+            logger.warning(f"Re-embedding could not decode an image: {e}")
+    embeddings = [None] * len(contents)
+    for i, embedding in zip(positions, fu.extract_embeddings(images, version)):
+        embeddings[i] = embedding
+    return embeddings
+
+
+async def _reembed_users(db, http, version, users, cursor, revisit=False):
+    """Embed one batch of users and commit it with the checkpoint; returns how many got embeddings"""
+    jobs = [(user.id, url) for user in users for url in user.profileImage[:REEMBED_IMAGES_PER_USER]]
+    contents = await asyncio.gather(*(_download(http, url) for _, url in jobs))
+    async with admission.slot(BACKGROUND):
+        embeddings = await asyncio.to_thread(_embed, contents, version)
+    rows = [
+        {'userId': user_id, 'embedding': embedding.tolist(), 'modelVersion': version}
+        for (user_id, _), embedding in zip(jobs, embeddings) if embedding is not None
+    ]
+    embedded = len({row['userId'] for row in rows})
+
+    async with db.batch_() as batcher:
+        # A batch replayed after a crash replaces what it wrote the first time
+        batcher.faceembedding.delete_many(where={'userId': {'in': [u.id for u in users]}, 'modelVersion': version})
+        if rows:
+            batcher.faceembedding.create_many(data=rows)
+        batcher.facemodelversion.update(
+            where={'id': version},
+            data={
+                'cursor': cursor,
+                'processed': {'increment': embedded},
+                # Users revisited by the final pass were already counted as skipped
+                'skipped': {'increment': 0 if revisit else len(users) - embedded},
+                'heartbeatAt': _now(),
+            },
+        )
+    return embedded
+
+
+async def run_reembedding(db, http, version: str):
+    """
+    Re-embed every user with profile images for `version`, resuming from the stored cursor.
+    A final pass picks up users created behind the cursor while the job ran.
+    """
+    record = await db.facemodelversion.find_unique(where={'id': version})
+    cursor = record.cursor
+    try:
+        while True:
+            where = {'profileImage': {'isEmpty': False}}
+            if cursor:
+                where['id'] = {'gt': cursor}
+            users = await db.user.find_many(where=where, order={'id': 'asc'}, take=REEMBED_BATCH_SIZE)
+            if not users:
+                break
+            cursor = users[-1].id
+            await _reembed_users(db, http, version, users, cursor)
+
+        missed = await db.user.find_many(
+            where={'profileImage': {'isEmpty': False}, 'faceEmbeddings': {'none': {'modelVersion': version}}},
+            order={'id': 'asc'},
+        )
+        for offset in range(0, len(missed), REEMBED_BATCH_SIZE):
+            await _reembed_users(db, http, version, missed[offset:offset + REEMBED_BATCH_SIZE], cursor, revisit=True)
+
+        await db.facemodelversion.update(
+            where={'id': version}, data={'status': 'COMPLETED', 'completedAt': _now(), 'heartbeatAt': _now()}
+        )
+        logger.info(f"Re-embedding for {version} completed")
+    except asyncio.CancelledError:
+        # Left RUNNING; once the heartbeat goes stale the job can be resumed from the cursor
+        raise
+    except Exception as e:
+        logger.error(f"Re-embedding for {version} failed: {e}")
+        await db.facemodelversion.update(where={'id': version}, data={'status': 'FAILED', 'error': str(e)})
+
+
+async def unmigrated_users(db, version: str, current: str) -> int:
+    """Users who can verify under `current` but have no embeddings for `version`"""
+    return await db.user.count(where={'AND': [
+        {'faceEmbeddings': {'some': {'modelVersion': current}}},
+        {'faceEmbeddings': {'none': {'modelVersion': version}}},
+    ]})
+
+
+async def activate(db, version: str):
+    """Make `version` the one /verify uses, in a single transaction"""
+    async with db.batch_() as batcher:
+        batcher.facemodelversion.update_many(where={'active': True}, data={'active': False})
+        batcher.facemodelversion.update(where={'id': version}, data={'active': True, 'activatedAt': _now()})
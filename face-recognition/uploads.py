@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from typing import List, Optional
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError
+
+# --- Request Parsing ---
+# /verify and /enroll take their images three ways:
+#   application/json      {"user_id": ..., "selfie_url" | "image_urls": ...}, downloaded by the service
+#   multipart/form-data   user_id field plus "selfie" / "images" file parts
+#   image/* or application/octet-stream
+#                         the image itself as the body, with ?user_id=...
+# The last two let a caller that already holds the image skip the object-storage round trip.
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+VERIFY_BATCH_MAX_ITEMS = int(os.getenv("VERIFY_BATCH_MAX_ITEMS", "500"))
+
+
+class EnrollRequest(BaseModel):
+    user_id: str # This should be the user's unique ID from your main User table
+    image_urls: List[str]
+
+
+class VerifyRequest(BaseModel):
+    user_id: str
+    selfie_url: str
+
+
+class BatchVerifyRequest(BaseModel):
+    items: List[VerifyRequest] = Field(min_length=1, max_length=VERIFY_BATCH_MAX_ITEMS)
+
+
+@dataclass
+class ImageSource:
+    """One image to process: uploaded bytes, or a URL still to be downloaded"""
+    label: dict  # How the image is reported back: {"url": ...} or {"file": ...}
+    content: Optional[bytes] = None
+    url: Optional[str] = None
+
+
+def _media_type(request: Request) -> str:
+    return request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+
+
+async def _read_body(request: Request) -> bytes:
+    """Read a streamed body, refusing it as soon as it passes MAX_IMAGE_BYTES"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+        raise _too_large()
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_IMAGE_BYTES:
+            raise _too_large()
+        chunks.append(chunk)
+    # A body that arrived in one chunk is used as is, without a join copy
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+async def _read_json(request: Request, model):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    try:
+        return model.model_validate(payload)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+def _query_user_id(request: Request) -> str:
+    user_id = request.query_params.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=422, detail="user_id query parameter is required with a raw image body")
+    return user_id
+
+
+async def _read_upload(upload) -> bytes:
+    if upload.size is not None and upload.size > MAX_IMAGE_BYTES:
+        raise _too_large()
+    return await upload.read()
+
+
+async def _read_form(request: Request, field: str):
+    form = await request.form(max_part_size=MAX_IMAGE_BYTES)
+    user_id = form.get("user_id")
+    if not user_id or not isinstance(user_id, str):
+        raise HTTPException(status_code=422, detail="user_id form field is required")
+    uploads = [part for part in form.getlist(field) if not isinstance(part, str)]
+    if not uploads:
+        raise HTTPException(status_code=422, detail=f"At least one '{field}' file part is required")
+    sources = [ImageSource({"file": u.filename or f"{field}[{i}]"}, content=await _read_upload(u))
+               for i, u in enumerate(uploads)]
+    return user_id, sources
+
+
+def _check_media_type(media_type: str):
+    if not (media_type.startswith("image/") or media_type == "application/octet-stream"):
+        raise HTTPException(
+            status_code=415,
+            detail="Use application/json, multipart/form-data, or an image/* or application/octet-stream body",
+        )
+
+
+async def parse_verify(request: Request):
+    """Returns (user_id, ImageSource) for a /verify request"""
+    media_type = _media_type(request)
+    if media_type == "application/json":
+        body = await _read_json(request, VerifyRequest)
+        return body.user_id, ImageSource({"url": body.selfie_url}, url=body.selfie_url)
+    if media_type == "multipart/form-data":
+        user_id, sources = await _read_form(request, "selfie")
+        return user_id, sources[0]
+    _check_media_type(media_type)
+    return _query_user_id(request), ImageSource({"file": "body"}, content=await _read_body(request))
+
+
+async def parse_enroll(request: Request):
+    """Returns (user_id, [ImageSource]) for an /enroll request"""
+    media_type = _media_type(request)
+    if media_type == "application/json":
+        body = await _read_json(request, EnrollRequest)
+        return body.user_id, [ImageSource({"url": url}, url=url) for url in body.image_urls]
+    if media_type == "multipart/form-data":
+        return await _read_form(request, "images")
+    _check_media_type(media_type)
+    return _query_user_id(request), [ImageSource({"file": "body"}, content=await _read_body(request))]